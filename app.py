@@ -1,9 +1,12 @@
 import os
 from datetime import datetime
-from flask import Flask, render_template, request, redirect, url_for, flash, send_from_directory
+from flask import Flask, render_template, request, redirect, url_for, flash, send_from_directory, session, has_request_context
 from pathlib import Path
+from sqlalchemy import event
 from models import db, User
 from config import Config
+from user_cache import UserCache, SessionUser, user_version
+from startup import ensure_schema, measure_startup
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, login_user, login_required, logout_user, current_user
 
@@ -23,14 +26,61 @@ db.init_app(app)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
+user_cache = UserCache(max_size=app.config['USER_CACHE_SIZE'], ttl=app.config['USER_CACHE_TTL'])
 
-# Create tables
+# Session key holding the version stamp of the logged-in user's row
+SESSION_VERSION_KEY = '_user_version'
+
+# Create tables (skipped when the schema stamp is current)
 with app.app_context():
-    db.create_all()
+    ensure_schema(db)
+
+@event.listens_for(User, 'after_update')
+def invalidate_cached_user(mapper, connection, target):
+    """Drop a user from the cache whenever their password or profile changes."""
+    user_cache.invalidate(target.id)
+    # Re-stamp the session of the user making the change
+    if has_request_context() and session.get('_user_id') == str(target.id):
+        stamp_session(user_version(target))
+
+def load_full_user(user_id):
+    """Load the full user row, detach it and cache it under the row's own version."""
+    user = db.session.get(User, user_id)
+    if user is None:
+        return None
+    db.session.expunge(user)
+    user_cache.set(user_id, user, user_version(user))
+    return user
+
+def stamp_session(version):
+    """Store the user's row version in the session, only if it changed (no needless Set-Cookie)."""
+    if session.get(SESSION_VERSION_KEY) != version:
+        session[SESSION_VERSION_KEY] = version
+
+def remember_user(user):
+    """Log a user in and stamp the session with their row version."""
+    login_user(user)
+    stamp_session(user_version(user))
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    user_id = int(user_id)
+    version = session.get(SESSION_VERSION_KEY)
+    cached = user_cache.get(user_id, version)
+    if cached is not None:
+        # Either the full row or just the light one cached below
+        return SessionUser(user_id, load_full_user, user=cached if isinstance(cached, User) else None)
+
+    # Cache miss: only check the row still exists and read its version stamp,
+    # the full row is loaded lazily if a page actually needs it. The light row
+    # is cached too, so pages that only check is_authenticated stay off the DB.
+    row = db.session.query(User.id, User.updated_at, User.created_at).filter_by(id=user_id).first()
+    if row is None:
+        return None
+    version = user_version(row)
+    user_cache.set(user_id, row, version)
+    stamp_session(version)
+    return SessionUser(user_id, load_full_user)
 
 @app.route('/favicon.ico')
 def favicon():
@@ -80,7 +130,7 @@ def signup():
         db.session.commit()
         
         flash('Welcome to the guild, brave adventurer!')
-        login_user(user)
+        remember_user(user)
         return redirect(url_for('dashboard'))
     
     return render_template('signup.html')
@@ -96,7 +146,7 @@ def login():
         
         user = User.query.filter_by(username=username).first()
         if user and user.check_password(password):
-            login_user(user)
+            remember_user(user)
             flash('Welcome back, brave adventurer!')
             return redirect(url_for('dashboard'))
         else:
@@ -112,9 +162,15 @@ def dashboard():
 @app.route('/logout', methods=['POST'])
 @login_required
 def logout():
+    user_cache.invalidate(current_user.id)
+    session.pop(SESSION_VERSION_KEY, None)
     logout_user()
     flash('Farewell, brave adventurer! Return soon to continue your quest.')
     return redirect(url_for('login'))
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', debug=True) 
\ No newline at end of file
+    import sys
+    if '--measure-startup' in sys.argv:
+        measure_startup()
+    else:
+        app.run(host='0.0.0.0', debug=True) 
\ No newline at end of file
@@ -1,9 +1,19 @@
 from fastapi import APIRouter
-from app.api.api_v1.endpoints import auth, users, tasks, game
+from app.api.api_v1.endpoints import auth, users, tasks, game, dashboard, events
 
 api_router = APIRouter()
 
 api_router.include_router(auth.router, tags=["authentication"])
 api_router.include_router(users.router, prefix="/users", tags=["users"])
 api_router.include_router(tasks.router, prefix="/tasks", tags=["tasks"])
-api_router.include_router(game.router, prefix="/game", tags=["game"]) 
\ No newline at end of file
+api_router.include_router(game.router, prefix="/game", tags=["game"])
+api_router.include_router(dashboard.router, prefix="/dashboard", tags=["dashboard"])
+api_router.include_router(events.router, prefix="/events", tags=["events"])
+
+# Rarely used APIs, imported on their first request (see app.api.lazy)
+lazy_routers = [
+    ("/households", "app.api.api_v1.endpoints.households", ["households"]),
+    ("/leaderboard", "app.api.api_v1.endpoints.leaderboard", ["leaderboard"]),
+    ("/analytics", "app.api.api_v1.endpoints.analytics", ["analytics"]),
+    ("/admin", "app.api.api_v1.endpoints.admin", ["admin"]),
+]
@@ -0,0 +1,66 @@
+from typing import Any, Dict
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+
+from app.api.deps import get_current_active_superuser
+from app.core.config import settings
+from app.core.profiling import ProfilerBusy, sampling_profiler
+from app.core.query_log import slow_query_log
+from app.core.sharding import shard_summary
+from app.models.user import User
+
+router = APIRouter()
+
+@router.get("/slow-queries", response_model=Dict[str, Any])
+def read_slow_queries(
+    limit: int = Query(20, ge=1, le=500),
+    current_user: User = Depends(get_current_active_superuser),
+) -> Any:
+    """
+    Statements of this worker that ran slower than SLOW_QUERY_THRESHOLD_MS,
+    by total time, with their last route, user and (sampled) query plan.
+    """
+    return {
+        "threshold_ms": settings.SLOW_QUERY_THRESHOLD_MS,
+        "statements": slow_query_log.top(limit),
+    }
+
+@router.delete("/slow-queries", response_model=Dict[str, Any])
+def reset_slow_queries(
+    current_user: User = Depends(get_current_active_superuser),
+) -> Any:
+    """
+    Clear this worker's slow-query table (the log file is kept).
+    """
+    slow_query_log.reset()
+    return {"threshold_ms": settings.SLOW_QUERY_THRESHOLD_MS, "statements": []}
+
+@router.post("/profile", response_class=PlainTextResponse)
+async def profile_worker(
+    seconds: float = Query(10, gt=0, le=settings.PROFILE_MAX_SECONDS),
+    interval_ms: float = Query(settings.PROFILE_SAMPLE_INTERVAL_MS, ge=1, le=1000),
+    current_user: User = Depends(get_current_active_superuser),
+) -> Any:
+    """
+    Sample the stacks of every thread in the worker that serves this request
+    and return them collapsed, one "frame;frame;frame count" line per stack
+    (feed to flamegraph.pl or speedscope).
+    """
+    try:
+        return await run_in_threadpool(sampling_profiler.run, seconds, interval_ms / 1000)
+    except ProfilerBusy:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A profile is already running in this worker"
+        )
+
+@router.get("/shards", response_model=Dict[str, Any])
+def read_shards(
+    current_user: User = Depends(get_current_active_superuser),
+) -> Any:
+    """
+    Users, tasks and file size of every shard, queried concurrently.
+    Without sharding the directory database is the only shard (null).
+    """
+    return {"shard_count": settings.SHARD_COUNT, "shards": shard_summary()}
@@ -0,0 +1,41 @@
+from datetime import date, datetime, timedelta
+from typing import Any, Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+
+from app.api.deps import get_db, get_current_active_user
+from app.models.user import User
+from app.schemas.analytics import CompletionPoint, CompletionSeries
+from app.services.analytics import bucket_start, completion_series
+
+router = APIRouter()
+
+# Window returned when no start date is given
+DEFAULT_WINDOW = {"day": timedelta(days=30), "week": timedelta(weeks=26)}
+
+@router.get("/completions", response_model=CompletionSeries)
+def read_completion_series(
+    bucket: Literal["day", "week"] = "day",
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    by_category: bool = False,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+) -> Any:
+    """
+    Tasks completed, XP and gold earned per day or week (UTC), optionally split by category.
+    """
+    end = end or datetime.utcnow().date()
+    start = bucket_start(bucket, start or end - DEFAULT_WINDOW[bucket])
+    if start > end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start must not be after end"
+        )
+    points = completion_series(db, current_user.id, bucket, start, end, by_category=by_category)
+    return CompletionSeries(
+        bucket=bucket,
+        start=start,
+        end=end,
+        points=[CompletionPoint(**point) for point in points],
+    )
@@ -1,21 +1,23 @@
-from datetime import timedelta
+from datetime import datetime, timedelta
 from typing import Any
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 
-from app.api.deps import get_db
-from app.core.security import create_access_token
+from app.api.deps import get_directory_db, get_current_user, reusable_oauth2
+from app.core.revocation import revocation_store
+from app.core.security import create_access_token, verify_token
 from app.core.config import settings
 from app.crud.user import authenticate_user, create_user
-from app.schemas.token import Token
+from app.models.user import User as UserModel
+from app.schemas.token import Token, TokenPayload
 from app.schemas.user import UserCreate, User
 
 router = APIRouter()
 
 @router.post("/login/access-token", response_model=Token)
 def login_access_token(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_directory_db),
     form_data: OAuth2PasswordRequestForm = Depends()
 ) -> Any:
     """
@@ -42,10 +44,33 @@ def login_access_token(
         "token_type": "bearer",
     }
 
+@router.post("/logout")
+def logout(
+    db: Session = Depends(get_directory_db),
+    token: str = Depends(reusable_oauth2),
+    current_user: UserModel = Depends(get_current_user),
+) -> Any:
+    """
+    Revoke the access token used for this request.
+    """
+    token_data = TokenPayload(**verify_token(token))
+    if not token_data.jti:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="This token cannot be revoked, it will expire on its own"
+        )
+    revocation_store.revoke(
+        db,
+        jti=token_data.jti,
+        user_id=current_user.id,
+        expires_at=datetime.utcfromtimestamp(token_data.exp),
+    )
+    return {"msg": "Logged out"}
+
 @router.post("/register", response_model=User)
 def register_user(
     *,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_directory_db),
     user_in: UserCreate,
 ) -> Any:
     """
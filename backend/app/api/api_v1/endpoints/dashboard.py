@@ -0,0 +1,117 @@
+import asyncio
+import hashlib
+from typing import Any, Callable, List
+from fastapi import APIRouter, Depends, Request, Response
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.api.deps import get_current_active_user
+from app.core.config import settings
+from app.core.sharding import shard_router
+from app.models.game import Achievement, InventoryItem
+from app.models.user import User
+from app.schemas.dashboard import (
+    DashboardAchievement,
+    DashboardInventory,
+    DashboardStats,
+    DashboardSummary,
+    DashboardTask,
+)
+from app.services import recurrence
+
+router = APIRouter()
+
+def _run_query(user_id: int, query: Callable[[Session], Any]) -> Any:
+    """
+    Run one dashboard query in its own session (on the user's shard), so
+    queries can run concurrently. Results are converted to schemas before
+    the session is closed.
+    """
+    db = shard_router.session_for_user(user_id)
+    try:
+        return query(db)
+    finally:
+        db.close()
+
+def _today_tasks(user_id: int) -> Callable[[Session], List[DashboardTask]]:
+    def query(db: Session) -> List[DashboardTask]:
+        tasks = recurrence.tasks_due_today(db, user_id)
+        return [DashboardTask.model_validate(task) for task in tasks]
+    return query
+
+def _overdue_tasks(user_id: int) -> Callable[[Session], List[DashboardTask]]:
+    def query(db: Session) -> List[DashboardTask]:
+        tasks = recurrence.overdue_tasks(db, user_id)
+        return [DashboardTask.model_validate(task) for task in tasks]
+    return query
+
+def _inventory_counts(user_id: int) -> Callable[[Session], DashboardInventory]:
+    def query(db: Session) -> DashboardInventory:
+        rows = (
+            db.query(
+                InventoryItem.item_type,
+                func.coalesce(func.sum(InventoryItem.quantity), 0),
+                func.coalesce(func.sum(case((InventoryItem.is_equipped, 1), else_=0)), 0),
+            )
+            .filter(InventoryItem.owner_id == user_id)
+            .group_by(InventoryItem.item_type)
+            .all()
+        )
+        inventory = DashboardInventory()
+        for item_type, quantity, equipped in rows:
+            key = getattr(item_type, "value", item_type)
+            inventory.by_type[key] = int(quantity)
+            inventory.total_items += int(quantity)
+            inventory.equipped_items += int(equipped)
+        return inventory
+    return query
+
+def _recent_achievements(user_id: int) -> Callable[[Session], List[DashboardAchievement]]:
+    def query(db: Session) -> List[DashboardAchievement]:
+        achievements = (
+            db.query(Achievement)
+            .filter(Achievement.user_id == user_id)
+            .order_by(Achievement.unlocked_at.desc())
+            .limit(settings.DASHBOARD_RECENT_ACHIEVEMENTS)
+            .all()
+        )
+        return [DashboardAchievement.model_validate(a) for a in achievements]
+    return query
+
+@router.get("", response_model=DashboardSummary)
+async def read_dashboard(
+    request: Request,
+    current_user: User = Depends(get_current_active_user),
+) -> Any:
+    """
+    Everything the dashboard needs in one round trip: stats, today's and
+    overdue tasks, inventory counts and recent achievements.
+    Supports If-None-Match, returning 304 when the dashboard is unchanged.
+    """
+    user_id = current_user.id
+    today, overdue, inventory, achievements = await asyncio.gather(
+        run_in_threadpool(_run_query, user_id, _today_tasks(user_id)),
+        run_in_threadpool(_run_query, user_id, _overdue_tasks(user_id)),
+        run_in_threadpool(_run_query, user_id, _inventory_counts(user_id)),
+        run_in_threadpool(_run_query, user_id, _recent_achievements(user_id)),
+    )
+    summary = DashboardSummary(
+        stats=DashboardStats(
+            experience_points=current_user.experience_points,
+            level=current_user.level,
+            gold=current_user.gold,
+        ),
+        today=today,
+        overdue=overdue,
+        inventory=inventory,
+        recent_achievements=achievements,
+    )
+
+    body = summary.model_dump_json().encode("utf-8")
+    etag = f'W/"{hashlib.sha1(body).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if_none_match = [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]
+    if etag in if_none_match or "*" in if_none_match:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
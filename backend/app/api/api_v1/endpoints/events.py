@@ -0,0 +1,48 @@
+import asyncio
+from typing import Any
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from app.api.deps import get_db, get_current_active_user
+from app.core.config import settings
+from app.core.events import event_hub, format_sse
+from app.models.user import User
+
+router = APIRouter()
+
+@router.get("")
+async def stream_events(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+) -> Any:
+    """
+    Stream the current user's change events (task, achievement and inventory
+    updates) as Server-Sent Events.
+    """
+    user_id = current_user.id
+    # Don't hold a database connection for the lifetime of the stream
+    db.close()
+    subscription = event_hub.subscribe(user_id)
+
+    async def stream():
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(
+                        subscription.get(), timeout=settings.EVENTS_HEARTBEAT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(event)
+        finally:
+            event_hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
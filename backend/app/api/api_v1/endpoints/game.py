@@ -1,8 +1,13 @@
-from typing import Any, List
+from typing import Any, List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
-from app.api.deps import get_db, get_current_active_user
+from app.api import fields as sparse
+from app.api.deps import get_db, get_directory_db, get_current_active_user
+from app.core.cache import cache
+from app.core.events import event_hub
+from app.core.sharding import shard_router
+from app.core.write_coalescer import run_write
 from app.crud.game import (
     get_user_achievements,
     create_achievement,
@@ -13,9 +18,10 @@ from app.crud.game import (
     get_categories,
     create_category,
     get_task_tags,
-    create_task_tag,
-    delete_task_tag
 )
+from app.models.game import Achievement as AchievementModel
+from app.models.game import InventoryItem as InventoryItemModel
+from app.models.task import Task
 from app.models.user import User
 from app.schemas.game import (
     Achievement,
@@ -23,11 +29,17 @@ from app.schemas.game import (
     InventoryItem,
     InventoryItemCreate,
     InventoryItemUpdate,
+    EffectiveStats,
     Category,
     CategoryCreate,
     TaskTag,
-    TaskTagCreate
+    TaskTagCreate,
+    TagCount,
+    TagBulkUpdate,
+    TagBulkResult,
 )
+from app.services import character_stats
+from app.services import tags as tag_index
 
 router = APIRouter()
 
@@ -35,11 +47,19 @@ router = APIRouter()
 @router.get("/achievements", response_model=List[Achievement])
 def read_achievements(
     db: Session = Depends(get_db),
+    fields: Optional[List[str]] = Depends(sparse.fieldset(Achievement)),
     current_user: User = Depends(get_current_active_user),
 ) -> Any:
     """
-    Retrieve achievements for the current user.
+    Retrieve achievements for the current user, optionally only the given fields.
     """
+    if fields:
+        rows = (
+            db.query(*sparse.columns(AchievementModel, fields))
+            .filter(AchievementModel.user_id == current_user.id)
+            .order_by(AchievementModel.id)
+        )
+        return sparse.render(rows, fields)
     achievements = get_user_achievements(db=db, user_id=current_user.id)
     return achievements
 
@@ -64,17 +84,26 @@ def create_user_achievement(
         achievement_in=achievement_in,
         user_id=current_user.id
     )
+    event_hub.publish(current_user.id, "achievement.unlocked", {"achievement_id": achievement.id})
     return achievement
 
 # Inventory endpoints
 @router.get("/inventory", response_model=List[InventoryItem])
 def read_inventory(
     db: Session = Depends(get_db),
+    fields: Optional[List[str]] = Depends(sparse.fieldset(InventoryItem)),
     current_user: User = Depends(get_current_active_user),
 ) -> Any:
     """
-    Retrieve inventory items for the current user.
+    Retrieve inventory items for the current user, optionally only the given fields.
     """
+    if fields:
+        rows = (
+            db.query(*sparse.columns(InventoryItemModel, fields))
+            .filter(InventoryItemModel.owner_id == current_user.id)
+            .order_by(InventoryItemModel.id)
+        )
+        return sparse.render(rows, fields)
     items = get_user_inventory(db=db, user_id=current_user.id)
     return items
 
@@ -98,6 +127,10 @@ def create_user_inventory_item(
         item_in=item_in,
         user_id=current_user.id
     )
+    if item.is_equipped:
+        character_stats.recompute(db, current_user.id)
+        db.commit()
+    event_hub.publish(current_user.id, "inventory.changed", {"item_id": item.id})
     return item
 
 @router.put("/inventory/{item_id}", response_model=InventoryItem)
@@ -111,7 +144,7 @@ def update_user_inventory_item(
     """
     Update an inventory item.
     """
-    item = db.query(InventoryItem).filter(InventoryItem.id == item_id).first()
+    item = db.query(InventoryItemModel).filter(InventoryItemModel.id == item_id).first()
     if not item:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -122,29 +155,54 @@ def update_user_inventory_item(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Not enough permissions"
         )
+    was_equipped = item.is_equipped
     item = update_inventory_item(db=db, item=item, item_in=item_in)
+    if item.is_equipped != was_equipped:
+        character_stats.recompute(db, current_user.id)
+        db.commit()
+    event_hub.publish(current_user.id, "inventory.changed", {"item_id": item.id})
     return item
 
+@router.get("/stats", response_model=EffectiveStats)
+def read_effective_stats(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+) -> Any:
+    """
+    Retrieve the current user's stats and reward multipliers from equipped items.
+    """
+    vector = character_stats.get_vector(db, current_user.id)
+    # Saves the vector if this was its first computation
+    db.commit()
+    return EffectiveStats(
+        stats=vector.stats,
+        xp_multiplier=vector.xp_multiplier,
+        gold_multiplier=vector.gold_multiplier,
+    )
+
 # Category endpoints
 @router.get("/categories", response_model=List[Category])
 def read_categories(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_directory_db),
 ) -> Any:
     """
     Retrieve all categories.
     """
-    categories = get_categories(db=db)
-    return categories
+    return cache.namespace("categories").get_or_set(
+        "all",
+        lambda: [Category.model_validate(c).model_dump(mode="json") for c in get_categories(db=db)],
+    )
 
 @router.post("/categories", response_model=Category)
 def create_new_category(
     *,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_directory_db),
     category_in: CategoryCreate,
     current_user: User = Depends(get_current_active_user),
 ) -> Any:
     """
-    Create new category.
+    Create new category. Categories are written to the directory database
+    and copied to every shard, whose tasks reference them.
     """
     if not current_user.is_superuser:
         raise HTTPException(
@@ -152,6 +210,8 @@ def create_new_category(
             detail="Not enough permissions"
         )
     category = create_category(db=db, category_in=category_in)
+    shard_router.replicate(category)
+    cache.namespace("categories").invalidate()
     return category
 
 # Tag endpoints
@@ -199,7 +259,9 @@ def create_task_tag_endpoint(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Not enough permissions"
         )
-    return create_task_tag(db=db, tag_in=tag_in, task_id=task_id)
+    return run_write(
+        db, lambda session: tag_index.add_tag(session, task if session is db else session.get(Task, task_id), tag_in.name)
+    )
 
 @router.delete("/tasks/tags/{tag_id}", response_model=TaskTag)
 def delete_task_tag_endpoint(
@@ -211,16 +273,49 @@ def delete_task_tag_endpoint(
     """
     Delete a task tag.
     """
-    tag = db.query(TaskTag).filter(TaskTag.id == tag_id).first()
+    tag, owned = tag_index.get_owned_tag(db, tag_id, current_user.id)
     if not tag:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Tag not found"
         )
-    task = db.query(Task).filter(Task.id == tag.task_id).first()
-    if task.owner_id != current_user.id:
+    if not owned:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Not enough permissions"
+        )
+    return tag_index.delete_tag(db, tag, current_user.id)
+
+@router.get("/tags", response_model=List[TagCount])
+def read_tag_cloud(
+    db: Session = Depends(get_db),
+    limit: int = 100,
+    current_user: User = Depends(get_current_active_user),
+) -> Any:
+    """
+    Retrieve the current user's tags with the number of tasks carrying each, most used first.
+    """
+    return tag_index.tag_cloud(db, current_user.id, limit=limit)
+
+@router.post("/tasks/tags/bulk", response_model=TagBulkResult)
+def bulk_tag_tasks(
+    *,
+    db: Session = Depends(get_db),
+    bulk_in: TagBulkUpdate,
+    current_user: User = Depends(get_current_active_user),
+) -> Any:
+    """
+    Add and/or remove tags on many tasks at once.
+    """
+    task_ids = sorted(set(bulk_in.task_ids))
+    if tag_index.owned_task_ids(db, current_user.id, task_ids) != set(task_ids):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Not enough permissions"
         )
-    return delete_task_tag(db=db, tag_id=tag_id) 
\ No newline at end of file
+    removed = tag_index.remove_tags(db, current_user.id, task_ids, bulk_in.remove) if bulk_in.remove else 0
+    added = tag_index.add_tags(db, current_user.id, task_ids, bulk_in.add) if bulk_in.add else 0
+    if added or removed:
+        for task_id in task_ids:
+            event_hub.publish(current_user.id, "task.updated", {"task_id": task_id})
+    return {"added": added, "removed": removed}
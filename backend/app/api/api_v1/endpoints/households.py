@@ -0,0 +1,137 @@
+from typing import Any, List
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+
+from app.api.deps import get_directory_db, get_current_active_user
+from app.core.sharding import shard_router
+from app.models.household import Household as HouseholdModel, HouseholdMember
+from app.models.user import User
+from app.schemas.household import Household, HouseholdCreate, HouseholdMemberAdd
+
+router = APIRouter()
+
+def _to_schema(db: Session, household: HouseholdModel) -> Household:
+    member_ids = [
+        row.user_id
+        for row in db.query(HouseholdMember.user_id).filter(HouseholdMember.household_id == household.id)
+    ]
+    return Household(
+        id=household.id,
+        name=household.name,
+        owner_id=household.owner_id,
+        created_at=household.created_at,
+        member_ids=member_ids,
+    )
+
+def get_member_household(db: Session, household_id: int, user_id: int) -> HouseholdModel:
+    """
+    Load a household the user belongs to, or raise 404/400
+    """
+    household = db.get(HouseholdModel, household_id)
+    if not household:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Household not found"
+        )
+    if not db.get(HouseholdMember, (household_id, user_id)):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Not enough permissions"
+        )
+    return household
+
+@router.get("", response_model=List[Household])
+def read_households(
+    db: Session = Depends(get_directory_db),
+    current_user: User = Depends(get_current_active_user),
+) -> Any:
+    """
+    Retrieve the households the current user belongs to.
+    """
+    households = (
+        db.query(HouseholdModel)
+        .join(HouseholdMember, HouseholdMember.household_id == HouseholdModel.id)
+        .filter(HouseholdMember.user_id == current_user.id)
+        .all()
+    )
+    return [_to_schema(db, household) for household in households]
+
+@router.post("", response_model=Household)
+def create_household(
+    *,
+    db: Session = Depends(get_directory_db),
+    household_in: HouseholdCreate,
+    current_user: User = Depends(get_current_active_user),
+) -> Any:
+    """
+    Create a household with the current user as owner and first member.
+    """
+    household = HouseholdModel(name=household_in.name, owner_id=current_user.id)
+    db.add(household)
+    db.flush()
+    db.add(HouseholdMember(household_id=household.id, user_id=current_user.id))
+    db.commit()
+    db.refresh(household)
+    return _to_schema(db, household)
+
+@router.post("/{household_id}/members", response_model=Household)
+def add_household_member(
+    *,
+    db: Session = Depends(get_directory_db),
+    household_id: int,
+    member_in: HouseholdMemberAdd,
+    current_user: User = Depends(get_current_active_user),
+) -> Any:
+    """
+    Add a user to a household by username. Only the owner can add members.
+    With sharding, a user whose data lives on another shard than the
+    household's can't be added (409): data isn't moved between shards.
+    """
+    household = get_member_household(db, household_id, current_user.id)
+    if household.owner_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Not enough permissions"
+        )
+    user = db.query(User).filter(User.username == member_in.username).first()
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    if not db.get(HouseholdMember, (household_id, user.id)):
+        if not shard_router.can_join(user.id, household.owner_id):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="This user's data is stored apart from the household's, so they can't join it"
+            )
+        db.add(HouseholdMember(household_id=household_id, user_id=user.id))
+        db.commit()
+    return _to_schema(db, household)
+
+@router.delete("/{household_id}/members/{user_id}", response_model=Household)
+def remove_household_member(
+    *,
+    db: Session = Depends(get_directory_db),
+    household_id: int,
+    user_id: int,
+    current_user: User = Depends(get_current_active_user),
+) -> Any:
+    """
+    Remove a member. The owner can remove anyone; members can leave.
+    """
+    household = get_member_household(db, household_id, current_user.id)
+    if current_user.id not in (household.owner_id, user_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Not enough permissions"
+        )
+    member = db.get(HouseholdMember, (household_id, user_id))
+    if not member:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Member not found"
+        )
+    db.delete(member)
+    db.commit()
+    return _to_schema(db, household)
@@ -0,0 +1,92 @@
+from typing import Any, List, Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+
+from app.api.api_v1.endpoints.households import get_member_household
+from app.api.deps import get_directory_db, get_current_active_user
+from app.models.household import HouseholdMember
+from app.models.user import User
+from app.schemas.leaderboard import LeaderboardEntry, LeaderboardPage, LeaderboardPosition
+from app.services.leaderboard import Board, Entry, leaderboard, usernames
+
+router = APIRouter()
+
+BoardName = Literal["all", "week", "month"]
+PERIOD_PATTERN = r"^\d{4}-(W\d{2}|\d{2})$"
+
+def _ranking(db: Session, board: str, period: Optional[str]) -> Board:
+    try:
+        return leaderboard.board(db, board, period)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+def _entries(db: Session, entries: List[Entry]) -> List[LeaderboardEntry]:
+    names = usernames(db, (user_id for _, user_id, _ in entries))
+    return [
+        LeaderboardEntry(rank=rank, user_id=user_id, username=names.get(user_id, ""), score=score)
+        for rank, user_id, score in entries
+    ]
+
+@router.get("", response_model=LeaderboardPage)
+def read_leaderboard(
+    board: BoardName = "all",
+    period: Optional[str] = Query(None, pattern=PERIOD_PATTERN, description='Past period, e.g. "2024-W07" or "2024-02"'),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_directory_db),
+    current_user: User = Depends(get_current_active_user),
+) -> Any:
+    """
+    Retrieve the top of a leaderboard.
+    """
+    ranking = _ranking(db, board, period)
+    return LeaderboardPage(
+        board=board,
+        period=ranking.key,
+        total=len(ranking),
+        entries=_entries(db, ranking.top(offset, limit)),
+    )
+
+@router.get("/me", response_model=LeaderboardPosition)
+def read_my_position(
+    board: BoardName = "all",
+    period: Optional[str] = Query(None, pattern=PERIOD_PATTERN),
+    neighbours: int = Query(5, ge=0, le=50),
+    db: Session = Depends(get_directory_db),
+    current_user: User = Depends(get_current_active_user),
+) -> Any:
+    """
+    Retrieve the current user's rank and the users ranked just above and below.
+    """
+    ranking = _ranking(db, board, period)
+    return LeaderboardPosition(
+        board=board,
+        period=ranking.key,
+        total=len(ranking),
+        rank=ranking.rank(current_user.id),
+        score=ranking.scores.get(current_user.id, 0),
+        neighbours=_entries(db, ranking.around(current_user.id, neighbours)),
+    )
+
+@router.get("/households/{household_id}", response_model=LeaderboardPage)
+def read_household_leaderboard(
+    household_id: int,
+    board: BoardName = "all",
+    period: Optional[str] = Query(None, pattern=PERIOD_PATTERN),
+    db: Session = Depends(get_directory_db),
+    current_user: User = Depends(get_current_active_user),
+) -> Any:
+    """
+    Retrieve a leaderboard restricted to the members of a household.
+    """
+    get_member_household(db, household_id, current_user.id)
+    member_ids = [
+        row.user_id
+        for row in db.query(HouseholdMember.user_id).filter(HouseholdMember.household_id == household_id)
+    ]
+    ranking = _ranking(db, board, period)
+    entries = ranking.among(member_ids)
+    return LeaderboardPage(board=board, period=ranking.key, total=len(entries), entries=_entries(db, entries))
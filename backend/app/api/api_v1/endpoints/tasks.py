@@ -1,43 +1,85 @@
-from typing import Any, List
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import datetime, timedelta
+from typing import Any, List, Literal, Optional, Union
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
+from app.api import fields as sparse
 from app.api.deps import get_db, get_current_active_user
+from app.core.config import settings
+from app.core.events import event_hub
+from app.core.write_coalescer import run_write
 from app.crud.task import (
     get_task,
-    get_tasks_by_user,
     get_tasks_by_category,
     create_task,
     update_task,
     delete_task,
-    get_overdue_tasks,
-    get_tasks_due_today,
     get_subtasks
 )
+from app.models.progress import TaskProgress
+from app.models.task import Task as TaskModel
 from app.models.user import User
-from app.schemas.task import Task, TaskCreate, TaskUpdate, TaskWithRelations
+from app.schemas.game import normalize_tag
+from app.schemas.task import (
+    Task,
+    TaskCreate,
+    TaskUpdate,
+    TaskWithRelations,
+    Recurrence,
+    RecurrenceCreate,
+    TaskOccurrence,
+    TaskSearchResults,
+)
+from app.services import analytics, next_tasks, recurrence, subtask_progress
+from app.services import tags as tag_index
+from app.services.search import search_tasks
 
 router = APIRouter()
 
+# Task fields that come from the joined task_progress row
+TASK_COUNTERS = {
+    "subtask_total": func.coalesce(TaskProgress.subtask_total, 0),
+    "subtask_done": func.coalesce(TaskProgress.subtask_done, 0),
+    "subtask_experience": func.coalesce(TaskProgress.subtask_experience, 0),
+}
+
 @router.get("", response_model=List[Task])
 def read_tasks(
     db: Session = Depends(get_db),
     skip: int = 0,
     limit: int = 100,
     include_completed: bool = False,
+    tags: Optional[str] = None,
+    tag_mode: Literal["all", "any"] = "all",
+    fields: Optional[List[str]] = Depends(sparse.fieldset(Task)),
     current_user: User = Depends(get_current_active_user),
 ) -> Any:
     """
-    Retrieve tasks for the current user.
+    Retrieve tasks for the current user. Recurring templates are not listed.
+    With tags=a,b only tasks carrying all (tag_mode=all) or any (tag_mode=any) of the tags are
+    returned; tags are matched case-insensitively and blank ones ignored.
+    With fields=id,title only those columns are read and returned.
     """
-    tasks = get_tasks_by_user(
-        db=db,
-        user_id=current_user.id,
-        skip=skip,
-        limit=limit,
-        include_completed=include_completed
+    if fields:
+        query = db.query(*sparse.columns(TaskModel, fields, TASK_COUNTERS))
+        if any(name in TASK_COUNTERS for name in fields):
+            query = query.outerjoin(TaskProgress, TaskProgress.task_id == TaskModel.id)
+    else:
+        query = db.query(TaskModel)
+    query = query.filter(
+        TaskModel.owner_id == current_user.id,
+        TaskModel.id.not_in(recurrence.template_id_query(current_user.id)),
     )
-    return tasks
+    names = sorted({normalize_tag(name) for name in tags.split(",")} - {""}) if tags else []
+    if names:
+        query = query.filter(
+            TaskModel.id.in_(tag_index.tagged_task_ids(current_user.id, names, match_all=tag_mode == "all"))
+        )
+    if not include_completed:
+        query = query.filter(TaskModel.is_completed == False)  # noqa: E712
+    query = query.order_by(TaskModel.id).offset(skip).limit(limit)
+    return sparse.render(query, fields) if fields else query.all()
 
 @router.post("", response_model=Task)
 def create_user_task(
@@ -49,7 +91,15 @@ def create_user_task(
     """
     Create new task for the current user.
     """
-    task = create_task(db=db, task_in=task_in, user_id=current_user.id)
+    if task_in.parent_id is not None:
+        problem = subtask_progress.check_parent(db, None, task_in.parent_id, current_user.id)
+        if problem:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=problem
+            )
+    task = run_write(db, lambda session: create_task(db=session, task_in=task_in, user_id=current_user.id))
+    event_hub.publish(current_user.id, "task.created", {"task_id": task.id})
     return task
 
 @router.get("/category/{category_id}", response_model=List[Task])
@@ -72,27 +122,95 @@ def read_tasks_by_category(
     )
     return tasks
 
-@router.get("/overdue", response_model=List[Task])
+@router.get("/overdue", response_model=List[Union[Task, TaskOccurrence]])
 def read_overdue_tasks(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
 ) -> Any:
     """
-    Retrieve overdue tasks for the current user.
+    Retrieve overdue tasks for the current user, including missed occurrences
+    of recurring tasks from the last RECURRENCE_OVERDUE_DAYS days.
     """
-    tasks = get_overdue_tasks(db=db, user_id=current_user.id)
-    return tasks
+    return recurrence.overdue_tasks(db, current_user.id)
 
-@router.get("/today", response_model=List[Task])
+@router.get("/today", response_model=List[Union[Task, TaskOccurrence]])
 def read_today_tasks(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
 ) -> Any:
     """
-    Retrieve tasks due today for the current user.
+    Retrieve tasks due today for the current user, including occurrences of recurring tasks.
     """
-    tasks = get_tasks_due_today(db=db, user_id=current_user.id)
-    return tasks
+    return recurrence.tasks_due_today(db, current_user.id)
+
+@router.get("/next", response_model=List[Task])
+def read_next_tasks(
+    db: Session = Depends(get_db),
+    k: int = Query(5, ge=1, le=settings.NEXT_TASKS_MAX_K),
+    current_user: User = Depends(get_current_active_user),
+) -> Any:
+    """
+    Retrieve the k open tasks to do next, ranked by priority, due date, reward
+    and difficulty (weighted by NEXT_TASKS_WEIGHTS).
+    """
+    return next_tasks.next_tasks(db, current_user.id, k)
+
+@router.get("/search", response_model=TaskSearchResults)
+def search_user_tasks(
+    q: str = Query(..., min_length=1, max_length=200),
+    category_id: Optional[int] = None,
+    tag: Optional[str] = None,
+    is_completed: Optional[bool] = None,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+) -> Any:
+    """
+    Search the current user's tasks by title and description.
+    The last word matches as a prefix; pass next_cursor back as cursor for the next page.
+    """
+    try:
+        items, next_cursor = search_tasks(
+            db=db,
+            user_id=current_user.id,
+            q=q,
+            category_id=category_id,
+            tag=tag,
+            is_completed=is_completed,
+            limit=limit,
+            cursor=cursor,
+        )
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    return {"items": items, "next_cursor": next_cursor}
+
+@router.get("/range", response_model=List[TaskOccurrence])
+def read_task_occurrences(
+    start: datetime,
+    end: datetime,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+) -> Any:
+    """
+    Expand the current user's recurring tasks over [start, end).
+    Only occurrences that have not been materialised are returned.
+    """
+    start, end = recurrence.utc_naive(start), recurrence.utc_naive(end)
+    if end <= start:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="end must be after start"
+        )
+    if end - start > timedelta(days=settings.RECURRENCE_MAX_RANGE_DAYS):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Range may span at most {settings.RECURRENCE_MAX_RANGE_DAYS} days"
+        )
+    return recurrence.occurrences_between(db, current_user.id, start, end)
 
 @router.get("/{task_id}", response_model=TaskWithRelations)
 def read_task(
@@ -138,7 +256,27 @@ def update_user_task(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Not enough permissions"
         )
-    task = update_task(db=db, task=task, task_in=task_in)
+    if task_in.parent_id is not None:
+        problem = subtask_progress.check_parent(db, task, task_in.parent_id, current_user.id)
+        if problem:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=problem
+            )
+    was_completed = task.is_completed
+
+    def apply_update(session: Session):
+        # The coalesced writer has its own session; reload the task there
+        target = task if session is db else get_task(db=session, task_id=task_id)
+        # Logged, with the equipment bonus, in update_task's own transaction
+        analytics.track(session, target, current_user.id)
+        return update_task(db=session, task=target, task_in=task_in)
+
+    task = run_write(db, apply_update)
+    if task.is_completed and not was_completed:
+        event_hub.publish(current_user.id, "task.completed", {"task_id": task.id})
+    else:
+        event_hub.publish(current_user.id, "task.updated", {"task_id": task.id})
     return task
 
 @router.delete("/{task_id}", response_model=Task)
@@ -162,7 +300,9 @@ def delete_user_task(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Not enough permissions"
         )
+    tag_index.forget_task(db, task)
     task = delete_task(db=db, task_id=task_id)
+    event_hub.publish(current_user.id, "task.deleted", {"task_id": task_id})
     return task
 
 @router.get("/{task_id}/subtasks", response_model=List[Task])
@@ -185,4 +325,108 @@ def read_task_subtasks(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Not enough permissions"
         )
-    return get_subtasks(db=db, parent_id=task_id) 
\ No newline at end of file
+    return get_subtasks(db=db, parent_id=task_id)
+
+@router.put("/{task_id}/recurrence", response_model=Recurrence)
+def set_task_recurrence(
+    *,
+    db: Session = Depends(get_db),
+    task_id: int,
+    rule_in: RecurrenceCreate,
+    current_user: User = Depends(get_current_active_user),
+) -> Any:
+    """
+    Make a task recurring, or replace its recurrence rule.
+    """
+    task = get_task(db=db, task_id=task_id)
+    if not task:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Task not found"
+        )
+    if task.owner_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Not enough permissions"
+        )
+    if rule_in.until and rule_in.count:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Give either until or count, not both"
+        )
+    rule = recurrence.set_recurrence(db, task, rule_in)
+    event_hub.publish(current_user.id, "task.updated", {"task_id": task.id})
+    return recurrence.to_schema(rule)
+
+@router.delete("/{task_id}/recurrence", response_model=Task)
+def delete_task_recurrence(
+    *,
+    db: Session = Depends(get_db),
+    task_id: int,
+    current_user: User = Depends(get_current_active_user),
+) -> Any:
+    """
+    Stop a task recurring. Occurrences already materialised are kept.
+    """
+    task = get_task(db=db, task_id=task_id)
+    if not task:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Task not found"
+        )
+    if task.owner_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Not enough permissions"
+        )
+    recurrence.clear_recurrence(db, task)
+    event_hub.publish(current_user.id, "task.updated", {"task_id": task.id})
+    return task
+
+@router.put("/{task_id}/occurrences/{occurrence_at}", response_model=Task)
+def update_task_occurrence(
+    *,
+    db: Session = Depends(get_db),
+    task_id: int,
+    occurrence_at: datetime,
+    task_in: TaskUpdate,
+    current_user: User = Depends(get_current_active_user),
+) -> Any:
+    """
+    Complete or edit one occurrence of a recurring task, storing it as a task.
+    """
+    template = get_task(db=db, task_id=task_id)
+    if not template:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Task not found"
+        )
+    if template.owner_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Not enough permissions"
+        )
+    occurrence_at = recurrence.utc_naive(occurrence_at)
+    if task_in.parent_id is not None:
+        # Checked before materialising, so a bad parent stores nothing
+        stored = recurrence.stored_occurrence(db, template, occurrence_at)
+        problem = subtask_progress.check_parent(db, stored, task_in.parent_id, current_user.id)
+        if problem:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=problem
+            )
+    task = recurrence.materialise_occurrence(db, template, occurrence_at)
+    if task is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Task has no occurrence at that time"
+        )
+    was_completed = task.is_completed
+    analytics.track(db, task, current_user.id)
+    task = update_task(db=db, task=task, task_in=task_in)
+    if task.is_completed and not was_completed:
+        event_hub.publish(current_user.id, "task.completed", {"task_id": task.id})
+    else:
+        event_hub.publish(current_user.id, "task.updated", {"task_id": task.id})
+    return task
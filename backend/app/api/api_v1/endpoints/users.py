@@ -1,13 +1,19 @@
-from typing import Any, List
-from fastapi import APIRouter, Body, Depends, HTTPException, status
+import json
+from typing import Any, Dict, List, Optional
+from fastapi import APIRouter, Body, Depends, HTTPException, Request, status
 from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
-from app.api.deps import get_db, get_current_active_user, get_current_active_superuser
+from app.api import fields as sparse
+from app.api.deps import get_db, get_directory_db, get_user_db, get_current_active_user, get_current_active_superuser
+from app.core.config import settings
 from app.crud.user import get_user, get_users, update_user, delete_user
 from app.models.user import User
 from app.schemas.user import User as UserSchema
 from app.schemas.user import UserUpdate
+from app.services.portability import RECORD_TYPES, Importer, InvalidRecord, export_user_data
 
 router = APIRouter()
 
@@ -33,16 +39,117 @@ def update_user_me(
     user = update_user(db, db_user=current_user, user_in=user_in)
     return user
 
+@router.get("/me/export")
+def export_user_me(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+) -> Any:
+    """
+    Stream all of the current user's tasks, tags, achievements and inventory as NDJSON.
+    """
+    user_id = current_user.id
+    # The export reads through its own session; don't hold this one for the whole stream
+    db.close()
+    return StreamingResponse(
+        export_user_data(user_id, batch_size=settings.EXPORT_BATCH_SIZE),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="task-donegeon-{user_id}.ndjson"'},
+    )
+
+@router.post("/me/import", response_model=Dict[str, int])
+async def import_user_me(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+) -> Any:
+    """
+    Import an NDJSON export into the current user's account. Records get new ids;
+    references between them (subtasks, tags, recurrences) are remapped.
+    Achievements, items and recurrence rules are checked like the create
+    endpoints (requirements met, level high enough, a valid rule); a record
+    that fails, or is malformed, is rejected with 400.
+    Chunks are committed as they arrive, so records before an invalid line stay imported.
+    Returns the number of records imported per type.
+    """
+    user_id = current_user.id
+    db.close()
+    importer = Importer(user_id)
+    batch: List[Dict[str, Any]] = []
+    batch_type = None
+    line_number = 0
+    buffer = b""
+    try:
+        async def handle(line: bytes) -> None:
+            nonlocal batch, batch_type, line_number
+            line_number += 1
+            if len(line) > settings.IMPORT_MAX_LINE_BYTES:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"Line {line_number} is longer than {settings.IMPORT_MAX_LINE_BYTES} bytes"
+                )
+            if not line.strip():
+                return
+            try:
+                record = json.loads(line)
+                record_type, data = record["type"], record["data"]
+            except (ValueError, KeyError, TypeError):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Invalid record on line {line_number}"
+                )
+            if record_type == "header":
+                return
+            if record_type not in RECORD_TYPES:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Unknown record type {record_type!r} on line {line_number}"
+                )
+            if record_type != batch_type or len(batch) >= settings.IMPORT_CHUNK_SIZE:
+                await flush()
+                batch, batch_type = [], record_type
+            batch.append(data)
+
+        async def flush() -> None:
+            if not batch:
+                return
+            try:
+                await run_in_threadpool(importer.add_batch, batch_type, batch)
+            except InvalidRecord as e:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"{e} (before line {line_number})"
+                )
+
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                await handle(line)
+            if len(buffer) > settings.IMPORT_MAX_LINE_BYTES:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"Line {line_number + 1} is longer than {settings.IMPORT_MAX_LINE_BYTES} bytes"
+                )
+        await handle(buffer)
+        await flush()
+        return await run_in_threadpool(importer.finish)
+    finally:
+        await run_in_threadpool(importer.close)
+
 @router.get("", response_model=List[UserSchema])
 def read_users(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_directory_db),
     skip: int = 0,
     limit: int = 100,
+    fields: Optional[List[str]] = Depends(sparse.fieldset(UserSchema)),
     current_user: User = Depends(get_current_active_superuser),
 ) -> Any:
     """
-    Retrieve users. Only superusers can access this endpoint.
+    Retrieve users, optionally only the given fields. Only superusers can access this endpoint.
     """
+    if fields:
+        rows = db.query(*sparse.columns(User, fields)).order_by(User.id).offset(skip).limit(limit)
+        return sparse.render(rows, fields)
     users = get_users(db, skip=skip, limit=limit)
     return users
 
@@ -50,25 +157,28 @@ def read_users(
 def read_user_by_id(
     user_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_user_db),
 ) -> Any:
     """
     Get a specific user by id.
     """
-    user = get_user(db, user_id=user_id)
-    if user == current_user:
-        return user
-    if not current_user.is_superuser:
+    if user_id != current_user.id and not current_user.is_superuser:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="The user doesn't have enough privileges"
         )
+    user = get_user(db, user_id=user_id)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
     return user
 
 @router.put("/{user_id}", response_model=UserSchema)
 def update_user_by_id(
     *,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_user_db),
     user_id: int,
     user_in: UserUpdate,
     current_user: User = Depends(get_current_active_superuser),
@@ -88,7 +198,7 @@ def update_user_by_id(
 @router.delete("/{user_id}", response_model=UserSchema)
 def delete_user_by_id(
     *,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_user_db),
     user_id: int,
     current_user: User = Depends(get_current_active_superuser),
 ) -> Any:
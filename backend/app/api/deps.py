@@ -1,24 +1,39 @@
 from typing import Generator, Optional
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from pydantic import ValidationError
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
+from app.core.sharding import shard_router
 from app.db.session import SessionLocal
 from app.models.user import User
 from app.core.security import verify_token
+from app.core.revocation import revocation_store
+from app.core.query_log import set_user as tag_queries_with_user
 from app.schemas.token import TokenPayload
 
 reusable_oauth2 = OAuth2PasswordBearer(
     tokenUrl=f"{settings.API_V1_STR}/login/access-token"
 )
 
-def get_db() -> Generator:
+def get_db(request: Request) -> Generator:
     """
     Database dependency to be used in FastAPI endpoints.
     Creates a new database session for each request and closes it afterwards.
+    With sharding, the session is on the shard of the authenticated user.
+    """
+    try:
+        db = shard_router.session_for_request(request.headers.get("authorization"))
+        yield db
+    finally:
+        db.close()
+
+def get_directory_db() -> Generator:
+    """
+    Session on the directory database, for data shared by all users
+    (login, households, leaderboards). The same as get_db without sharding.
     """
     try:
         db = SessionLocal()
@@ -26,6 +41,17 @@ def get_db() -> Generator:
     finally:
         db.close()
 
+def get_user_db(user_id: int) -> Generator:
+    """
+    Session on the shard of the user named in the path, for admin endpoints.
+    Doesn't place the user: an unplaced user's row is read from the directory.
+    """
+    try:
+        db = shard_router.session_for_user(user_id, place=False)
+        yield db
+    finally:
+        db.close()
+
 async def get_current_user(
     db: Session = Depends(get_db),
     token: str = Depends(reusable_oauth2)
@@ -41,12 +67,19 @@ async def get_current_user(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
+    if token_data.jti and revocation_store.is_revoked(token_data.jti):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     user = db.query(User).filter(User.id == token_data.sub).first()
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found",
         )
+    tag_queries_with_user(user.id)
     return user
 
 def get_current_active_user(
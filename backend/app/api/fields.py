@@ -0,0 +1,77 @@
+"""
+Sparse fieldsets for listings: ``?fields=id,title,due_date``.
+
+Only the requested columns are selected, and rows are rendered straight
+from the result tuples with one json.dumps, without building ORM objects
+or response models.
+"""
+import json
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, Callable, Iterable, List, Mapping, Optional, Sequence, Type
+
+from fastapi import HTTPException, Query, Response, status
+from pydantic import BaseModel
+from sqlalchemy.sql import ColumnElement
+
+
+def fieldset(schema: Type[BaseModel]) -> Callable[..., Optional[List[str]]]:
+    """
+    Dependency parsing `fields` against the schema a listing returns.
+    Yields None when the parameter is absent; "id" is always included.
+    """
+    allowed = list(schema.model_fields)
+
+    def dependency(
+        fields: Optional[str] = Query(
+            None, description=f"Comma-separated subset of: {', '.join(allowed)}"
+        ),
+    ) -> Optional[List[str]]:
+        if fields is None:
+            return None
+        names = ["id"] if "id" in allowed else []
+        for name in fields.split(","):
+            name = name.strip()
+            if name and name not in names:
+                names.append(name)
+        unknown = [name for name in names if name not in allowed]
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields: {', '.join(unknown)}"
+            )
+        return names
+
+    return dependency
+
+
+def columns(model, names: Sequence[str], computed: Optional[Mapping[str, ColumnElement]] = None) -> List[ColumnElement]:
+    """
+    The model columns (or labelled expressions from `computed`) to select for `names`
+    """
+    computed = computed or {}
+    return [computed[name].label(name) if name in computed else getattr(model, name) for name in names]
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+def render_rows(rows: Iterable[Any], names: Sequence[str]) -> str:
+    """
+    Render rows (ORM objects or result tuples) as a JSON array of the given fields
+    """
+    names = list(names)
+    objects = [{name: _plain(getattr(row, name)) for name in names} for row in rows]
+    return json.dumps(objects, separators=(",", ":"))
+
+
+def render(rows, names: Sequence[str]) -> Response:
+    """
+    A JSON array of the selected fields
+    """
+    return Response(render_rows(rows, names), media_type="application/json")
@@ -0,0 +1,93 @@
+"""
+Routers mounted on first use.
+
+A LazyRouter stands in the app's route table for every path under its
+prefix. The first request there imports the endpoint module, splices its
+routes into the table in the placeholder's place and is dispatched again,
+so rarely used APIs (admin, analytics...) cost nothing at startup.
+"""
+import importlib
+import threading
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from fastapi import APIRouter, FastAPI
+from starlette.concurrency import run_in_threadpool
+from starlette.routing import BaseRoute, Match, NoMatchFound
+from starlette.types import Receive, Scope, Send
+
+# Loads rewrite app.router.routes, so one at a time
+_load_lock = threading.Lock()
+
+
+class LazyRouter(BaseRoute):
+    def __init__(
+        self,
+        app: FastAPI,
+        prefix: str,
+        module: str,
+        tags: Sequence[str],
+        on_load: Optional[Callable[[FastAPI], None]] = None,
+    ):
+        self.app = app
+        self.prefix = prefix
+        self.module = module
+        self.tags = list(tags)
+        self.on_load = on_load
+        self.loaded = False
+
+    def matches(self, scope: Scope) -> Tuple[Match, Scope]:
+        if scope["type"] in ("http", "websocket") and not self.loaded:
+            path = scope["path"]
+            if path == self.prefix or path.startswith(self.prefix + "/"):
+                return Match.FULL, {}
+        return Match.NONE, {}
+
+    def url_path_for(self, name: str, /, **path_params):
+        raise NoMatchFound(name, path_params)
+
+    def load(self) -> None:
+        """
+        Import the module and replace this placeholder with its routes
+        """
+        with _load_lock:
+            if self.loaded:
+                return
+            module = importlib.import_module(self.module)
+            router = APIRouter()
+            router.include_router(module.router, prefix=self.prefix, tags=self.tags)
+            # Swap in a new list: requests being routed keep iterating the old one
+            routes = list(self.app.router.routes)
+            index = routes.index(self)
+            routes[index:index + 1] = router.routes
+            self.app.router.routes = routes
+            self.app.openapi_schema = None
+            if self.on_load is not None:
+                self.on_load(self.app)
+            self.loaded = True
+
+    async def handle(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await run_in_threadpool(self.load)
+        await self.app.router(scope, receive, send)
+
+
+def include_lazy_routers(
+    app: FastAPI,
+    prefix: str,
+    routers: Sequence[Tuple[str, str, Sequence[str]]],
+    on_load: Optional[Callable[[FastAPI], None]] = None,
+) -> List[LazyRouter]:
+    """
+    Add (prefix, module, tags) routers to be imported on first use. The
+    OpenAPI schema loads them all, so the docs stay complete.
+    """
+    lazy = [LazyRouter(app, prefix + path, module, tags, on_load) for path, module, tags in routers]
+    app.router.routes.extend(lazy)
+    openapi = app.openapi
+
+    def openapi_with_lazy_routers():
+        for router in lazy:
+            router.load()
+        return openapi()
+
+    app.openapi = openapi_with_lazy_routers
+    return lazy
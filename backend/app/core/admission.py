@@ -0,0 +1,266 @@
+import asyncio
+import json
+import logging
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Optional, Tuple
+from urllib.parse import parse_qs
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+HEALTH_PATHS = ("/health",)
+AUTH_PATHS = ("/login/access-token", "/register")
+LOGIN_PATH = "/login/access-token"
+LOGIN_MAX_BODY_BYTES = 16 * 1024  # login forms are read to rate limit per username
+WRITE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+
+
+class ConcurrencyLimiter:
+    """
+    Limits concurrent requests for one route class, with a bounded FIFO wait
+    queue. A released slot is handed to the longest waiting request, so new
+    arrivals can't overtake the queue. Requests beyond the queue, or that
+    wait too long, are shed immediately.
+    """
+
+    def __init__(self, name: str, limit: int, queue_size: int, timeout: float):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active = 0
+        self.admitted = 0
+        self.shed = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> bool:
+        """
+        Take a slot, waiting in the queue if needed. Returns False if shed.
+        """
+        if not self._waiters and self.active < self.limit:
+            self.active += 1
+            self.admitted += 1
+            return True
+        if len(self._waiters) >= self.queue_size:
+            self.shed += 1
+            return False
+
+        # Resolved by release() when it hands this request its slot
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait((waiter,), timeout=self.timeout)
+        except asyncio.CancelledError:
+            if waiter.done():
+                self._hand_over()
+            else:
+                self._drop(waiter)
+            raise
+        if not waiter.done():
+            self._drop(waiter)
+            self.shed += 1
+            return False
+        self.admitted += 1
+        return True
+
+    def _drop(self, waiter: asyncio.Future) -> None:
+        waiter.cancel()
+        self._waiters.remove(waiter)
+
+    def _hand_over(self) -> None:
+        # The slot stays active if a waiter takes it
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    async def release(self) -> None:
+        self._hand_over()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queued": self.waiting,
+            "admitted": self.admitted,
+            "shed": self.shed,
+        }
+
+
+class TokenBucketLimiter:
+    """
+    Per-key token buckets (e.g. per client IP), keeping a bounded number of keys
+    """
+
+    def __init__(self, rate: float, burst: int, max_keys: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.rejected = 0
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def take(self, key: str) -> float:
+        """
+        Take a token for key. Returns 0 if allowed, else seconds until a token is free.
+        """
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (float(self.burst), now))
+        tokens = min(float(self.burst), tokens + (now - updated) * self.rate)
+        if tokens >= 1:
+            retry_after = 0.0
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / self.rate
+            self.rejected += 1
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+
+class AdmissionControlMiddleware:
+    """
+    ASGI middleware applying per-route-class concurrency limits and a login
+    rate limit. Health checks always bypass it, so a saturated backend still
+    reports healthy instead of being restarted.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        timeout = settings.ADMISSION_QUEUE_TIMEOUT
+        self.limiters = {
+            "auth": ConcurrencyLimiter(
+                "auth", settings.ADMISSION_AUTH_CONCURRENCY, settings.ADMISSION_AUTH_QUEUE, timeout
+            ),
+            "read": ConcurrencyLimiter(
+                "read", settings.ADMISSION_READ_CONCURRENCY, settings.ADMISSION_READ_QUEUE, timeout
+            ),
+            "write": ConcurrencyLimiter(
+                "write", settings.ADMISSION_WRITE_CONCURRENCY, settings.ADMISSION_WRITE_QUEUE, timeout
+            ),
+        }
+        self.login_limiter = TokenBucketLimiter(
+            settings.LOGIN_RATE_PER_MINUTE / 60.0, settings.LOGIN_RATE_BURST
+        )
+        admission_state["middleware"] = self
+
+    def route_class(self, path: str, method: str) -> Optional[str]:
+        if path in HEALTH_PATHS:
+            return None
+        if path.endswith(AUTH_PATHS):
+            return "auth"
+        if path.endswith("/events"):
+            # Long-lived streams would pin a slot for their whole lifetime
+            return None
+        if method in WRITE_METHODS:
+            return "write"
+        return "read"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        path = scope["path"]
+        route_class = self.route_class(path, scope["method"])
+        if route_class is None:
+            return await self.app(scope, receive, send)
+
+        if path.endswith(LOGIN_PATH):
+            body, receive = await self._read_body(receive)
+            retry_after = self.login_limiter.take(f"{self._client_ip(scope)}:{self._username(body)}")
+            if retry_after:
+                return await self._reject(send, 429, "Too many login attempts", retry_after)
+
+        limiter = self.limiters[route_class]
+        if not await limiter.acquire():
+            logger.warning(f"Shedding {scope['method']} {path} ({route_class} queue full)")
+            return await self._reject(
+                send, 503, "Server is busy, please retry", settings.ADMISSION_RETRY_AFTER
+            )
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            await limiter.release()
+
+    @staticmethod
+    def _client_ip(scope) -> str:
+        if settings.FORWARDED_FOR_HEADER:
+            name = settings.FORWARDED_FOR_HEADER.lower().encode("latin-1")
+            for key, value in scope.get("headers", ()):
+                if key == name:
+                    # The proxy appends the address it saw; earlier entries are client supplied
+                    return value.decode("latin-1").split(",")[-1].strip()
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    @staticmethod
+    def _username(body: bytes) -> str:
+        try:
+            values = parse_qs(body.decode("utf-8")).get("username")
+        except UnicodeDecodeError:
+            values = None
+        return values[0].strip().lower() if values else ""
+
+    @staticmethod
+    async def _read_body(receive):
+        """
+        Read up to LOGIN_MAX_BODY_BYTES of the request body. Returns it and a
+        receive callable that replays what was read to the app.
+        """
+        messages = []
+        body = b""
+        more_body = True
+        while more_body and len(body) <= LOGIN_MAX_BODY_BYTES:
+            message = await receive()
+            messages.append(message)
+            if message["type"] != "http.request":
+                break
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+        async def replay():
+            if messages:
+                return messages.pop(0)
+            return await receive()
+
+        return body, replay
+
+    async def _reject(self, send, status_code: int, detail: str, retry_after: float) -> None:
+        body = json.dumps({"detail": detail}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        stats = {name: limiter.stats() for name, limiter in self.limiters.items()}
+        stats["login"] = {"rejected": self.login_limiter.rejected}
+        return stats
+
+
+# The middleware instance, once Starlette has built it
+admission_state: Dict[str, AdmissionControlMiddleware] = {}
+
+
+def admission_stats() -> Dict[str, Dict[str, int]]:
+    """
+    Current queue depth and shed counts per route class
+    """
+    middleware = admission_state.get("middleware")
+    return middleware.stats() if middleware is not None else {}
@@ -0,0 +1,278 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+
+
+class CacheBackend(ABC):
+    """
+    Byte-level key/value store with TTLs. Keys are already namespaced.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def incr(self, key: str) -> int:
+        """
+        Increment an integer counter (starting from 0) and return the new value
+        """
+
+
+class MemoryBackend(CacheBackend):
+    """
+    In-process LRU. Fastest, but each worker has its own copy. Counters
+    (namespace versions) are kept outside the LRU: evicting one would reset
+    its namespace to version 0 and bring back entries invalidated before.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[bytes, Optional[float]]]" = OrderedDict()
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            if key in self._counters:
+                return str(self._counters[key]).encode()
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._counters.pop(key, None)
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+            self._counters.pop(key, None)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            value = self._counters.get(key, int(entry[0]) if entry else 0) + 1
+            self._counters[key] = value
+            return value
+
+
+class SQLiteBackend(CacheBackend):
+    """
+    Cache in a WAL-mode SQLite file, shared by every worker on the host
+    """
+
+    def __init__(self, path: str, prune_interval: float = 60.0):
+        self.path = path
+        self.prune_interval = prune_interval
+        self._local = threading.local()
+        self._last_prune = time.monotonic()
+
+    def _conn(self) -> sqlite3.Connection:
+        """
+        One connection per thread, never shared with a forked child
+        """
+        if getattr(self._local, "pid", None) != os.getpid():
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)"
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return self._local.conn
+
+    def get(self, key: str) -> Optional[bytes]:
+        row = self._conn().execute(
+            "SELECT value FROM cache WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time()),
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, time.time() + ttl if ttl else None),
+        )
+        if time.monotonic() - self._last_prune > self.prune_interval:
+            self._last_prune = time.monotonic()
+            conn.execute("DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),))
+
+    def delete(self, key: str) -> None:
+        self._conn().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def incr(self, key: str) -> int:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+            value = int(row[0]) + 1 if row else 1
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, NULL)",
+                (key, str(value).encode()),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return value
+
+
+class RedisBackend(CacheBackend):
+    """
+    Any Redis-protocol server, for caches shared across hosts.
+    Requires the optional ``redis`` package.
+    """
+
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("CACHE_URL points at Redis but the 'redis' package is not installed") from e
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        self.client.set(key, value, px=int(ttl * 1000) if ttl else None)
+
+    def delete(self, key: str) -> None:
+        self.client.delete(key)
+
+    def incr(self, key: str) -> int:
+        return int(self.client.incr(key))
+
+
+def backend_from_url(url: str) -> CacheBackend:
+    """
+    Build a backend from CACHE_URL: memory://, sqlite:///path/to/file.db or redis://host:port/db
+    """
+    if url.startswith("memory://"):
+        return MemoryBackend(settings.CACHE_MAX_ENTRIES)
+    if url.startswith("sqlite:///"):
+        return SQLiteBackend(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    raise ValueError(f"Unsupported CACHE_URL: {url}")
+
+
+class Namespace:
+    """
+    A group of cache keys that can be invalidated together by bumping its version
+    """
+
+    def __init__(self, cache: "Cache", name: str):
+        self.cache = cache
+        self.name = name
+
+    def _version(self) -> int:
+        value = self.cache.backend.get(f"{self.name}:__version__")
+        return int(value) if value is not None else 0
+
+    def _key(self, key: str) -> str:
+        return f"{self.name}:{self._version()}:{key}"
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self.cache.backend.get(self._key(key))
+        stats = self.cache.stats[self.name]
+        if value is not None:
+            try:
+                value = json.loads(value)
+            except ValueError:
+                # Written by an older release (pickle); recomputed on the next set
+                value = None
+            else:
+                stats["hits"] += 1
+                return value
+        stats["misses"] += 1
+        return default
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Store a JSON-serialisable value
+        """
+        self.cache.stats[self.name]["sets"] += 1
+        encoded = json.dumps(value, separators=(",", ":")).encode("utf-8")
+        self.cache.backend.set(self._key(key), encoded, ttl or settings.CACHE_DEFAULT_TTL)
+
+    def get_or_set(self, key: str, factory: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        value = self.get(key, MISSING)
+        if value is MISSING:
+            value = factory()
+            self.set(key, value, ttl)
+        return value
+
+    def delete(self, key: str) -> None:
+        self.cache.backend.delete(self._key(key))
+
+    def invalidate(self) -> None:
+        """
+        Invalidate every key in the namespace, in every worker sharing the backend
+        """
+        self.cache.stats[self.name]["invalidations"] += 1
+        self.cache.backend.incr(f"{self.name}:__version__")
+
+
+class Cache:
+    """
+    Namespaced cache over a pluggable backend, with per-namespace stats
+    """
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self.stats: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: {"hits": 0, "misses": 0, "sets": 0, "invalidations": 0}
+        )
+        self._namespaces: Dict[str, Namespace] = {}
+
+    def namespace(self, name: str) -> Namespace:
+        if name not in self._namespaces:
+            self._namespaces[name] = Namespace(self, name)
+        return self._namespaces[name]
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        stats = {}
+        for name, counters in self.stats.items():
+            lookups = counters["hits"] + counters["misses"]
+            stats[name] = dict(counters, hit_rate=round(counters["hits"] / lookups, 3) if lookups else None)
+        return stats
+
+
+cache = Cache(backend_from_url(settings.CACHE_URL))
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List
 import secrets
 from pathlib import Path
 
@@ -10,6 +10,8 @@ class Settings(BaseSettings):
     # Security
     SECRET_KEY: str = secrets.token_urlsafe(32)
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8  # 8 days
+    JWT_KEY_ROTATION_DAYS: int = 30
+    REVOCATION_REFRESH_SECONDS: float = 2.0  # how quickly other workers see a logout
     
     # CORS
     CORS_ORIGINS: List[str] = [
@@ -24,16 +26,102 @@ class Settings(BaseSettings):
     # Database
     DATABASE_URL: str = "sqlite:///./task_donegeon.db"
     
+    # Admission control (per worker): concurrent requests and wait queue per route class
+    ADMISSION_AUTH_CONCURRENCY: int = 4
+    ADMISSION_AUTH_QUEUE: int = 32
+    ADMISSION_READ_CONCURRENCY: int = 64
+    ADMISSION_READ_QUEUE: int = 256
+    ADMISSION_WRITE_CONCURRENCY: int = 16
+    ADMISSION_WRITE_QUEUE: int = 128
+    ADMISSION_QUEUE_TIMEOUT: float = 5.0  # seconds a request may wait for a slot
+    ADMISSION_RETRY_AFTER: int = 2  # seconds, sent with 503 responses
+    LOGIN_RATE_PER_MINUTE: int = 10  # token bucket refill per client IP and username
+    LOGIN_RATE_BURST: int = 5
+    # Header a trusted reverse proxy puts the client IP in (its last entry is
+    # used), e.g. "X-Forwarded-For"; empty uses the peer address
+    FORWARDED_FOR_HEADER: str = ""
+    
+    # Dashboard
+    DASHBOARD_RECENT_ACHIEVEMENTS: int = 5
+    
+    # Recurring tasks: how far back /tasks/overdue looks for missed occurrences,
+    # and the widest window /tasks/range will expand
+    RECURRENCE_OVERDUE_DAYS: int = 7
+    RECURRENCE_MAX_RANGE_DAYS: int = 366
+    
+    # "Next best task" ranking (GET /tasks/next): score weights, how many
+    # tasks are ranked and cached per user, and how long the cache may age
+    NEXT_TASKS_WEIGHTS: Dict[str, float] = {"priority": 3.0, "urgency": 4.0, "reward": 1.0, "ease": 0.5}
+    NEXT_TASKS_MAX_K: int = 50
+    NEXT_TASKS_CACHE_TTL: int = 300
+
+    # Mark a parent task completed when its last open subtask is completed
+    SUBTASKS_AUTO_COMPLETE_PARENT: bool = False
+
+    # Profiling (admin only): longest sampling run, sampling interval, and
+    # functions listed in X-Profile reports
+    PROFILE_MAX_SECONDS: int = 60
+    PROFILE_SAMPLE_INTERVAL_MS: float = 10.0
+    PROFILE_REPORT_LINES: int = 40
+
+    # Group commit: queue small writes (task create/update, tagging) to one
+    # writer thread that commits them in batches of up to MAX_BATCH units,
+    # waiting at most MAX_WAIT_MS for a batch to fill
+    WRITE_COALESCING: bool = False
+    WRITE_COALESCE_MAX_BATCH: int = 64
+    WRITE_COALESCE_MAX_WAIT_MS: float = 2.0
+
+    # Data export/import (rows per cursor batch / per insert transaction)
+    EXPORT_BATCH_SIZE: int = 1000
+    IMPORT_CHUNK_SIZE: int = 1000
+    IMPORT_MAX_LINE_BYTES: int = 1024 * 1024  # longer import lines are rejected
+    
+    # Server-push events
+    EVENTS_QUEUE_SIZE: int = 100  # per client; oldest events are dropped beyond this
+    EVENTS_HEARTBEAT_SECONDS: int = 15
+    
     # File Storage
     BASE_PATH: str = "/data"
     UPLOAD_FOLDER: str = f"{BASE_PATH}/uploads"
     MAX_UPLOAD_SIZE: int = 16 * 1024 * 1024  # 16MB
     
+    # Shared cache: memory://, sqlite:///path/to/cache.db or redis://host:port/db
+    CACHE_URL: str = f"sqlite:///{BASE_PATH}/data/cache.db"
+    CACHE_DEFAULT_TTL: int = 300  # seconds
+    CACHE_MAX_ENTRIES: int = 10000  # memory:// backend only
+    
+    # Per-household sharding (manage.py split-shards): 0 keeps all data in
+    # DATABASE_URL; otherwise users' data is spread over SHARD_COUNT SQLite
+    # files and DATABASE_URL is the directory of users and shards
+    SHARD_COUNT: int = 0
+    SHARD_DIRECTORY: str = f"{BASE_PATH}/data/shards"
+    SHARD_MAX_OPEN_ENGINES: int = 32  # least recently used shard engines are closed beyond this
+    
+    # Background jobs (manage.py worker)
+    JOB_POLL_INTERVAL_SECONDS: float = 1.0
+    JOB_SCHEDULER_INTERVAL_SECONDS: float = 15.0
+    JOB_LOCK_TIMEOUT_SECONDS: int = 600  # running jobs without a heartbeat for this long are requeued
+    JOB_HEARTBEAT_SECONDS: float = 30.0  # how often a worker refreshes its running job's lock
+    JOB_RETRY_BACKOFF_SECONDS: float = 30.0  # doubled on each attempt
+    JOB_RETENTION_DAYS: int = 7
+    BACKUP_DIRECTORY: str = f"{BASE_PATH}/data/backups"  # nightly copies of the databases
+    BACKUP_KEEP: int = 7
+    
+    # Signing keys shared by all workers
+    JWT_KEYRING_FILE: str = f"{BASE_PATH}/config/jwt_keys.json"
+    
+    # SQLite file relaying server-push events across workers; empty disables
+    EVENTS_BUS_PATH: str = f"{BASE_PATH}/data/event_bus.db"
+    
     # Logging
     LOG_LEVEL: str = "INFO"
     LOG_FORMAT: str = "%(asctime)s - %(name)s - %(levelname)s - [%(pathname)s:%(lineno)d] - %(message)s"
     LOG_FILE: str = f"{BASE_PATH}/config/app.log"
     AUDIT_LOG_FILE: str = f"{BASE_PATH}/config/audit.log"
+    # Statements slower than this are logged with their route and user; <= 0 disables
+    SLOW_QUERY_THRESHOLD_MS: float = 200.0
+    SLOW_QUERY_EXPLAIN_SAMPLE: float = 0.1  # fraction of slow statements explained
+    SLOW_QUERY_LOG_FILE: str = f"{BASE_PATH}/config/slow_queries.log"
     
     class Config:
         env_file = ".env"
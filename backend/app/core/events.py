@@ -0,0 +1,242 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """
+    A single client's stream of events for one user.
+    The queue is bounded: when a slow client falls behind, the oldest events
+    are dropped and a "lagged" event tells the client to refetch its state.
+    """
+
+    def __init__(self, user_id: int, loop: asyncio.AbstractEventLoop, max_size: int):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+        self.dropped = 0
+
+    def _put(self, event: Dict[str, Any]) -> None:
+        """
+        Enqueue an event, dropping the oldest one if the client is too slow.
+        Runs on the event loop thread.
+        """
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self) -> Dict[str, Any]:
+        """
+        Wait for the next event, first reporting any events dropped since the last one
+        """
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            return {"id": None, "type": "lagged", "data": {"dropped": dropped}, "ts": time.time()}
+        return await self.queue.get()
+
+
+class EventHub:
+    """
+    In-process pub/sub hub fanning out per-user change events to subscribers.
+    Events published in one worker are relayed to the others through the bus.
+    Listeners see every event of their type, for any user, in every worker,
+    which lets in-memory state (e.g. the leaderboard) follow other workers' writes.
+    """
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self.origin = uuid.uuid4().hex
+        self._subscriptions: Dict[int, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._listeners: Dict[str, List[Callable[[int, Dict[str, Any]], None]]] = {}
+        self.bus: Optional["SQLiteEventBus"] = None
+
+    def add_listener(self, event_type: str, callback: Callable[[int, Dict[str, Any]], None]) -> None:
+        """
+        Call callback(user_id, event) for every event of this type. Runs on the
+        publishing or relay thread, so it must be quick and thread-safe.
+        """
+        with self._lock:
+            self._listeners.setdefault(event_type, []).append(callback)
+
+    def subscribe(self, user_id: int) -> Subscription:
+        """
+        Register a subscriber for a user's events. Must be called on the event loop.
+        """
+        subscription = Subscription(user_id, asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def publish(self, user_id: int, event_type: str, data: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Publish a change event for a user. Safe to call from any thread.
+        """
+        event = {"type": event_type, "data": data or {}, "ts": time.time()}
+        self.dispatch(user_id, event)
+        if self.bus is not None:
+            self.bus.send(user_id, event)
+
+    def dispatch(self, user_id: int, event: Dict[str, Any]) -> None:
+        """
+        Deliver an event to this worker's listeners and subscribers only
+        """
+        with self._lock:
+            listeners = list(self._listeners.get(event["type"], ()))
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for listener in listeners:
+            try:
+                listener(user_id, event)
+            except Exception as e:
+                logger.error(f"Event listener for {event['type']} failed: {e}", exc_info=True)
+        if not subscriptions:
+            return
+        event = dict(event, id=next(self._ids))
+        for subscription in subscriptions:
+            subscription.loop.call_soon_threadsafe(subscription._put, event)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(s) for s in self._subscriptions.values())
+
+
+class SQLiteEventBus:
+    """
+    Relays events between workers on one host through a small SQLite file.
+    A background thread appends this worker's events and polls for the
+    events written by other workers.
+    """
+
+    def __init__(self, hub: EventHub, path: str, poll_interval: float = 0.25, retention: float = 60.0):
+        self.hub = hub
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._outgoing: queue.Queue = queue.Queue()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_id = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, origin TEXT NOT NULL, "
+            "user_id INTEGER NOT NULL, payload TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        return conn
+
+    def start(self) -> None:
+        conn = self._connect()
+        self._last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+        conn.close()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="event-bus", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def send(self, user_id: int, event: Dict[str, Any]) -> None:
+        self._outgoing.put((user_id, event))
+
+    def _run(self) -> None:
+        conn = self._connect()
+        last_prune = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                try:
+                    self._flush(conn)
+                    self._poll(conn)
+                    if time.monotonic() - last_prune > self.retention:
+                        conn.execute("DELETE FROM events WHERE created_at < ?", (time.time() - self.retention,))
+                        last_prune = time.monotonic()
+                except sqlite3.Error as e:
+                    logger.warning(f"Event bus error: {e}")
+                self._stop.wait(self.poll_interval)
+        finally:
+            conn.close()
+
+    def _flush(self, conn: sqlite3.Connection) -> None:
+        rows: List[tuple] = []
+        while True:
+            try:
+                user_id, event = self._outgoing.get_nowait()
+            except queue.Empty:
+                break
+            rows.append((self.hub.origin, user_id, json.dumps(event), time.time()))
+        if rows:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT INTO events (origin, user_id, payload, created_at) VALUES (?, ?, ?, ?)", rows
+            )
+            conn.execute("COMMIT")
+
+    def _poll(self, conn: sqlite3.Connection) -> None:
+        rows = conn.execute(
+            "SELECT id, origin, user_id, payload FROM events WHERE id > ? ORDER BY id",
+            (self._last_id,),
+        ).fetchall()
+        for event_id, origin, user_id, payload in rows:
+            self._last_id = event_id
+            if origin != self.hub.origin:
+                self.hub.dispatch(user_id, json.loads(payload))
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """
+    Format an event as a Server-Sent Events message
+    """
+    data = json.dumps({"data": event["data"], "ts": event["ts"]})
+    message = f"event: {event['type']}\ndata: {data}\n\n"
+    if event.get("id") is not None:
+        message = f"id: {event['id']}\n" + message
+    return message
+
+
+event_hub = EventHub(queue_size=settings.EVENTS_QUEUE_SIZE)
+
+
+def start_event_relay() -> None:
+    """
+    Start relaying events across workers, if enabled
+    """
+    if settings.EVENTS_BUS_PATH:
+        event_hub.bus = SQLiteEventBus(event_hub, settings.EVENTS_BUS_PATH)
+        event_hub.bus.start()
+        logger.info(f"Event relay started (worker {event_hub.origin[:8]}, pid {os.getpid()})")
+
+
+def stop_event_relay() -> None:
+    if event_hub.bus is not None:
+        event_hub.bus.stop()
+        event_hub.bus = None
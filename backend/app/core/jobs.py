@@ -0,0 +1,340 @@
+import json
+import logging
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.cron import CronSchedule
+from app.core.events import start_event_relay, stop_event_relay
+from app.core.sharding import shard_router
+from app.db.session import SessionLocal
+from app.models.job import Job
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class JobDefinition:
+    name: str
+    func: Callable[..., Any]
+    max_attempts: int
+    every: Optional[timedelta] = None
+    cron: Optional[CronSchedule] = None
+    shards: bool = False
+
+
+# Registered job handlers, by name
+registry: Dict[str, JobDefinition] = {}
+
+
+def job(
+    name: str,
+    max_attempts: int = 5,
+    every: Optional[timedelta] = None,
+    cron: Optional[str] = None,
+    shards: bool = False,
+):
+    """
+    Register a job handler. Handlers are called as func(db, **payload).
+    Give `every` or `cron` to have the worker schedule it periodically.
+    Handlers of user data pass `shards`: with sharding on they run once per
+    shard database instead of against the directory.
+    """
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        registry[name] = JobDefinition(
+            name=name,
+            func=func,
+            max_attempts=max_attempts,
+            every=every,
+            cron=CronSchedule(cron) if cron else None,
+            shards=shards,
+        )
+        return func
+    return decorator
+
+
+def enqueue(
+    db: Session,
+    name: str,
+    payload: Optional[Dict[str, Any]] = None,
+    run_at: Optional[datetime] = None,
+    dedupe_key: Optional[str] = None,
+) -> Optional[Job]:
+    """
+    Queue a job. With a dedupe_key, a job already queued under the same key wins
+    and None is returned.
+    """
+    definition = registry.get(name)
+    new_job = Job(
+        name=name,
+        payload=json.dumps(payload or {}),
+        run_at=run_at or datetime.utcnow(),
+        max_attempts=definition.max_attempts if definition else 5,
+        dedupe_key=dedupe_key,
+    )
+    db.add(new_job)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return None
+    return new_job
+
+
+def claim_job(db: Session, worker_id: str) -> Optional[Job]:
+    """
+    Atomically claim the next due job.
+    PostgreSQL uses FOR UPDATE SKIP LOCKED; elsewhere (SQLite) a conditional
+    UPDATE acts as compare-and-swap, so two workers can never claim the same row.
+    """
+    now = datetime.utcnow()
+    due = (
+        db.query(Job.id)
+        .filter(Job.status == "queued", Job.run_at <= now)
+        .order_by(Job.run_at, Job.id)
+    )
+    if db.bind.dialect.name == "postgresql":
+        job_id = due.with_for_update(skip_locked=True).limit(1).scalar()
+        candidates = [job_id] if job_id else []
+    else:
+        candidates = [row.id for row in due.limit(5).all()]
+
+    for job_id in candidates:
+        claimed = (
+            db.query(Job)
+            .filter(Job.id == job_id, Job.status == "queued")
+            .update(
+                {
+                    Job.status: "running",
+                    Job.locked_by: worker_id,
+                    Job.locked_at: now,
+                    Job.started_at: now,
+                    Job.attempts: Job.attempts + 1,
+                },
+                synchronize_session=False,
+            )
+        )
+        db.commit()
+        if claimed:
+            return db.get(Job, job_id)
+    return None
+
+
+@contextmanager
+def heartbeat(job_id: int, worker_id: str) -> Iterator[None]:
+    """
+    Refresh a running job's locked_at every JOB_HEARTBEAT_SECONDS, so
+    requeue_stale_jobs only takes back jobs whose worker stopped beating
+    """
+    stop = threading.Event()
+
+    def beat() -> None:
+        while not stop.wait(settings.JOB_HEARTBEAT_SECONDS):
+            db = SessionLocal()
+            try:
+                db.query(Job).filter(
+                    Job.id == job_id, Job.status == "running", Job.locked_by == worker_id
+                ).update({Job.locked_at: datetime.utcnow()}, synchronize_session=False)
+                db.commit()
+            except Exception as e:
+                logger.warning(f"Heartbeat for job {job_id} failed: {e}")
+            finally:
+                db.close()
+
+    thread = threading.Thread(target=beat, name=f"job-heartbeat-{job_id}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def requeue_stale_jobs(db: Session) -> int:
+    """
+    Put back jobs whose worker died while running them (no heartbeat for
+    JOB_LOCK_TIMEOUT_SECONDS)
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.JOB_LOCK_TIMEOUT_SECONDS)
+    count = (
+        db.query(Job)
+        .filter(Job.status == "running", Job.locked_at < cutoff)
+        .update({Job.status: "queued", Job.locked_by: None, Job.locked_at: None}, synchronize_session=False)
+    )
+    db.commit()
+    if count:
+        logger.warning(f"Requeued {count} stale jobs")
+    return count
+
+
+def run_job(db: Session, claimed: Job) -> None:
+    """
+    Run a claimed job, then mark it done, retry it with backoff, or fail it
+    """
+    started = time.perf_counter()
+    latency = (claimed.started_at - claimed.run_at).total_seconds()
+    definition = registry.get(claimed.name)
+    try:
+        if definition is None:
+            raise LookupError(f"No handler registered for job {claimed.name!r}")
+        payload = json.loads(claimed.payload)
+        with heartbeat(claimed.id, claimed.locked_by):
+            if definition.shards and shard_router.enabled:
+                shard_router.each_shard(lambda shard_db: definition.func(shard_db, **payload))
+            else:
+                definition.func(db, **payload)
+    except Exception as e:
+        db.rollback()
+        claimed.last_error = "".join(traceback.format_exception_only(type(e), e)).strip()
+        claimed.locked_by = None
+        claimed.locked_at = None
+        if claimed.attempts < claimed.max_attempts:
+            backoff = settings.JOB_RETRY_BACKOFF_SECONDS * 2 ** (claimed.attempts - 1)
+            claimed.status = "queued"
+            claimed.run_at = datetime.utcnow() + timedelta(seconds=backoff * random.uniform(0.8, 1.2))
+            logger.warning(f"Job {claimed.id} ({claimed.name}) failed, retrying in {backoff:.0f}s: {e}")
+        else:
+            claimed.status = "failed"
+            claimed.finished_at = datetime.utcnow()
+            logger.error(f"Job {claimed.id} ({claimed.name}) failed permanently: {e}", exc_info=True)
+        db.commit()
+        return
+
+    claimed.status = "done"
+    claimed.finished_at = datetime.utcnow()
+    claimed.locked_by = None
+    claimed.locked_at = None
+    db.commit()
+    logger.info(
+        f"Job {claimed.id} ({claimed.name}) done: "
+        f"queue latency {latency * 1000:.0f} ms, run time {(time.perf_counter() - started) * 1000:.0f} ms"
+    )
+
+
+def schedule_periodic_jobs(db: Session, now: Optional[datetime] = None) -> None:
+    """
+    Enqueue the next run of every periodic job. Runs are deduplicated by their
+    due time, so several worker hosts can schedule without double-queuing.
+    """
+    now = now or datetime.utcnow()
+    for definition in registry.values():
+        if definition.cron is not None:
+            due = definition.cron.next_after(now - timedelta(minutes=1))
+        elif definition.every is not None:
+            period = definition.every.total_seconds()
+            # `now` is naive UTC; timestamp() would read it as local time
+            epoch_seconds = now.replace(tzinfo=timezone.utc).timestamp()
+            due = datetime.utcfromtimestamp((epoch_seconds // period) * period)
+        else:
+            continue
+        enqueue(db, definition.name, run_at=due, dedupe_key=f"{definition.name}@{due.isoformat()}")
+
+
+def job_stats(db: Session, window: timedelta = timedelta(hours=1)) -> Dict[str, Any]:
+    """
+    Queue depth, throughput and latency over the last `window`
+    """
+    since = datetime.utcnow() - window
+    by_status = dict(db.query(Job.status, func.count(Job.id)).group_by(Job.status).all())
+    finished = (
+        db.query(Job.run_at, Job.started_at, Job.finished_at)
+        .filter(Job.status == "done", Job.finished_at >= since)
+        .all()
+    )
+    latencies = sorted((row.started_at - row.run_at).total_seconds() for row in finished)
+    durations = sorted((row.finished_at - row.started_at).total_seconds() for row in finished)
+
+    def percentile(values: List[float], p: float) -> Optional[float]:
+        return round(values[min(len(values) - 1, int(len(values) * p))], 3) if values else None
+
+    return {
+        "by_status": by_status,
+        "done_per_minute": round(len(finished) / (window.total_seconds() / 60), 2),
+        "latency_p50": percentile(latencies, 0.5),
+        "latency_p95": percentile(latencies, 0.95),
+        "duration_p50": percentile(durations, 0.5),
+        "duration_p95": percentile(durations, 0.95),
+    }
+
+
+def worker_loop(worker_id: str, stop: "multiprocessing.synchronize.Event") -> None:
+    """
+    Claim and run jobs until asked to stop
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from app.db.session import engine
+    engine.dispose(close=False)
+    # Events published by jobs reach the web workers' subscribers
+    start_event_relay()
+    logger.info(f"Job worker {worker_id} started")
+    while not stop.is_set():
+        db = SessionLocal()
+        try:
+            claimed = claim_job(db, worker_id)
+            if claimed is not None:
+                run_job(db, claimed)
+                continue
+        except Exception as e:
+            logger.error(f"Job worker {worker_id} error: {e}", exc_info=True)
+        finally:
+            db.close()
+        stop.wait(settings.JOB_POLL_INTERVAL_SECONDS)
+    stop_event_relay()
+
+
+def run_worker_pool(processes: int) -> None:
+    """
+    Run `processes` job workers plus the periodic scheduler, restarting workers that die
+    """
+    import app.jobs  # noqa: F401  registers the job handlers
+
+    stop = multiprocessing.Event()
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+
+    def start_worker(index: int) -> multiprocessing.Process:
+        process = multiprocessing.Process(
+            target=worker_loop, args=(f"{prefix}:{index}", stop), name=f"job-worker-{index}", daemon=True
+        )
+        process.start()
+        return process
+
+    def shutdown(signum, frame):
+        stop.set()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    workers = [start_worker(i) for i in range(processes)]
+    logger.info(f"Job worker pool started with {processes} processes")
+    while not stop.is_set():
+        db = SessionLocal()
+        try:
+            requeue_stale_jobs(db)
+            schedule_periodic_jobs(db)
+        except Exception as e:
+            logger.error(f"Job scheduler error: {e}", exc_info=True)
+        finally:
+            db.close()
+        for index, process in enumerate(workers):
+            if not process.is_alive() and not stop.is_set():
+                logger.warning(f"Job worker {index} exited with {process.exitcode}, restarting")
+                workers[index] = start_worker(index)
+        stop.wait(settings.JOB_SCHEDULER_INTERVAL_SECONDS)
+
+    for process in workers:
+        process.join(timeout=settings.JOB_LOCK_TIMEOUT_SECONDS)
+    logger.info("Job worker pool stopped")
@@ -0,0 +1,156 @@
+import fcntl
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class KeyRing:
+    """
+    JWT signing keys shared by every worker through a JSON file.
+
+    The newest key signs new tokens and is advertised in the ``kid`` header;
+    older keys keep verifying tokens until those tokens would have expired.
+    Keys are parsed once and cached, and the file is only re-read when its
+    modification time changes (checked at most every ``reload_interval`` seconds).
+    """
+
+    def __init__(self, path: str, rotation_days: int, retention_minutes: int, reload_interval: float = 5.0):
+        self.path = Path(path)
+        self.rotation = timedelta(days=rotation_days)
+        self.retention = timedelta(minutes=retention_minutes)
+        self.reload_interval = reload_interval
+        self._keys: Dict[str, str] = {}
+        # (kid, secret, created_at) of the signing key, swapped in as one value
+        # so a concurrent reader never pairs a kid with another load's keys
+        self._active: Optional[Tuple[str, str, datetime]] = None
+        self._mtime = 0.0
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _file_lock(self):
+        """
+        Serialise key creation and rotation across worker processes
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(f"{self.path}.lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read(self) -> List[dict]:
+        try:
+            return json.loads(self.path.read_text())["keys"]
+        except (OSError, ValueError, KeyError):
+            return []
+
+    def _write(self, keys: List[dict]) -> None:
+        tmp_path = self.path.with_suffix(".tmp")
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as tmp_file:
+            # A leftover file keeps its old mode, so restrict it before any secret is written
+            os.fchmod(fd, 0o600)
+            tmp_file.write(json.dumps({"keys": keys}, indent=2))
+        os.replace(tmp_path, self.path)
+
+    def _load(self) -> None:
+        keys = self._read()
+        self._keys = {key["kid"]: key["secret"] for key in keys}
+        if keys:
+            newest = max(keys, key=lambda k: k["created_at"])
+            self._active = (newest["kid"], newest["secret"], datetime.fromisoformat(newest["created_at"]))
+        try:
+            self._mtime = self.path.stat().st_mtime
+        except OSError:
+            self._mtime = 0.0
+
+    def _refresh(self) -> None:
+        now = time.monotonic()
+        if self._active and now - self._checked_at < self.reload_interval:
+            return
+        with self._lock:
+            self._checked_at = now
+            try:
+                mtime = self.path.stat().st_mtime
+            except OSError:
+                mtime = 0.0
+            if not self._active or mtime != self._mtime:
+                self._load()
+            if not self._active or self._is_due():
+                self.rotate()
+
+    def _is_due(self) -> bool:
+        return self._active is None or datetime.utcnow() - self._active[2] >= self.rotation
+
+    def rotate(self, force: bool = False) -> str:
+        """
+        Add a new signing key and drop keys no token can still be signed with.
+        Another worker may rotate first; then its key is picked up instead.
+        """
+        with self._file_lock():
+            keys = self._read()
+            now = datetime.utcnow()
+            newest = max(keys, key=lambda k: k["created_at"]) if keys else None
+            if force or newest is None or now - datetime.fromisoformat(newest["created_at"]) >= self.rotation:
+                newest = {
+                    "kid": secrets.token_hex(8),
+                    "secret": secrets.token_urlsafe(48),
+                    "created_at": now.isoformat(),
+                }
+                # A key stops signing when the next one is created; keep it for
+                # as long as tokens it signed may still be valid.
+                keys = [
+                    key for key in keys
+                    if now - datetime.fromisoformat(key["created_at"]) < self.rotation + self.retention
+                ]
+                keys.append(newest)
+                self._write(keys)
+                logger.info(f"Rotated JWT signing key (kid {newest['kid']})")
+            self._load()
+            return newest["kid"]
+
+    def signing_key(self) -> tuple:
+        """
+        The (kid, secret) pair used to sign new tokens
+        """
+        self._refresh()
+        kid, secret, _ = self._active
+        return kid, secret
+
+    def verification_key(self, kid: Optional[str]) -> Optional[str]:
+        """
+        The secret for a token's kid, or None if the key is unknown or retired
+        """
+        self._refresh()
+        secret = self._keys.get(kid)
+        if secret is None and kid is not None:
+            # The key may have been created by another worker since the last check
+            with self._lock:
+                try:
+                    changed = self.path.stat().st_mtime != self._mtime
+                except OSError:
+                    changed = False
+                if changed:
+                    self._load()
+            secret = self._keys.get(kid)
+        return secret
+
+
+keyring = KeyRing(
+    settings.JWT_KEYRING_FILE,
+    rotation_days=settings.JWT_KEY_ROTATION_DAYS,
+    retention_minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES,
+)
@@ -35,6 +35,14 @@ def setup_logging() -> logging.Logger:
     )
     audit_handler.setFormatter(formatter)
     
+    # Setup slow query log handler (one JSON entry per line)
+    slow_query_handler = RotatingFileHandler(
+        settings.SLOW_QUERY_LOG_FILE,
+        maxBytes=10*1024*1024,  # 10MB
+        backupCount=5
+    )
+    slow_query_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+    
     # Configure root logger
     root_logger = logging.getLogger()
     root_logger.setLevel(settings.LOG_LEVEL)
@@ -46,6 +54,12 @@ def setup_logging() -> logging.Logger:
     audit_logger.setLevel(logging.INFO)
     audit_logger.addHandler(audit_handler)
     
+    # Setup slow query logger
+    slow_query_logger = logging.getLogger('slow_query')
+    slow_query_logger.setLevel(logging.INFO)
+    slow_query_logger.addHandler(slow_query_handler)
+    slow_query_logger.propagate = False
+    
     # Create and return application logger
     logger = root_logger.getChild('app')
     logger.info('Logging system initialized')
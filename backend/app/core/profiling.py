@@ -0,0 +1,203 @@
+"""
+On-demand profiling of a live worker.
+
+- SamplingProfiler: snapshots every thread's stack at a fixed interval for a
+  bounded time and returns collapsed stacks ("root;caller;callee count"),
+  the input format of flamegraph.pl and speedscope. Nothing runs between
+  profiles.
+- X-Profile header: a superuser's request is run under cProfile and the
+  response is replaced with the pstats report. Requests without the header
+  only pay a header lookup and a context variable read.
+"""
+import asyncio
+import cProfile
+import functools
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+
+from fastapi.routing import APIRoute
+from jose import JWTError
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.revocation import revocation_store
+from app.core.security import verify_token
+from app.db.session import SessionLocal
+from app.models.user import User
+
+PROFILE_HEADER = b"x-profile"
+SORT_KEYS = ("cumulative", "tottime", "calls")
+
+# The cProfile.Profile of the current request, while X-Profile is active
+active_profile: ContextVar[Optional[cProfile.Profile]] = ContextVar("active_profile", default=None)
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampler over sys._current_frames(); one profile at a time per worker
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._labels: Dict[object, str] = {}
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = (
+                f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            )
+        return label
+
+    def run(self, seconds: float, interval: float) -> str:
+        """
+        Sample for `seconds`, blocking the calling thread, and return collapsed stacks
+        """
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy()
+        try:
+            own = threading.get_ident()
+            counts: Counter = Counter()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == own:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(self._label(frame.f_code))
+                        frame = frame.f_back
+                    stack.append(names.get(ident, str(ident)))
+                    counts[";".join(reversed(stack))] += 1
+                time.sleep(interval)
+            return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+        finally:
+            self._labels.clear()
+            self._lock.release()
+
+
+sampling_profiler = SamplingProfiler()
+
+
+def _profiled(call: Callable) -> Callable:
+    """
+    Wrap an endpoint so it runs under the request's profile when one is active.
+    Async endpoints are profiled while awaited, so other tasks the event loop
+    runs meanwhile show up too; sync endpoints are measured exactly.
+    """
+    if asyncio.iscoroutinefunction(call):
+        @functools.wraps(call)
+        async def profiled_async(*args, **kwargs):
+            profile = active_profile.get()
+            if profile is None:
+                return await call(*args, **kwargs)
+            profile.enable()
+            try:
+                return await call(*args, **kwargs)
+            finally:
+                profile.disable()
+        return profiled_async
+
+    @functools.wraps(call)
+    def profiled(*args, **kwargs):
+        profile = active_profile.get()
+        if profile is None:
+            return call(*args, **kwargs)
+        return profile.runcall(call, *args, **kwargs)
+    return profiled
+
+
+def instrument_routes(app) -> None:
+    """
+    Make every API endpoint honour X-Profile. Called once at startup.
+    """
+    for route in app.routes:
+        if isinstance(route, APIRoute) and not getattr(route.dependant.call, "__wrapped__", None):
+            route.dependant.call = _profiled(route.dependant.call)
+
+
+def _is_superuser(authorization: Optional[bytes]) -> bool:
+    if not authorization or not authorization.lower().startswith(b"bearer "):
+        return False
+    try:
+        payload = verify_token(authorization[7:].decode("latin-1"))
+    except (JWTError, ValueError):
+        return False
+    if payload.get("jti") and revocation_store.is_revoked(payload["jti"]):
+        return False
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.id == payload.get("sub")).first()
+        return bool(user and user.is_active and user.is_superuser)
+    finally:
+        db.close()
+
+
+class RequestProfilerMiddleware:
+    """
+    ASGI middleware handling X-Profile: <sort key> for superusers. The
+    response is replaced by a plain-text pstats report (top
+    PROFILE_REPORT_LINES functions); the original status is kept in
+    X-Profile-Status.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = dict(scope["headers"])
+        sort_key = headers.get(PROFILE_HEADER)
+        if sort_key is None or not await run_in_threadpool(_is_superuser, headers.get(b"authorization")):
+            return await self.app(scope, receive, send)
+
+        sort_key = sort_key.decode("latin-1").strip().lower()
+        if sort_key not in SORT_KEYS:
+            sort_key = "cumulative"
+        profile = cProfile.Profile()
+        status = {"code": 500}
+
+        async def capture(message):
+            # Swallow the real response; only its status is reported
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+
+        token = active_profile.set(profile)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            active_profile.reset(token)
+        elapsed = time.perf_counter() - started
+
+        report = io.StringIO()
+        report.write(f"{scope['method']} {scope['path']} -> {status['code']} in {elapsed * 1000:.1f} ms\n\n")
+        stats = pstats.Stats(profile, stream=report)
+        if stats.stats:
+            stats.sort_stats(sort_key).print_stats(settings.PROFILE_REPORT_LINES)
+        else:
+            report.write("No endpoint code ran under the profiler\n")
+        body = report.getvalue().encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/plain; charset=utf-8"),
+                (b"content-length", str(len(body)).encode()),
+                (b"x-profile-status", str(status["code"]).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
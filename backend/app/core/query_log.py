@@ -0,0 +1,201 @@
+"""
+Slow-query log.
+
+Engine events time every statement; those slower than
+SLOW_QUERY_THRESHOLD_MS are tagged with the route and user of the request
+that ran them, written as JSON lines to the "slow_query" logger (its own
+rotating file) and aggregated per statement in an in-memory table for
+/admin/slow-queries. A sample of them is explained (EXPLAIN QUERY PLAN on
+SQLite) on a background thread, and plans that scan the whole tasks table
+are flagged.
+"""
+import json
+import logging
+import queue
+import random
+import re
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+slow_query_logger = logging.getLogger("slow_query")
+
+# Route and user of the request being served; a dict so values set inside
+# dependencies (which may run in another context) are visible afterwards
+request_context: ContextVar[Optional[Dict[str, Any]]] = ContextVar("request_context", default=None)
+
+# "SCAN tasks" without an index (SQLite >= 3.36 drops the word TABLE)
+FULL_SCAN = re.compile(r"\bSCAN (?:TABLE )?tasks\b(?! USING)")
+
+EXPLAINABLE = ("SELECT", "WITH", "UPDATE", "DELETE")
+
+_SKIP = "query_log_skip"
+
+
+def set_user(user_id: int) -> None:
+    context = request_context.get()
+    if context is not None:
+        context["user_id"] = user_id
+
+
+def _current_route(context: Optional[Dict[str, Any]]) -> Optional[str]:
+    if context is None:
+        return None
+    scope = context["scope"]
+    route = scope.get("route")
+    return f"{scope['method']} {getattr(route, 'path', scope['path'])}"
+
+
+class QueryContextMiddleware:
+    """
+    ASGI middleware recording the request each statement belongs to
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        token = request_context.set({"scope": scope, "user_id": None})
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request_context.reset(token)
+
+
+class SlowQueryLog:
+    """
+    Statement timing hooks, the per-statement summary and the explain worker
+    """
+
+    def __init__(self, max_statements: int = 500):
+        self.max_statements = max_statements
+        self._statements: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._explain_queue: "queue.Queue[tuple]" = queue.Queue(maxsize=100)
+        self._thread: Optional[threading.Thread] = None
+
+    def install(self, engine: Engine) -> None:
+        """
+        Time the statements of `engine`; called for the main engine and each shard engine
+        """
+        if settings.SLOW_QUERY_THRESHOLD_MS <= 0 or event.contains(engine, "before_cursor_execute", self._before):
+            return
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+        event.listen(engine, "handle_error", self._failed)
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._explain_loop, name="slow-query-explain", daemon=True)
+                self._thread.start()
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    def _failed(self, context) -> None:
+        starts = context.connection.info.get("query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        elapsed = (time.perf_counter() - conn.info["query_start"].pop()) * 1000
+        if elapsed < settings.SLOW_QUERY_THRESHOLD_MS or conn.info.get(_SKIP):
+            return
+        request = request_context.get()
+        entry = {
+            "at": datetime.utcnow().isoformat(),
+            "ms": round(elapsed, 2),
+            "route": _current_route(request),
+            "user_id": request["user_id"] if request else None,
+            "statement": statement,
+            "executemany": executemany,
+        }
+        explain = (
+            not executemany
+            and statement.lstrip().upper().startswith(EXPLAINABLE)
+            and random.random() < settings.SLOW_QUERY_EXPLAIN_SAMPLE
+        )
+        if explain:
+            try:
+                self._explain_queue.put_nowait((entry, parameters, conn.engine))
+                return
+            except queue.Full:
+                pass
+        self._record(entry)
+
+    def _explain_loop(self) -> None:
+        while True:
+            entry, parameters, engine = self._explain_queue.get()
+            try:
+                entry["plan"] = self.explain(engine, entry["statement"], parameters)
+                entry["full_scan"] = any(FULL_SCAN.search(line) for line in entry["plan"])
+            except Exception as e:
+                entry["plan_error"] = str(e)
+            self._record(entry)
+
+    def explain(self, engine: Engine, statement: str, parameters) -> List[str]:
+        """
+        The plan of a statement, one line per step
+        """
+        with engine.connect() as conn:
+            conn.info[_SKIP] = True
+            try:
+                if conn.dialect.name == "sqlite":
+                    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+                    return [row[-1] for row in rows]
+                return [row[0] for row in conn.exec_driver_sql(f"EXPLAIN {statement}", parameters)]
+            finally:
+                conn.info.pop(_SKIP, None)
+
+    def _record(self, entry: Dict[str, Any]) -> None:
+        level = logging.WARNING if entry.get("full_scan") else logging.INFO
+        slow_query_logger.log(level, json.dumps(entry))
+        with self._lock:
+            summary = self._statements.get(entry["statement"])
+            if summary is None:
+                if len(self._statements) >= self.max_statements:
+                    # Make room by dropping the statement with the least total time
+                    del self._statements[min(self._statements, key=lambda s: self._statements[s]["total_ms"])]
+                summary = self._statements[entry["statement"]] = {
+                    "statement": entry["statement"],
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "full_scan": False,
+                    "plan": None,
+                }
+            summary["count"] += 1
+            summary["total_ms"] += entry["ms"]
+            summary["max_ms"] = max(summary["max_ms"], entry["ms"])
+            summary["last_at"] = entry["at"]
+            summary["last_route"] = entry["route"]
+            summary["last_user_id"] = entry["user_id"]
+            if "plan" in entry:
+                summary["plan"] = entry["plan"]
+                summary["full_scan"] = summary["full_scan"] or entry["full_scan"]
+
+    def top(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Slowest statements by total time spent above the threshold
+        """
+        with self._lock:
+            summaries = [dict(summary) for summary in self._statements.values()]
+        summaries.sort(key=lambda summary: summary["total_ms"], reverse=True)
+        for summary in summaries:
+            summary["total_ms"] = round(summary["total_ms"], 2)
+        return summaries[:limit]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._statements.clear()
+
+
+slow_query_log = SlowQueryLog()
@@ -0,0 +1,151 @@
+from bisect import bisect_left, bisect_right, insort
+from typing import Any, Iterable, Iterator, List, Tuple
+
+
+class RankedList:
+    """
+    Sorted list with O(log n) rank and positional lookups.
+
+    Keys are kept in buckets of roughly ``load`` items, with a Fenwick tree
+    over the bucket sizes. Inserting or removing shifts at most one small
+    bucket; finding a key's position or the key at a position walks the
+    Fenwick tree. The tree is rebuilt (O(n / load)) only when a bucket splits
+    or empties.
+    """
+
+    def __init__(self, keys: Iterable[Any] = (), load: int = 1000):
+        self.load = load
+        self._build(sorted(keys))
+
+    def _build(self, keys: List[Any]) -> None:
+        self._lists: List[List[Any]] = [keys[i:i + self.load] for i in range(0, len(keys), self.load)]
+        self._maxes: List[Any] = [bucket[-1] for bucket in self._lists]
+        self._len = len(keys)
+        self._rebuild_index()
+
+    def _rebuild_index(self) -> None:
+        tree = [0] + [len(bucket) for bucket in self._lists]
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _update(self, bucket: int, delta: int) -> None:
+        i = bucket + 1
+        tree = self._tree
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, bucket: int) -> int:
+        """
+        Number of keys in the buckets before `bucket`
+        """
+        total = 0
+        tree = self._tree
+        i = bucket
+        while i:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def _locate(self, position: int) -> Tuple[int, int]:
+        """
+        (bucket, offset) of the key at `position`
+        """
+        tree = self._tree
+        bucket = 0
+        step = 1 << (len(tree) - 1).bit_length()
+        while step:
+            nxt = bucket + step
+            if nxt < len(tree) and tree[nxt] <= position:
+                bucket = nxt
+                position -= tree[nxt]
+            step >>= 1
+        return bucket, position
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self) -> Iterator[Any]:
+        for bucket in self._lists:
+            yield from bucket
+
+    def __contains__(self, key: Any) -> bool:
+        i = bisect_left(self._maxes, key)
+        if i == len(self._maxes):
+            return False
+        bucket = self._lists[i]
+        j = bisect_left(bucket, key)
+        return j < len(bucket) and bucket[j] == key
+
+    def add(self, key: Any) -> None:
+        if not self._lists:
+            self._build([key])
+            return
+        i = bisect_right(self._maxes, key)
+        if i == len(self._maxes):
+            i -= 1
+            self._lists[i].append(key)
+            self._maxes[i] = key
+        else:
+            insort(self._lists[i], key)
+        self._len += 1
+        if len(self._lists[i]) > 2 * self.load:
+            bucket = self._lists[i]
+            half = len(bucket) // 2
+            self._lists[i:i + 1] = [bucket[:half], bucket[half:]]
+            self._maxes[i:i + 1] = [bucket[half - 1], bucket[-1]]
+            self._rebuild_index()
+        else:
+            self._update(i, 1)
+
+    def remove(self, key: Any) -> None:
+        i = bisect_left(self._maxes, key)
+        if i == len(self._maxes):
+            raise KeyError(key)
+        bucket = self._lists[i]
+        j = bisect_left(bucket, key)
+        if j == len(bucket) or bucket[j] != key:
+            raise KeyError(key)
+        del bucket[j]
+        self._len -= 1
+        if not bucket:
+            del self._lists[i]
+            del self._maxes[i]
+            self._rebuild_index()
+        else:
+            self._maxes[i] = bucket[-1]
+            self._update(i, -1)
+
+    def bisect_left(self, key: Any) -> int:
+        """
+        Number of keys smaller than `key`
+        """
+        i = bisect_left(self._maxes, key)
+        if i == len(self._maxes):
+            return self._len
+        return self._prefix(i) + bisect_left(self._lists[i], key)
+
+    def __getitem__(self, position: int) -> Any:
+        if position < 0:
+            position += self._len
+        if not 0 <= position < self._len:
+            raise IndexError(position)
+        bucket, offset = self._locate(position)
+        return self._lists[bucket][offset]
+
+    def slice(self, start: int, stop: int) -> List[Any]:
+        """
+        Keys at positions [start, stop)
+        """
+        start, stop = max(0, start), min(stop, self._len)
+        if start >= stop:
+            return []
+        bucket, offset = self._locate(start)
+        result: List[Any] = []
+        while len(result) < stop - start:
+            result.extend(self._lists[bucket][offset:offset + stop - start - len(result)])
+            bucket, offset = bucket + 1, 0
+        return result
@@ -1,9 +1,11 @@
+import uuid
 from datetime import datetime, timedelta
 from typing import Any, Union
 from passlib.context import CryptContext
-from jose import jwt
+from jose import jwt, JWTError
 
 from app.core.config import settings
+from app.core.keyring import keyring
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -21,21 +23,28 @@ def create_access_token(
             minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
         )
     
-    to_encode = {"exp": expire, "sub": str(subject)}
+    to_encode = {"exp": expire, "sub": str(subject), "jti": uuid.uuid4().hex}
+    kid, secret = keyring.signing_key()
     encoded_jwt = jwt.encode(
         to_encode,
-        settings.SECRET_KEY,
-        algorithm="HS256"
+        secret,
+        algorithm="HS256",
+        headers={"kid": kid}
     )
     return encoded_jwt
 
 def verify_token(token: str) -> dict:
     """
-    Verify a JWT token and return its payload
+    Verify a JWT token against the key named in its kid header and return its payload.
+    Tokens without a kid are checked against SECRET_KEY.
     """
+    kid = jwt.get_unverified_header(token).get("kid")
+    secret = keyring.verification_key(kid) if kid else settings.SECRET_KEY
+    if secret is None:
+        raise JWTError("Unknown signing key")
     return jwt.decode(
         token,
-        settings.SECRET_KEY,
+        secret,
         algorithms=["HS256"]
     )
 
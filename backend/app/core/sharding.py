@@ -0,0 +1,500 @@
+"""
+Per-household database sharding.
+
+With SHARD_COUNT > 0, each user's data lives in one of SHARD_COUNT SQLite
+files under SHARD_DIRECTORY, so households stop contending for a single
+writer lock. Members of a household are hashed to the same file. The
+DATABASE_URL database becomes the directory:
+
+- shard_assignments maps users to shards.
+- It keeps a copy of every user row, for login and username lookups and
+  the all-time leaderboard. Changes to a user row on a shard are written
+  to the directory just before the shard commits.
+- It alone holds households, jobs and revoked tokens.
+- It is the source of catalogue tables (not owned by any user, e.g.
+  categories): every shard starts with a copy, and writes go to the
+  directory first and are then replicated to every shard.
+
+Shard engines are opened on first use and at most SHARD_MAX_OPEN_ENGINES
+stay open; the least recently used one is disposed beyond that. Users
+without an assignment (registered since the split) are placed on first use
+(not by reads of another user's account), on the shard of a household they
+belong to if it has placed members. Rows are never moved between shards:
+their ids are only unique within a shard. So a user whose data already
+lives on another shard can't join a household (see `can_join`).
+`manage.py split-shards` moves an existing database into shards.
+"""
+import logging
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, TypeVar
+
+from jose import JWTError
+from sqlalchemy import Column, Integer, MetaData, create_engine, delete, event, func, insert, inspect, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, attributes, sessionmaker
+from sqlalchemy.sql import ColumnElement
+from sqlalchemy.sql.schema import Table
+
+from app.core.config import settings
+from app.core.query_log import slow_query_log
+from app.core.security import verify_token
+from app.core.write_coalescer import after_batch_commit
+from app.db.session import SessionLocal, engine as directory_engine
+from app.models.household import HouseholdMember
+from app.models.shard import ShardAssignment
+from app.models.task import Task
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Tables kept only in the directory database
+DIRECTORY_TABLES = frozenset({
+    "shard_assignments", "households", "household_members", "jobs", "revoked_tokens",
+})
+
+
+def bucket(key: str, shard_count: int) -> int:
+    """
+    Stable shard number for a household ("household:<id>") or a user without one ("user:<id>")
+    """
+    return zlib.crc32(key.encode("utf-8")) % shard_count
+
+
+def shard_tables() -> List[Table]:
+    return [table for table in User.metadata.sorted_tables if table.name not in DIRECTORY_TABLES]
+
+
+class ShardRouter:
+    """
+    Shard assignments, lazily opened shard engines and cross-shard queries
+    """
+
+    def __init__(self):
+        self._engines: "OrderedDict[int, Tuple[Engine, sessionmaker]]" = OrderedDict()
+        self._initialised: set = set()
+        self._assignments: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._init_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return settings.SHARD_COUNT > 0
+
+    @staticmethod
+    def path(shard: int) -> str:
+        return os.path.join(settings.SHARD_DIRECTORY, f"shard_{shard:03d}.db")
+
+    def _open(self, shard: int) -> Tuple[Engine, sessionmaker]:
+        with self._lock:
+            opened = self._engines.get(shard)
+            if opened is not None:
+                self._engines.move_to_end(shard)
+                return opened
+        os.makedirs(settings.SHARD_DIRECTORY, exist_ok=True)
+        engine = create_engine(f"sqlite:///{self.path(shard)}", connect_args={"check_same_thread": False})
+        with self._init_lock:
+            if shard not in self._initialised:
+                new = not os.path.exists(self.path(shard))
+                from app.services.search import ensure_search_index
+                User.metadata.create_all(engine, tables=shard_tables())
+                ensure_search_index(engine)
+                if new:
+                    copy_catalogue(engine)
+                self._initialised.add(shard)
+        slow_query_log.install(engine)
+        opened = (engine, sessionmaker(autocommit=False, autoflush=False, bind=engine, info={"shard": shard}))
+        evicted = []
+        with self._lock:
+            if shard in self._engines:
+                # Another thread opened it meanwhile
+                evicted.append(opened[0])
+                opened = self._engines[shard]
+                self._engines.move_to_end(shard)
+            else:
+                self._engines[shard] = opened
+                while len(self._engines) > settings.SHARD_MAX_OPEN_ENGINES:
+                    evicted.append(self._engines.popitem(last=False)[1][0])
+        # Sessions still using an evicted engine keep their connection until closed
+        for engine in evicted:
+            engine.dispose()
+        return opened
+
+    def engine(self, shard: int) -> Engine:
+        return self._open(shard)[0]
+
+    def session(self, shard: int) -> Session:
+        return self._open(shard)[1]()
+
+    def shard_of(self, user_id: int, place: bool = True) -> Optional[int]:
+        """
+        The user's shard, placing the user first if unassigned; None for
+        unknown users, and with place=False for users not placed yet
+        """
+        shard = self._assignments.get(user_id)
+        if shard is None:
+            db = SessionLocal()
+            try:
+                shard = db.scalar(select(ShardAssignment.shard).where(ShardAssignment.user_id == user_id))
+                if shard is None and place:
+                    shard = self._place(db, user_id)
+            finally:
+                db.close()
+            if shard is not None:
+                self._assignments[user_id] = shard
+        return shard
+
+    def _place(self, db: Session, user_id: int) -> Optional[int]:
+        row = db.execute(select(User.__table__).where(User.__table__.c.id == user_id)).mappings().first()
+        if row is None:
+            return None
+        shard = self._household_shard(db, user_id)
+        if shard is None:
+            household_id = db.scalar(
+                select(func.min(HouseholdMember.household_id)).where(HouseholdMember.user_id == user_id)
+            )
+            key = f"household:{household_id}" if household_id is not None else f"user:{user_id}"
+            shard = bucket(key, settings.SHARD_COUNT)
+        with self.engine(shard).begin() as conn:
+            conn.execute(insert(User.__table__).prefix_with("OR IGNORE").values(**row))
+        try:
+            db.add(ShardAssignment(user_id=user_id, shard=shard))
+            db.commit()
+        except IntegrityError:
+            # Placed concurrently by another request
+            db.rollback()
+            shard = db.scalar(select(ShardAssignment.shard).where(ShardAssignment.user_id == user_id))
+        logger.info(f"Placed user {user_id} on shard {shard}")
+        return shard
+
+    @staticmethod
+    def _household_shard(db: Session, user_id: int) -> Optional[int]:
+        """
+        The shard of a placed member of one of the user's households
+        """
+        households = select(HouseholdMember.household_id).where(HouseholdMember.user_id == user_id)
+        return db.scalar(
+            select(ShardAssignment.shard)
+            .join(HouseholdMember, HouseholdMember.user_id == ShardAssignment.user_id)
+            .where(HouseholdMember.household_id.in_(households), ShardAssignment.user_id != user_id)
+            .order_by(HouseholdMember.household_id)
+            .limit(1)
+        )
+
+    def can_join(self, user_id: int, member_id: int) -> bool:
+        """
+        Whether the user can join the household of `member_id` and share its
+        shard: either isn't placed yet (and will be placed there) or is on it already
+        """
+        if not self.enabled:
+            return True
+        user_shard = self.shard_of(user_id, place=False)
+        return user_shard is None or user_shard == self.shard_of(member_id)
+
+    def replicate(self, obj: Any) -> None:
+        """
+        Copy a catalogue row just committed to the directory to every shard
+        """
+        if not self.enabled:
+            return
+        mapper = inspect(obj).mapper
+        row = {prop.columns[0].name: getattr(obj, prop.key) for prop in mapper.column_attrs}
+        for shard in range(settings.SHARD_COUNT):
+            with self.engine(shard).begin() as conn:
+                conn.execute(insert(mapper.local_table).prefix_with("OR REPLACE").values(**row))
+
+    def forget(self, user_id: int) -> None:
+        self._assignments.pop(user_id, None)
+
+    def session_for_user(self, user_id: Optional[int], place: bool = True) -> Session:
+        """
+        A session on the user's shard; the directory when sharding is off,
+        there is no user or (with place=False) the user isn't placed yet.
+        The directory holds all the data of unplaced users.
+        """
+        shard = self.shard_of(user_id, place) if self.enabled and user_id is not None else None
+        return SessionLocal() if shard is None else self.session(shard)
+
+    def session_for_request(self, authorization: Optional[str]) -> Session:
+        """
+        A session for the user named by a bearer token. The token is checked
+        again by get_current_user; an invalid one gets the directory.
+        """
+        user_id = None
+        if authorization and authorization.lower().startswith("bearer "):
+            try:
+                user_id = int(verify_token(authorization[7:]).get("sub"))
+            except (JWTError, TypeError, ValueError):
+                user_id = None
+        return self.session_for_user(user_id)
+
+    def each_shard(self, query: Callable[[Session], T]) -> List[Tuple[Optional[int], T]]:
+        """
+        Run `query` on every shard concurrently, each in its own session.
+        Results should be plain values, not ORM objects. With sharding off
+        the directory is the only shard (None).
+        """
+        if not self.enabled:
+            db = SessionLocal()
+            try:
+                return [(None, query(db))]
+            finally:
+                db.close()
+
+        def run(shard: int) -> Tuple[int, T]:
+            db = self.session(shard)
+            try:
+                return shard, query(db)
+            finally:
+                db.close()
+
+        shards = range(settings.SHARD_COUNT)
+        with ThreadPoolExecutor(max_workers=min(settings.SHARD_COUNT, 8)) as pool:
+            return list(pool.map(run, shards))
+
+
+shard_router = ShardRouter()
+
+
+def owned_rows(table: Table, user_ids: ColumnElement, _seen: Optional[set] = None) -> Optional[ColumnElement]:
+    """
+    A filter for the rows of `table` belonging to the users selected by
+    `user_ids`, following foreign keys to users (directly or through e.g.
+    tasks). None for catalogue tables, which every shard copies.
+    """
+    users = User.__table__
+    if table is users:
+        return table.c.id.in_(user_ids)
+    direct = [fk for fk in table.foreign_keys if fk.column.table is users]
+    if direct:
+        preferred = {"owner_id": 0, "user_id": 1}
+        fk = min(direct, key=lambda fk: preferred.get(fk.parent.name, 2))
+        return fk.parent.in_(user_ids)
+    seen = (_seen or set()) | {table.name}
+    for fk in sorted(table.foreign_keys, key=lambda fk: fk.parent.name):
+        parent = fk.column.table
+        if parent.name in seen:
+            continue
+        parent_filter = owned_rows(parent, user_ids, seen)
+        if parent_filter is not None:
+            return fk.parent.in_(select(fk.column).where(parent_filter))
+    return None
+
+
+def catalogue_tables() -> List[Table]:
+    """
+    Shard tables not owned by any user; the directory holds their master copy
+    """
+    return [table for table in shard_tables() if owned_rows(table, select(User.id)) is None]
+
+
+def copy_catalogue(engine: Engine, batch_size: int = 1000) -> None:
+    """
+    Copy the catalogue tables from the directory to a new shard
+    """
+    with directory_engine.connect() as source, engine.begin() as target:
+        for table in catalogue_tables():
+            result = source.execute(select(table).execution_options(yield_per=batch_size))
+            for rows in result.mappings().partitions():
+                target.execute(insert(table), [dict(row) for row in rows])
+
+
+def plan_assignments(db: Session, shard_count: int) -> Dict[int, int]:
+    """
+    user id -> shard for every user. Households sharing a member are kept
+    together and hashed by their lowest id; other users by their own id.
+    """
+    root: Dict[int, int] = {}
+
+    def find(household_id: int) -> int:
+        while root.setdefault(household_id, household_id) != household_id:
+            root[household_id] = root[root[household_id]]
+            household_id = root[household_id]
+        return household_id
+
+    first_household: Dict[int, int] = {}
+    for household_id, user_id in db.execute(select(HouseholdMember.household_id, HouseholdMember.user_id)):
+        if user_id in first_household:
+            a, b = find(household_id), find(first_household[user_id])
+            root[max(a, b)] = min(a, b)
+        else:
+            first_household[user_id] = find(household_id)
+
+    assignments = {}
+    for (user_id,) in db.execute(select(User.id)):
+        household_id = first_household.get(user_id)
+        key = f"household:{find(household_id)}" if household_id is not None else f"user:{user_id}"
+        assignments[user_id] = bucket(key, shard_count)
+    return assignments
+
+
+def split_database(force: bool = False, batch_size: int = 1000) -> Dict[int, int]:
+    """
+    Copy the directory database's data into SHARD_COUNT shard files and
+    record the assignments; returns the number of users per shard. Each new
+    shard file gets the catalogue tables when opened. The directory keeps its
+    copy, so the split can be repeated (with force) until traffic moves.
+    """
+    shard_count = settings.SHARD_COUNT
+    if shard_count <= 0:
+        raise ValueError("Set SHARD_COUNT to the number of shards first")
+    existing = [shard_router.path(shard) for shard in range(shard_count) if os.path.exists(shard_router.path(shard))]
+    if existing and not force:
+        raise FileExistsError(f"Shard files already exist: {', '.join(existing)}")
+    for path in existing:
+        os.remove(path)
+
+    shard_users = Table("shard_users", MetaData(), Column("id", Integer, primary_key=True), prefixes=["TEMPORARY"])
+    db = SessionLocal()
+    try:
+        assignments = plan_assignments(db, shard_count)
+        conn = db.connection()
+        shard_users.create(conn)
+        for shard in range(shard_count):
+            user_ids = [user_id for user_id, assigned in assignments.items() if assigned == shard]
+            conn.execute(delete(shard_users))
+            if user_ids:
+                conn.execute(insert(shard_users), [{"id": user_id} for user_id in user_ids])
+            with shard_router.engine(shard).begin() as target:
+                for table in shard_tables():
+                    owned = owned_rows(table, select(shard_users.c.id))
+                    if owned is None:
+                        continue
+                    query = select(table).where(owned)
+                    result = conn.execute(query.execution_options(yield_per=batch_size))
+                    for rows in result.mappings().partitions():
+                        target.execute(insert(table), [dict(row) for row in rows])
+            logger.info(f"Copied {len(user_ids)} users to shard {shard}")
+        conn.execute(delete(ShardAssignment.__table__))
+        if assignments:
+            conn.execute(
+                insert(ShardAssignment.__table__),
+                [{"user_id": user_id, "shard": shard} for user_id, shard in assignments.items()],
+            )
+        shard_users.drop(conn)
+        db.commit()
+    finally:
+        db.close()
+    counts = {shard: 0 for shard in range(shard_count)}
+    for shard in assignments.values():
+        counts[shard] += 1
+    return counts
+
+
+# Copy user rows changed on a shard back to the directory. The copy is
+# written before the shard commits, so a password change or deactivation
+# can't commit on the shard while logins still see the old row; if the
+# directory write fails, the shard commit fails with it.
+
+_PENDING_KEY = "shard_user_changes"
+_MIRRORED_KEY = "shard_user_mirrored"
+
+
+@event.listens_for(Session, "after_flush")
+def _record_user_changes(session: Session, flush_context) -> None:
+    if session.info.get("shard") is None:
+        return
+    pending = session.info.setdefault(_PENDING_KEY, {})
+    for obj in session.dirty:
+        if not isinstance(obj, User):
+            continue
+        changed = {
+            prop.columns[0].name: getattr(obj, prop.key)
+            for prop in inspect(obj).mapper.column_attrs
+            if attributes.get_history(obj, prop.key).has_changes()
+        }
+        if changed:
+            pending.setdefault(obj.id, {}).update(changed)
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            pending[obj.id] = None
+
+
+@event.listens_for(Session, "before_commit")
+def _mirror_user_changes(session: Session) -> None:
+    if session.info.get("shard") is None:
+        return
+    session.flush()
+    changes = session.info.pop(_PENDING_KEY, None)
+    if not changes:
+        return
+    users = User.__table__
+    with directory_engine.begin() as conn:
+        for user_id, values in changes.items():
+            if values is None:
+                conn.execute(delete(ShardAssignment.__table__).where(ShardAssignment.__table__.c.user_id == user_id))
+                conn.execute(delete(users).where(users.c.id == user_id))
+            else:
+                conn.execute(update(users).where(users.c.id == user_id).values(**values))
+    session.info.setdefault(_MIRRORED_KEY, {}).update(changes)
+
+
+@event.listens_for(Session, "after_commit")
+def _forget_deleted_users(session: Session) -> None:
+    mirrored = session.info.pop(_MIRRORED_KEY, None)
+    if not mirrored:
+        return
+
+    def forget() -> None:
+        for user_id, values in mirrored.items():
+            if values is None:
+                shard_router.forget(user_id)
+
+    # A write unit's commit only releases a savepoint; if its batch fails, restore the directory
+    after_batch_commit(session, forget, lambda: _resync_users(session.info["shard"], list(mirrored)))
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_user_changes(session: Session, previous_transaction) -> None:
+    session.info.pop(_PENDING_KEY, None)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _restore_user_changes(session: Session, transaction) -> None:
+    if transaction.parent is not None:
+        return
+    mirrored = session.info.pop(_MIRRORED_KEY, None)
+    if mirrored:
+        # The shard transaction ended without committing after the directory took the changes
+        _resync_users(session.info["shard"], list(mirrored))
+
+
+def _resync_users(shard: int, user_ids: Iterable[int]) -> None:
+    """
+    Copy the shard's committed rows for `user_ids` back over the directory's
+    """
+    users = User.__table__
+    try:
+        with shard_router.engine(shard).connect() as source:
+            rows = source.execute(select(users).where(users.c.id.in_(user_ids))).mappings().all()
+        with directory_engine.begin() as conn:
+            for row in rows:
+                if conn.execute(update(users).where(users.c.id == row["id"]).values(**row)).rowcount == 0:
+                    conn.execute(insert(users).values(**row))
+                    conn.execute(insert(ShardAssignment.__table__).values(user_id=row["id"], shard=shard))
+    except Exception as e:
+        logger.error(f"Could not restore users {sorted(user_ids)} in the directory: {e}", exc_info=True)
+
+
+def shard_summary() -> List[Dict[str, Any]]:
+    """
+    Users, tasks and file size per shard, for the admin API
+    """
+    def counts(db: Session) -> Dict[str, int]:
+        return {
+            "users": db.scalar(select(func.count()).select_from(User)) or 0,
+            "tasks": db.scalar(select(func.count()).select_from(Task)) or 0,
+        }
+
+    summary = []
+    for shard, row in shard_router.each_shard(counts):
+        path = shard_router.path(shard) if shard is not None else None
+        row.update({"shard": shard, "bytes": os.path.getsize(path) if path and os.path.exists(path) else None})
+        summary.append(row)
+    return summary
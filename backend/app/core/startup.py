@@ -0,0 +1,161 @@
+import asyncio
+import hashlib
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from sqlalchemy import MetaData, text
+from sqlalchemy.engine import Engine
+
+# Phase timings (seconds) recorded during startup, reported by --measure-startup
+STARTUP_TIMINGS: Dict[str, float] = {}
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+
+
+def schema_fingerprint(metadata: MetaData) -> str:
+    """
+    Hash the table/column/index layout of the models
+    """
+    parts = []
+    for table in sorted(metadata.tables.values(), key=lambda t: t.name):
+        parts.append(f"table:{table.name}")
+        for column in table.columns:
+            parts.append(f"{column.name}:{column.type!r}:{column.nullable}:{column.primary_key}")
+        for index in sorted(table.indexes, key=lambda i: i.name or ""):
+            parts.append(f"index:{index.name}:{','.join(c.name for c in index.columns)}")
+    return hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+def get_schema_stamp(engine: Engine) -> Optional[str]:
+    """
+    Read the stored schema fingerprint, or None if the database was never stamped
+    """
+    with engine.connect() as conn:
+        try:
+            return conn.execute(text("SELECT fingerprint FROM schema_version")).scalar()
+        except Exception:
+            conn.rollback()
+            return None
+
+
+def set_schema_stamp(engine: Engine, fingerprint: str) -> None:
+    """
+    Store the schema fingerprint after DDL has been applied
+    """
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE IF NOT EXISTS schema_version (fingerprint VARCHAR(40) NOT NULL)"))
+        conn.execute(text("DELETE FROM schema_version"))
+        conn.execute(
+            text("INSERT INTO schema_version (fingerprint) VALUES (:fingerprint)"),
+            {"fingerprint": fingerprint},
+        )
+
+
+def schema_is_current(engine: Engine, metadata: MetaData) -> bool:
+    """
+    Check whether the database already matches the models, with a single SELECT
+    """
+    return get_schema_stamp(engine) == schema_fingerprint(metadata)
+
+
+class timed:
+    """
+    Context manager recording the duration of a startup phase in STARTUP_TIMINGS
+    """
+
+    def __init__(self, phase: str):
+        self.phase = phase
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        STARTUP_TIMINGS[self.phase] = time.perf_counter() - self.started
+        return False
+
+
+async def _asgi_get(app, path: str) -> int:
+    """
+    Send a bare GET request through the ASGI app and return the status code
+    """
+    status = {}
+    request_sent = False
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status["code"] = message["status"]
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"localhost")],
+        "client": ("127.0.0.1", 0),
+        "server": ("localhost", 8000),
+    }
+    await app(scope, receive, send)
+    return status.get("code", 0)
+
+
+def report_startup(module_name: str, import_time: float, paths=("/health",)) -> None:
+    """
+    Run the imported app's startup handlers and time the first requests
+    """
+    app = sys.modules[module_name].app
+
+    async def run():
+        with timed("startup"):
+            await app.router.startup()
+        results = []
+        for path in paths:
+            request_started = time.perf_counter()
+            code = await _asgi_get(app, path)
+            results.append((path, time.perf_counter() - request_started, code))
+        await app.router.shutdown()
+        return results
+
+    results = asyncio.run(run())
+    db_init = STARTUP_TIMINGS.get("db_init", 0.0)
+
+    print("Startup report")
+    print("---------------------------------")
+    print(f"Import:                     {import_time * 1000:8.1f} ms")
+    print(f"Startup handlers:           {STARTUP_TIMINGS['startup'] * 1000:8.1f} ms")
+    print(f"  of which DB init:         {db_init * 1000:8.1f} ms")
+    for path, elapsed, code in results:
+        print(f"First request GET {path:<9} {elapsed * 1000:8.1f} ms (status {code})")
+    print("---------------------------------")
+
+
+def measure_startup(module_name: str = "main") -> None:
+    """
+    Report cold start timings, measured in a fresh interpreter
+    """
+    # Time the import before anything else is loaded in the child interpreter
+    script = (
+        "import time; started = time.perf_counter(); "
+        f"import {module_name}; import_time = time.perf_counter() - started; "
+        f"from app.core.startup import report_startup; report_startup({module_name!r}, import_time)"
+    )
+    subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=BACKEND_DIR,
+        check=True,
+    )
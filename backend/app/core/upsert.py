@@ -0,0 +1,21 @@
+"""
+INSERT ... ON CONFLICT for the databases the app runs on.
+
+SQLite (3.24+) and PostgreSQL share the on_conflict_do_update /
+on_conflict_do_nothing API, but each lives in its dialect's insert().
+"""
+from typing import Union
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+
+def insert(bind: Union[Connection, Session], table):
+    """
+    An INSERT on `table` (a Table or mapped class) for the dialect of `bind`
+    """
+    dialect = bind.get_bind().dialect if isinstance(bind, Session) else bind.dialect
+    if dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
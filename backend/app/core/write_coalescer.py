@@ -0,0 +1,206 @@
+"""
+Group commit for small writes.
+
+With WRITE_COALESCING on, request handlers hand their write units
+(functions of a Session) to one writer thread instead of committing
+themselves. The writer drains whatever is queued, up to
+WRITE_COALESCE_MAX_BATCH units or WRITE_COALESCE_MAX_WAIT_MS, and applies
+them in a single transaction with one savepoint per unit. A failing unit
+only rolls back its savepoint and gets its own exception; the rest commit
+together, so a burst of writes costs one fsync and one lock acquisition.
+
+Units run in a Session joined to the writer's transaction, so the
+db.commit() calls inside existing CRUD code only release savepoints.
+Session after_commit hooks that act outside the database (events, caches)
+go through after_batch_commit, so for units they wait for the batch.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+WriteUnit = Callable[[Session], Any]
+
+# session.info key of a unit session's held-back (on_commit, on_rollback) callbacks
+_DEFERRED_KEY = "write_batch_deferred"
+
+
+def after_batch_commit(
+    session: Session, on_commit: Callable[[], None], on_rollback: Optional[Callable[[], None]] = None
+) -> None:
+    """
+    For Session after_commit hooks: run `on_commit` now, or if `session`
+    belongs to a write unit, once its batch has committed (`on_rollback`
+    instead if the batch fails)
+    """
+    deferred = session.info.get(_DEFERRED_KEY)
+    if deferred is None:
+        on_commit()
+    else:
+        deferred.append((on_commit, on_rollback))
+
+
+def _writer_engine(engine: Engine) -> Engine:
+    """
+    The engine the writer uses. pysqlite only begins transactions lazily, so
+    a SAVEPOINT opened first would start (and its RELEASE commit) a
+    transaction of its own; a private engine that issues BEGIN IMMEDIATE
+    itself keeps all savepoints inside the batch transaction.
+    """
+    if engine.dialect.name != "sqlite":
+        return engine
+    writer = create_engine(engine.url, connect_args={"check_same_thread": False})
+
+    @event.listens_for(writer, "connect")
+    def _manual_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(writer, "begin")
+    def _begin_immediate(connection):
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+    return writer
+
+
+class WriteCoalescer:
+    """
+    Queue of write units applied in batches by a single writer thread
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        max_batch: int = 64,
+        max_wait: float = 0.002,
+        session_info: Optional[Dict[str, Any]] = None,
+    ):
+        self.engine = _writer_engine(engine)
+        self.session_info = session_info or {}
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self.units = 0
+        self._queue: "queue.Queue[Tuple[WriteUnit, Future]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="write-coalescer", daemon=True)
+        self._thread.start()
+
+    def submit(self, unit: Callable[[Session], T]) -> T:
+        """
+        Run `unit` in the next batch and return its result (or raise its
+        error) once the batch has committed
+        """
+        future: Future = Future()
+        self._queue.put((unit, future))
+        return future.result()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._apply(batch)
+
+    def _apply(self, batch: List[Tuple[WriteUnit, Future]]) -> None:
+        outcomes: List[Tuple[Future, Any, Optional[BaseException]]] = []
+        deferred: List[Tuple[Callable[[], None], Optional[Callable[[], None]]]] = []
+        try:
+            with self.engine.connect() as connection:
+                with connection.begin():
+                    for unit, future in batch:
+                        # The session runs inside a savepoint of its own, so
+                        # rolling it back leaves the other units untouched
+                        session = Session(
+                            bind=connection,
+                            join_transaction_mode="create_savepoint",
+                            expire_on_commit=False,
+                            info=dict(self.session_info, **{_DEFERRED_KEY: deferred}),
+                        )
+                        try:
+                            result = unit(session)
+                            session.commit()
+                            outcomes.append((future, result, None))
+                        except Exception as e:
+                            session.rollback()
+                            outcomes.append((future, None, e))
+                        finally:
+                            session.close()
+        except Exception as e:
+            logger.error(f"Write batch of {len(batch)} failed to commit: {e}", exc_info=True)
+            self._run_deferred(on_rollback for _, on_rollback in deferred)
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        # Units that failed may have committed (released savepoints) before
+        # failing; that work is in the batch, so their callbacks run too
+        self._run_deferred(on_commit for on_commit, _ in deferred)
+        self.batches += 1
+        self.units += len(batch)
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+    @staticmethod
+    def _run_deferred(callbacks) -> None:
+        for callback in callbacks:
+            if callback is None:
+                continue
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Write batch callback failed: {e}", exc_info=True)
+
+
+_coalescers: Dict[str, WriteCoalescer] = {}
+_coalescers_lock = threading.Lock()
+
+
+def get_write_coalescer(engine: Engine, session_info: Optional[Dict[str, Any]] = None) -> WriteCoalescer:
+    """
+    The writer for a database; each shard has its own. `session_info` is
+    copied into the units' sessions (e.g. the shard number).
+    """
+    key = str(engine.url)
+    with _coalescers_lock:
+        coalescer = _coalescers.get(key)
+        if coalescer is None:
+            coalescer = _coalescers[key] = WriteCoalescer(
+                engine,
+                max_batch=settings.WRITE_COALESCE_MAX_BATCH,
+                max_wait=settings.WRITE_COALESCE_MAX_WAIT_MS / 1000,
+                session_info=session_info,
+            )
+        return coalescer
+
+
+def run_write(db: Session, unit: Callable[[Session], T]) -> T:
+    """
+    Run a write unit: directly in the request session, or with
+    WRITE_COALESCING through the shared writer. Mapped objects the unit
+    returns are merged into `db`, so callers can keep using them.
+    """
+    if not settings.WRITE_COALESCING:
+        return unit(db)
+    session_info = {"shard": db.info["shard"]} if "shard" in db.info else None
+    result = get_write_coalescer(db.get_bind(), session_info).submit(unit)
+    if result is not None and inspect(result, raiseerr=False) is not None:
+        result = db.merge(result, load=False)
+    return result
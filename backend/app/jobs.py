@@ -0,0 +1,164 @@
+"""
+Background job handlers run by `manage.py worker`.
+"""
+import logging
+import os
+import shutil
+import sqlite3
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import exists
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.events import event_hub
+from app.core.jobs import job
+from app.core.keyring import keyring
+from app.core.sharding import shard_router
+from app.db.session import engine as directory_engine
+from app.models.job import Job
+from app.models.recurrence import TaskRecurrence
+from app.models.task import Task
+from app.models.token import RevokedToken
+from app.services.analytics import rebuild_rollups, seed_events_from_tasks
+from app.services.character_stats import recompute_all
+from app.services.subtask_progress import rebuild_progress
+from app.services.tags import rebuild_tag_index
+
+logger = logging.getLogger(__name__)
+
+OVERDUE_CHECK_INTERVAL = timedelta(minutes=15)
+
+
+@job("purge_revoked_tokens", cron="30 3 * * *")
+def purge_revoked_tokens(db: Session) -> None:
+    """
+    Drop revocations for tokens that have expired anyway
+    """
+    db.query(RevokedToken).filter(RevokedToken.expires_at < datetime.utcnow()).delete(synchronize_session=False)
+    db.commit()
+
+
+@job("rotate_signing_keys", every=timedelta(hours=1))
+def rotate_signing_keys(db: Session) -> None:
+    """
+    Rotate the JWT signing key once it reaches JWT_KEY_ROTATION_DAYS
+    """
+    keyring.rotate()
+
+
+@job("purge_finished_jobs", cron="45 3 * * *")
+def purge_finished_jobs(db: Session) -> None:
+    """
+    Delete finished jobs older than JOB_RETENTION_DAYS
+    """
+    cutoff = datetime.utcnow() - timedelta(days=settings.JOB_RETENTION_DAYS)
+    db.query(Job).filter(Job.status.in_(("done", "failed")), Job.finished_at < cutoff).delete(
+        synchronize_session=False
+    )
+    db.commit()
+
+
+@job("rebuild_tag_index", shards=True)
+def rebuild_tag_index_job(db: Session, owner_id: Optional[int] = None) -> None:
+    """
+    Rebuild the tag inverted index and counts, e.g. after bulk imports
+    """
+    rebuild_tag_index(db, owner_id=owner_id)
+
+
+@job("rebuild_subtask_progress", shards=True)
+def rebuild_subtask_progress(db: Session, owner_id: Optional[int] = None) -> None:
+    """
+    Recompute subtask progress counters from the task tree
+    """
+    rebuild_progress(db, owner_id=owner_id)
+
+
+@job("recompute_character_stats", shards=True)
+def recompute_character_stats(db: Session, user_ids: Optional[List[int]] = None) -> None:
+    """
+    Recompute effective stats for the given users, or everyone, after item definitions change
+    """
+    recompute_all(db, user_ids=user_ids)
+
+
+@job("rebuild_completion_rollups", shards=True)
+def rebuild_completion_rollups(db: Session, user_id: Optional[int] = None, seed: bool = False) -> None:
+    """
+    Recompute completion chart rollups from the event log, optionally first
+    logging tasks completed before the log existed
+    """
+    if seed:
+        seed_events_from_tasks(db, user_id=user_id)
+    rebuild_rollups(db, user_id=user_id)
+
+
+def _not_recurring():
+    # Recurring templates keep their first due date; their occurrences are expanded on read
+    return ~exists().where(TaskRecurrence.task_id == Task.id)
+
+
+@job("reset_broken_streaks", cron="5 0 * * *", shards=True)
+def reset_broken_streaks(db: Session) -> None:
+    """
+    Reset the streak of tasks whose due date passed (before today, UTC) without completion
+    """
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    db.query(Task).filter(
+        Task.streak_count > 0,
+        Task.is_completed == False,  # noqa: E712
+        Task.due_date < today,
+        _not_recurring(),
+    ).update({Task.streak_count: 0}, synchronize_session=False)
+    db.commit()
+
+
+@job("notify_overdue_tasks", every=OVERDUE_CHECK_INTERVAL, shards=True)
+def notify_overdue_tasks(db: Session) -> None:
+    """
+    Publish a "task.overdue" event for open tasks that fell due since the last check
+    """
+    now = datetime.utcnow()
+    rows = db.query(Task.id, Task.owner_id, Task.title, Task.due_date).filter(
+        Task.is_completed == False,  # noqa: E712
+        Task.due_date >= now - OVERDUE_CHECK_INTERVAL,
+        Task.due_date < now,
+        _not_recurring(),
+    )
+    for task_id, owner_id, title, due_date in rows:
+        event_hub.publish(owner_id, "task.overdue", {"task_id": task_id, "title": title, "due_date": due_date.isoformat()})
+
+
+def _backup(engine: Engine, path: str) -> None:
+    source = engine.raw_connection()
+    try:
+        target = sqlite3.connect(path)
+        try:
+            source.driver_connection.backup(target)
+        finally:
+            target.close()
+    finally:
+        source.close()
+
+
+@job("backup_databases", cron="0 2 * * *", max_attempts=2)
+def backup_databases(db: Session) -> None:
+    """
+    Copy the database (the directory and every shard) to a dated folder
+    under BACKUP_DIRECTORY, keeping the newest BACKUP_KEEP
+    """
+    if directory_engine.dialect.name != "sqlite":
+        logger.warning("Skipping backup: only SQLite databases are backed up")
+        return
+    folder = os.path.join(settings.BACKUP_DIRECTORY, datetime.utcnow().strftime("%Y%m%dT%H%M%S"))
+    os.makedirs(folder, exist_ok=True)
+    _backup(directory_engine, os.path.join(folder, "directory.db"))
+    for shard in range(settings.SHARD_COUNT if shard_router.enabled else 0):
+        _backup(shard_router.engine(shard), os.path.join(folder, os.path.basename(shard_router.path(shard))))
+    backups = sorted(name for name in os.listdir(settings.BACKUP_DIRECTORY) if name[:8].isdigit())
+    for name in backups[:-settings.BACKUP_KEEP]:
+        shutil.rmtree(os.path.join(settings.BACKUP_DIRECTORY, name), ignore_errors=True)
+    logger.info(f"Backed up databases to {folder}")
@@ -0,0 +1,39 @@
+from datetime import datetime
+from sqlalchemy import Column, Date, DateTime, ForeignKey, Index, Integer, String
+
+from app.db.base_class import Base
+
+class CompletionEvent(Base):
+    """
+    Append-only log of task completions and re-openings. Rows are never
+    updated, and survive the task being edited or deleted.
+    """
+    __tablename__ = "completion_events"
+    __table_args__ = (
+        Index("ix_completion_events_user_occurred", "user_id", "occurred_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    task_id = Column(Integer, ForeignKey("tasks.id", ondelete="SET NULL"), nullable=True, index=True)
+    category_id = Column(Integer, nullable=True)  # copied, so history keeps its category
+    kind = Column(String(10), nullable=False)  # completed, reopened
+    experience = Column(Integer, nullable=False, default=0)  # XP awarded, equipment bonus included
+    gold = Column(Integer, nullable=False, default=0)
+    occurred_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+class CompletionRollup(Base):
+    """
+    Completion totals per user, bucket ("day" or "week") and category,
+    maintained alongside the event log. category_id 0 means uncategorised.
+    """
+    __tablename__ = "completion_rollups"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    bucket = Column(String(4), primary_key=True)
+    bucket_start = Column(Date, primary_key=True)
+    category_id = Column(Integer, primary_key=True, default=0)
+    completed = Column(Integer, nullable=False, default=0)
+    reopened = Column(Integer, nullable=False, default=0)
+    experience = Column(Integer, nullable=False, default=0)
+    gold = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,22 @@
+from datetime import datetime
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String
+
+from app.db.base_class import Base
+
+class Household(Base):
+    """
+    A group of users (a family, flatmates) sharing a leaderboard
+    """
+    __tablename__ = "households"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(100), nullable=False)
+    owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+class HouseholdMember(Base):
+    __tablename__ = "household_members"
+
+    household_id = Column(Integer, ForeignKey("households.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True, index=True)
+    joined_at = Column(DateTime, nullable=False, default=datetime.utcnow)
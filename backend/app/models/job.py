@@ -0,0 +1,28 @@
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Index, Integer, String, Text
+
+from app.db.base_class import Base
+
+class Job(Base):
+    """
+    A unit of background work, claimed and run by `manage.py worker`.
+    """
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_status_run_at", "status", "run_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(100), nullable=False, index=True)
+    payload = Column(Text, nullable=False, default="{}")
+    status = Column(String(20), nullable=False, default="queued")  # queued, running, done, failed
+    run_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    dedupe_key = Column(String(200), unique=True, nullable=True)
+    locked_by = Column(String(64), nullable=True)
+    locked_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
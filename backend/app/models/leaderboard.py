@@ -0,0 +1,17 @@
+from sqlalchemy import Column, ForeignKey, Index, Integer, String
+
+from app.db.base_class import Base
+
+class LeaderboardScore(Base):
+    """
+    XP earned per user in one leaderboard period (e.g. "week:2024-W07",
+    "month:2024-02"). The all-time board is read from users.experience_points.
+    """
+    __tablename__ = "leaderboard_scores"
+    __table_args__ = (
+        Index("ix_leaderboard_scores_board_score", "board", "score"),
+    )
+
+    board = Column(String(20), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    score = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, ForeignKey, Integer
+from sqlalchemy.orm import backref, relationship
+
+from app.db.base_class import Base
+from app.models.task import Task
+
+class TaskProgress(Base):
+    """
+    Counters over all descendants of a task, kept up to date on every flush
+    (see app.services.subtask_progress). Tasks without subtasks have no row.
+    """
+    __tablename__ = "task_progress"
+
+    task_id = Column(Integer, ForeignKey("tasks.id", ondelete="CASCADE"), primary_key=True)
+    subtask_total = Column(Integer, nullable=False, default=0)
+    subtask_done = Column(Integer, nullable=False, default=0)
+    subtask_experience = Column(Integer, nullable=False, default=0)  # XP reward of all descendants
+
+    # Task.progress is joined-loaded so task lists get their counters from the same query
+    task = relationship(
+        Task,
+        viewonly=True,
+        backref=backref("progress", lazy="joined", uselist=False, viewonly=True),
+    )
@@ -0,0 +1,33 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, UniqueConstraint
+
+from app.db.base_class import Base
+
+class TaskRecurrence(Base):
+    """
+    Recurrence rule turning a task into a template. Occurrences are expanded
+    on read and only stored (as TaskOccurrence) once completed or edited.
+    """
+    __tablename__ = "task_recurrences"
+
+    id = Column(Integer, primary_key=True, index=True)
+    task_id = Column(Integer, ForeignKey("tasks.id", ondelete="CASCADE"), unique=True, nullable=False)
+    owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True, nullable=False)
+    freq = Column(String(10), nullable=False)  # daily, weekly, monthly
+    interval = Column(Integer, nullable=False, default=1)
+    by_weekday = Column(String(20), nullable=True)  # weekly only, e.g. "0,2,4" (Monday = 0)
+    dtstart = Column(DateTime, nullable=False)
+    until = Column(DateTime, nullable=True)  # last possible occurrence
+
+class TaskOccurrence(Base):
+    """
+    Link from one occurrence of a recurring task to the task row materialised for it
+    """
+    __tablename__ = "task_occurrences"
+    __table_args__ = (
+        UniqueConstraint("recurrence_id", "occurrence_at", name="uq_task_occurrences_recurrence_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    recurrence_id = Column(Integer, ForeignKey("task_recurrences.id", ondelete="CASCADE"), nullable=False)
+    occurrence_at = Column(DateTime, nullable=False, index=True)
+    task_id = Column(Integer, ForeignKey("tasks.id", ondelete="CASCADE"), unique=True, nullable=False)
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, ForeignKey, Integer
+
+from app.db.base_class import Base
+
+class ShardAssignment(Base):
+    """
+    The shard database holding a user's data. Lives in the directory database only.
+    """
+    __tablename__ = "shard_assignments"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    shard = Column(Integer, nullable=False, index=True)
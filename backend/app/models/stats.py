@@ -0,0 +1,17 @@
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer, Text
+
+from app.db.base_class import Base
+
+class UserStatVector(Base):
+    """
+    Effective character stats merged from a user's equipped items.
+    Recomputed when equipment changes, never on read.
+    """
+    __tablename__ = "user_stat_vectors"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    stats = Column(Text, nullable=False, default="{}")  # JSON object of summed numeric stats
+    xp_multiplier = Column(Float, nullable=False, default=1.0)
+    gold_multiplier = Column(Float, nullable=False, default=1.0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
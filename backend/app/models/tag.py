@@ -0,0 +1,24 @@
+from sqlalchemy import Column, ForeignKey, Integer, String
+
+from app.db.base_class import Base
+
+class TagPosting(Base):
+    """
+    Inverted index of task tags: for each owner and tag, the tasks carrying it.
+    The composite primary key doubles as the lookup index.
+    """
+    __tablename__ = "tag_postings"
+
+    owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    tag = Column(String(30), primary_key=True)
+    task_id = Column(Integer, ForeignKey("tasks.id", ondelete="CASCADE"), primary_key=True, index=True)
+
+class TagCount(Base):
+    """
+    Number of tasks per owner and tag, maintained alongside tag_postings
+    """
+    __tablename__ = "tag_counts"
+
+    owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    tag = Column(String(30), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
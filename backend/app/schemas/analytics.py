@@ -0,0 +1,17 @@
+from datetime import date
+from typing import List, Optional
+from pydantic import BaseModel
+
+class CompletionPoint(BaseModel):
+    bucket_start: date
+    category_id: Optional[int] = None  # only set when split by category
+    completed: int
+    reopened: int
+    experience: int
+    gold: int
+
+class CompletionSeries(BaseModel):
+    bucket: str
+    start: date
+    end: date
+    points: List[CompletionPoint]  # buckets without activity are omitted
@@ -0,0 +1,48 @@
+from typing import Optional, List, Dict
+from pydantic import BaseModel
+from datetime import datetime
+from app.models.task import TaskPriority, TaskDifficulty
+
+# Compact task entry for dashboard lists
+class DashboardTask(BaseModel):
+    id: Optional[int] = None  # None for an occurrence of a recurring task not stored yet
+    template_id: Optional[int] = None  # set for occurrences of recurring tasks
+    occurrence_at: Optional[datetime] = None
+    title: str
+    due_date: Optional[datetime] = None
+    priority: TaskPriority
+    difficulty: TaskDifficulty
+    experience_reward: int
+    gold_reward: int
+    category_id: Optional[int] = None
+    
+    class Config:
+        from_attributes = True
+
+# Compact achievement entry for the "recent achievements" list
+class DashboardAchievement(BaseModel):
+    id: int
+    name: str
+    icon_url: Optional[str] = None
+    unlocked_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+class DashboardStats(BaseModel):
+    experience_points: int
+    level: int
+    gold: int
+
+class DashboardInventory(BaseModel):
+    total_items: int = 0
+    equipped_items: int = 0
+    by_type: Dict[str, int] = {}
+
+# Everything the dashboard renders, in one payload
+class DashboardSummary(BaseModel):
+    stats: DashboardStats
+    today: List[DashboardTask]
+    overdue: List[DashboardTask]
+    inventory: DashboardInventory
+    recent_achievements: List[DashboardAchievement]
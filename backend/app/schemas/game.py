@@ -1,5 +1,5 @@
 from typing import Optional, List, Dict, Any
-from pydantic import BaseModel, constr
+from pydantic import BaseModel, conlist, constr, field_validator
 from datetime import datetime
 from app.models.game import ItemType
 
@@ -51,6 +51,12 @@ class InventoryItem(InventoryItemBase):
     class Config:
         from_attributes = True
 
+# Effective stats merged from equipped items
+class EffectiveStats(BaseModel):
+    stats: Dict[str, float]
+    xp_multiplier: float
+    gold_multiplier: float
+
 # Category schemas
 class CategoryBase(BaseModel):
     name: constr(min_length=1, max_length=50)
@@ -68,15 +74,48 @@ class Category(CategoryBase):
         from_attributes = True
 
 # Tag schemas
+def normalize_tag(name: str) -> str:
+    """
+    Canonical form of a tag: trimmed, lower-case, single spaces
+    """
+    return " ".join(name.split()).lower()
+
 class TaskTagBase(BaseModel):
     name: constr(min_length=1, max_length=30)
 
 class TaskTagCreate(TaskTagBase):
-    pass
+    @field_validator("name")
+    @classmethod
+    def normalize_name(cls, v: str) -> str:
+        v = normalize_tag(v)
+        if not v:
+            raise ValueError("Tag must not be blank")
+        return v
 
 class TaskTag(TaskTagBase):
     id: int
     task_id: int
     
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True
+
+class TagCount(BaseModel):
+    tag: str
+    count: int
+    
+    class Config:
+        from_attributes = True
+
+class TagBulkUpdate(BaseModel):
+    task_ids: conlist(int, min_length=1, max_length=500)
+    add: List[constr(min_length=1, max_length=30)] = []
+    remove: List[constr(min_length=1, max_length=30)] = []
+
+    @field_validator("add", "remove")
+    @classmethod
+    def normalize_names(cls, v: List[str]) -> List[str]:
+        return sorted({normalize_tag(name) for name in v} - {""})
+
+class TagBulkResult(BaseModel):
+    added: int
+    removed: int
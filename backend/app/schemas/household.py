@@ -0,0 +1,19 @@
+from typing import List
+from pydantic import BaseModel, constr
+from datetime import datetime
+
+class HouseholdCreate(BaseModel):
+    name: constr(min_length=1, max_length=100)
+
+class HouseholdMemberAdd(BaseModel):
+    username: constr(min_length=3, max_length=50)
+
+class Household(BaseModel):
+    id: int
+    name: str
+    owner_id: int
+    created_at: datetime
+    member_ids: List[int] = []
+    
+    class Config:
+        from_attributes = True
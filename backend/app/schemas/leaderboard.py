@@ -0,0 +1,22 @@
+from typing import List, Optional
+from pydantic import BaseModel
+
+class LeaderboardEntry(BaseModel):
+    rank: int
+    user_id: int
+    username: str
+    score: int
+
+class LeaderboardPage(BaseModel):
+    board: str
+    period: str
+    total: int
+    entries: List[LeaderboardEntry]
+
+class LeaderboardPosition(BaseModel):
+    board: str
+    period: str
+    total: int
+    rank: Optional[int] = None  # None until the user scores on this board
+    score: int
+    neighbours: List[LeaderboardEntry]
@@ -1,5 +1,5 @@
-from typing import Optional, List
-from pydantic import BaseModel, constr
+from typing import Optional, List, Literal
+from pydantic import AliasChoices, AliasPath, BaseModel, Field, conint, constr
 from datetime import datetime
 from app.models.task import TaskPriority, TaskDifficulty
 
@@ -27,6 +27,7 @@ class TaskUpdate(BaseModel):
     priority: Optional[TaskPriority] = None
     difficulty: Optional[TaskDifficulty] = None
     is_completed: Optional[bool] = None
+    parent_id: Optional[int] = None  # null moves the task to the top level
 
 # Properties to return via API
 class Task(TaskBase):
@@ -36,6 +37,12 @@ class Task(TaskBase):
     is_completed: bool
     streak_count: int
     owner_id: int
+    # Counters over all descendants, read from the joined task_progress row
+    subtask_total: int = Field(0, validation_alias=AliasChoices("subtask_total", AliasPath("progress", "subtask_total")))
+    subtask_done: int = Field(0, validation_alias=AliasChoices("subtask_done", AliasPath("progress", "subtask_done")))
+    subtask_experience: int = Field(
+        0, validation_alias=AliasChoices("subtask_experience", AliasPath("progress", "subtask_experience"))
+    )
     
     class Config:
         from_attributes = True
@@ -45,4 +52,36 @@ class TaskWithRelations(Task):
     subtasks: List['TaskWithRelations'] = []
     tags: List[str] = []
 
-TaskWithRelations.model_rebuild()  # Required for self-referencing models 
\ No newline at end of file
+TaskWithRelations.model_rebuild()  # Required for self-referencing models 
+
+# A page of search results
+class TaskSearchResults(BaseModel):
+    items: List[Task]
+    next_cursor: Optional[str] = None
+
+# Recurrence rules
+class RecurrenceCreate(BaseModel):
+    freq: Literal["daily", "weekly", "monthly"]
+    interval: conint(ge=1, le=365) = 1
+    by_weekday: Optional[List[conint(ge=0, le=6)]] = None  # weekly only, Monday = 0
+    dtstart: Optional[datetime] = None  # defaults to the task's due date
+    until: Optional[datetime] = None
+    count: Optional[conint(ge=1, le=10000)] = None
+
+class Recurrence(BaseModel):
+    id: int
+    task_id: int
+    freq: str
+    interval: int
+    by_weekday: Optional[List[int]] = None
+    dtstart: datetime
+    until: Optional[datetime] = None
+
+# A (possibly not yet stored) occurrence of a recurring task
+class TaskOccurrence(TaskBase):
+    id: Optional[int] = None  # set once the occurrence has been materialised
+    template_id: int
+    occurrence_at: datetime
+    is_completed: bool = False
+    completed_at: Optional[datetime] = None
+    owner_id: int
@@ -6,4 +6,6 @@ class Token(BaseModel):
     token_type: str = "bearer"
 
 class TokenPayload(BaseModel):
-    sub: Optional[int] = None  # subject (user id) 
\ No newline at end of file
+    sub: Optional[int] = None  # subject (user id)
+    jti: Optional[str] = None  # token id, used for revocation
+    exp: Optional[int] = None 
\ No newline at end of file
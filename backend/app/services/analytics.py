@@ -0,0 +1,284 @@
+"""
+Completion history and chart rollups.
+
+Every completion (and re-opening) of a task is appended to
+completion_events, and the matching daily and weekly rows in
+completion_rollups are bumped, in the flush that saves the task change, so
+the log, the rollups, the equipment bonus and the task commit together. Charts read only the
+rollups, which are keyed by (user, bucket, bucket_start, category), so a
+series over years of history is a single index range scan.
+
+Buckets are UTC days and ISO weeks (starting Monday). Re-opening a task
+does not take back its reward, so it is counted separately rather than
+subtracted from the completion it undoes. The equipment bonus is credited
+on a task's first completion only, so re-opening and completing a task
+again cannot earn it twice.
+"""
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import case, event, func, insert, literal, select
+from sqlalchemy.orm import Session
+
+from app.core import upsert
+from app.models.analytics import CompletionEvent, CompletionRollup
+from app.models.task import Task
+from app.models.user import User
+from app.services import character_stats
+
+BUCKETS = ("day", "week")
+
+COMPLETED = "completed"
+REOPENED = "reopened"
+
+_Totals = Tuple[int, int, int, int]  # completed, reopened, experience, gold
+
+
+def bucket_start(bucket: str, moment: datetime) -> date:
+    """
+    First day of the bucket containing `moment`
+    """
+    day = moment.date() if isinstance(moment, datetime) else moment
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def _bump(db: Session, user_id: int, category_id: int, at: datetime, totals: _Totals) -> None:
+    completed, reopened, experience, gold = totals
+    rows = [
+        {
+            "user_id": user_id,
+            "bucket": bucket,
+            "bucket_start": bucket_start(bucket, at),
+            "category_id": category_id,
+            "completed": completed,
+            "reopened": reopened,
+            "experience": experience,
+            "gold": gold,
+        }
+        for bucket in BUCKETS
+    ]
+    connection = db.connection()
+    # One upsert, so concurrent first completions in a bucket can't both insert its row
+    statement = upsert.insert(connection, CompletionRollup)
+    statement = statement.on_conflict_do_update(
+        index_elements=[
+            CompletionRollup.user_id,
+            CompletionRollup.bucket,
+            CompletionRollup.bucket_start,
+            CompletionRollup.category_id,
+        ],
+        set_={
+            "completed": CompletionRollup.completed + statement.excluded.completed,
+            "reopened": CompletionRollup.reopened + statement.excluded.reopened,
+            "experience": CompletionRollup.experience + statement.excluded.experience,
+            "gold": CompletionRollup.gold + statement.excluded.gold,
+        },
+    )
+    connection.execute(statement, rows)
+
+
+def _record(db: Session, user_id: int, task: Task, kind: str, experience: int, gold: int) -> None:
+    at = datetime.utcnow()
+    db.add(
+        CompletionEvent(
+            user_id=user_id,
+            task_id=task.id,
+            category_id=task.category_id,
+            kind=kind,
+            experience=experience,
+            gold=gold,
+            occurred_at=at,
+        )
+    )
+    totals = (1, 0, experience, gold) if kind == COMPLETED else (0, 1, 0, 0)
+    _bump(db, user_id, task.category_id or 0, at, totals)
+
+
+def _completed_before(db: Session, task_id: int) -> bool:
+    earlier = db.query(CompletionEvent.id).filter(
+        CompletionEvent.task_id == task_id, CompletionEvent.kind == COMPLETED
+    )
+    return earlier.first() is not None
+
+
+# Tasks whose next completion or re-opening is logged, by id
+_TRACKED_KEY = "analytics_tracked_tasks"
+
+
+def track(db: Session, task: Task, user_id: int) -> None:
+    """
+    Log the task's next completion (crediting the equipment bonus, if it is
+    the first) or re-opening in the flush that saves it, e.g. in update_task
+    """
+    vector = character_stats.get_vector(db, user_id)
+    db.info.setdefault(_TRACKED_KEY, {})[task.id] = (task, user_id, bool(task.is_completed), vector)
+
+
+@event.listens_for(Session, "before_flush")
+def _log_tracked_tasks(session: Session, flush_context, instances) -> None:
+    tracked = session.info.get(_TRACKED_KEY)
+    if not tracked:
+        return
+    for task_id, (task, user_id, was_completed, vector) in list(tracked.items()):
+        if bool(task.is_completed) == was_completed:
+            continue
+        del tracked[task_id]
+        if task.is_completed:
+            bonus = (0, 0)
+            if not _completed_before(session, task_id):
+                bonus = character_stats.credit_completion_bonus(session.get(User, user_id), vector, task)
+            _record(
+                session, user_id, task, COMPLETED, task.experience_reward + bonus[0], task.gold_reward + bonus[1]
+            )
+        else:
+            _record(session, user_id, task, REOPENED, 0, 0)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_tracked_tasks(session: Session, previous_transaction) -> None:
+    session.info.pop(_TRACKED_KEY, None)
+
+
+def completion_series(
+    db: Session,
+    user_id: int,
+    bucket: str,
+    start: date,
+    end: date,
+    by_category: bool = False,
+) -> List[Dict[str, object]]:
+    """
+    Rollup rows for buckets starting in [start, end], oldest first. Buckets
+    without activity are omitted. Without `by_category` categories are summed.
+    """
+    filters = (
+        CompletionRollup.user_id == user_id,
+        CompletionRollup.bucket == bucket,
+        CompletionRollup.bucket_start >= bucket_start(bucket, start),
+        CompletionRollup.bucket_start <= end,
+    )
+    if by_category:
+        query = (
+            select(
+                CompletionRollup.bucket_start,
+                CompletionRollup.category_id,
+                CompletionRollup.completed,
+                CompletionRollup.reopened,
+                CompletionRollup.experience,
+                CompletionRollup.gold,
+            )
+            .where(*filters)
+            .order_by(CompletionRollup.bucket_start, CompletionRollup.category_id)
+        )
+    else:
+        query = (
+            select(
+                CompletionRollup.bucket_start,
+                func.sum(CompletionRollup.completed).label("completed"),
+                func.sum(CompletionRollup.reopened).label("reopened"),
+                func.sum(CompletionRollup.experience).label("experience"),
+                func.sum(CompletionRollup.gold).label("gold"),
+            )
+            .where(*filters)
+            .group_by(CompletionRollup.bucket_start)
+            .order_by(CompletionRollup.bucket_start)
+        )
+    points = []
+    for row in db.execute(query).mappings():
+        point = dict(row)
+        if by_category:
+            point["category_id"] = point["category_id"] or None
+        points.append(point)
+    return points
+
+
+def seed_events_from_tasks(db: Session, user_id: Optional[int] = None) -> int:
+    """
+    Create completion events for tasks completed before the log existed
+    (using completed_at and the base reward). Idempotent: tasks that already
+    have an event are skipped. Returns the number of events created.
+    """
+    tasks = Task.__table__
+    logged = select(CompletionEvent.task_id).where(CompletionEvent.task_id.is_not(None))
+    query = select(
+        tasks.c.owner_id,
+        tasks.c.id,
+        tasks.c.category_id,
+        literal(COMPLETED),
+        tasks.c.experience_reward,
+        tasks.c.gold_reward,
+        tasks.c.completed_at,
+    ).where(
+        tasks.c.is_completed == True,  # noqa: E712
+        tasks.c.completed_at.is_not(None),
+        tasks.c.id.not_in(logged),
+    )
+    if user_id is not None:
+        query = query.where(tasks.c.owner_id == user_id)
+    result = db.execute(
+        insert(CompletionEvent).from_select(
+            ["user_id", "task_id", "category_id", "kind", "experience", "gold", "occurred_at"], query
+        )
+    )
+    db.commit()
+    return result.rowcount
+
+
+def rebuild_rollups(db: Session, user_id: Optional[int] = None, batch_size: int = 5000) -> int:
+    """
+    Recompute rollups from the event log. Daily rows are aggregated by the
+    database in one INSERT ... SELECT ... GROUP BY; weekly rows are folded
+    from the (much smaller) daily rows. Returns the number of rollup rows.
+    """
+    scope = [] if user_id is None else [CompletionRollup.user_id == user_id]
+    db.query(CompletionRollup).filter(*scope).delete(synchronize_session=False)
+
+    day = func.date(CompletionEvent.occurred_at)
+    category = func.coalesce(CompletionEvent.category_id, 0)
+    is_completed = CompletionEvent.kind == COMPLETED
+    daily = (
+        select(
+            CompletionEvent.user_id,
+            literal("day"),
+            day,
+            category,
+            func.sum(case((is_completed, 1), else_=0)),
+            func.sum(case((is_completed, 0), else_=1)),
+            func.sum(CompletionEvent.experience),
+            func.sum(CompletionEvent.gold),
+        )
+        .group_by(CompletionEvent.user_id, day, category)
+    )
+    if user_id is not None:
+        daily = daily.where(CompletionEvent.user_id == user_id)
+    columns = ["user_id", "bucket", "bucket_start", "category_id", "completed", "reopened", "experience", "gold"]
+    created = db.execute(insert(CompletionRollup).from_select(columns, daily)).rowcount
+
+    weekly: Dict[Tuple[int, date, int], List[int]] = {}
+    days = (
+        db.query(
+            CompletionRollup.user_id,
+            CompletionRollup.bucket_start,
+            CompletionRollup.category_id,
+            CompletionRollup.completed,
+            CompletionRollup.reopened,
+            CompletionRollup.experience,
+            CompletionRollup.gold,
+        )
+        .filter(CompletionRollup.bucket == "day", *scope)
+        .yield_per(batch_size)
+    )
+    for owner_id, started, category_id, *totals in days:
+        sums = weekly.setdefault((owner_id, bucket_start("week", started), category_id), [0, 0, 0, 0])
+        for i, value in enumerate(totals):
+            sums[i] += value or 0
+    rows = [
+        dict(zip(columns, (owner_id, "week", started, category_id, *sums)))
+        for (owner_id, started, category_id), sums in weekly.items()
+    ]
+    for start in range(0, len(rows), batch_size):
+        db.execute(insert(CompletionRollup), rows[start:start + batch_size])
+    db.commit()
+    return created + len(rows)
@@ -0,0 +1,185 @@
+"""
+Effective character stats.
+
+Equipped items' ``stats`` are summed and their ``effects`` folded into two
+reward multipliers, once per equipment change. Reads and task completions
+then use the stored vector (cached per user) instead of merging items.
+
+Recognised effects:
+    xp_multiplier / gold_multiplier   multiply the reward (1.5 = +50%)
+    xp_bonus / gold_bonus             add a percentage to the reward (10 = +10%)
+"""
+import json
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.cache import cache
+from app.core.write_coalescer import after_batch_commit
+from app.models.game import InventoryItem
+from app.models.stats import UserStatVector
+
+stats_cache = cache.namespace("character_stats")
+
+
+@dataclass
+class StatVector:
+    stats: Dict[str, float] = field(default_factory=dict)
+    xp_multiplier: float = 1.0
+    gold_multiplier: float = 1.0
+
+    def apply(self, experience: int, gold: int) -> Tuple[int, int]:
+        """
+        Rewards after equipment effects
+        """
+        return round(experience * self.xp_multiplier), round(gold * self.gold_multiplier)
+
+
+def _number(value) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    return None
+
+
+def merge_items(items: Iterable[InventoryItem]) -> StatVector:
+    """
+    Fold equipped items into a stat vector; non-numeric values are ignored
+    """
+    vector = StatVector()
+    bonus = {"xp": 0.0, "gold": 0.0}
+    for item in items:
+        for name, value in (item.stats or {}).items():
+            value = _number(value)
+            if value is not None:
+                vector.stats[name] = vector.stats.get(name, 0.0) + value
+        for name, value in (item.effects or {}).items():
+            value = _number(value)
+            if value is None:
+                continue
+            if name == "xp_multiplier":
+                vector.xp_multiplier *= value
+            elif name == "gold_multiplier":
+                vector.gold_multiplier *= value
+            elif name in ("xp_bonus", "gold_bonus"):
+                bonus[name[:-len("_bonus")]] += value
+    vector.xp_multiplier = max(0.0, vector.xp_multiplier * (1 + bonus["xp"] / 100))
+    vector.gold_multiplier = max(0.0, vector.gold_multiplier * (1 + bonus["gold"] / 100))
+    return vector
+
+
+def _from_row(row: UserStatVector) -> StatVector:
+    return StatVector(
+        stats=json.loads(row.stats),
+        xp_multiplier=row.xp_multiplier,
+        gold_multiplier=row.gold_multiplier,
+    )
+
+
+def _store(db: Session, user_id: int, vector: StatVector, row: Optional[UserStatVector]) -> None:
+    if row is None:
+        row = UserStatVector(user_id=user_id)
+        db.add(row)
+    row.stats = json.dumps(vector.stats, separators=(",", ":"), sort_keys=True)
+    row.xp_multiplier = vector.xp_multiplier
+    row.gold_multiplier = vector.gold_multiplier
+
+
+def recompute(db: Session, user_id: int) -> StatVector:
+    """
+    Rebuild a user's vector from their equipped items; call after equipment
+    changes. The row is flushed, not committed: the caller commits, and the
+    vector is cached once it has.
+    """
+    items = (
+        db.query(InventoryItem)
+        .filter(InventoryItem.owner_id == user_id, InventoryItem.is_equipped == True)  # noqa: E712
+        .all()
+    )
+    vector = merge_items(items)
+    _store(db, user_id, vector, db.get(UserStatVector, user_id))
+    db.flush()
+    db.info.setdefault(_PENDING_KEY, {})[user_id] = vector
+    return vector
+
+
+def get_vector(db: Session, user_id: int) -> StatVector:
+    """
+    The user's current vector: from the cache, else the stored row, else
+    computed (and flushed, for the caller to commit)
+    """
+    cached = stats_cache.get(str(user_id))
+    if cached is not None:
+        return StatVector(**cached)
+    row = db.get(UserStatVector, user_id)
+    if row is None:
+        return recompute(db, user_id)
+    vector = _from_row(row)
+    stats_cache.set(str(user_id), asdict(vector))
+    return vector
+
+
+# Vectors recomputed in the session's transaction, cached once it commits
+_PENDING_KEY = "character_stats_pending"
+
+
+@event.listens_for(Session, "after_commit")
+def _cache_recomputed(session: Session) -> None:
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+
+    def cache_vectors() -> None:
+        for user_id, vector in pending.items():
+            stats_cache.set(str(user_id), asdict(vector))
+
+    after_batch_commit(session, cache_vectors)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_recomputed(session: Session, previous_transaction) -> None:
+    session.info.pop(_PENDING_KEY, None)
+
+
+def credit_completion_bonus(user, vector: StatVector, task) -> Tuple[int, int]:
+    """
+    Credit the extra XP and gold equipment adds to a completed task's base
+    reward (the base reward itself is awarded by update_task). Call once per
+    task, on its first completion; the caller commits. Returns the (xp, gold) bonus.
+    """
+    experience, gold = vector.apply(task.experience_reward, task.gold_reward)
+    bonus = (experience - task.experience_reward, gold - task.gold_reward)
+    if bonus != (0, 0):
+        user.experience_points += bonus[0]
+        user.gold = max(0, user.gold + bonus[1])
+    return bonus
+
+
+def recompute_all(db: Session, user_ids: Optional[List[int]] = None, batch_size: int = 500) -> int:
+    """
+    Recompute many users' vectors (e.g. after item definitions changed), loading
+    equipped items in batches rather than per user. Returns the number of users.
+    """
+    if user_ids is None:
+        equipped_owners = db.query(InventoryItem.owner_id).filter(InventoryItem.is_equipped == True)  # noqa: E712
+        # Users with a stored vector but nothing equipped any more still need resetting
+        stored_owners = db.query(UserStatVector.user_id)
+        user_ids = {row[0] for row in equipped_owners.distinct()} | {row[0] for row in stored_owners}
+    owners = sorted(set(user_ids))
+
+    for start in range(0, len(owners), batch_size):
+        batch = owners[start:start + batch_size]
+        equipped: Dict[int, List[InventoryItem]] = {user_id: [] for user_id in batch}
+        for item in db.query(InventoryItem).filter(
+            InventoryItem.owner_id.in_(batch), InventoryItem.is_equipped == True  # noqa: E712
+        ):
+            equipped[item.owner_id].append(item)
+        rows = {row.user_id: row for row in db.query(UserStatVector).filter(UserStatVector.user_id.in_(batch))}
+        for user_id, items in equipped.items():
+            _store(db, user_id, merge_items(items), rows.get(user_id))
+        db.commit()
+    stats_cache.invalidate()
+    return len(owners)
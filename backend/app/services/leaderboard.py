@@ -0,0 +1,326 @@
+"""
+XP leaderboards.
+
+Each board is held in memory as a RankedList of (-score, user_id) keys, so
+top-N, rank-of-user and neighbours are O(log n). Boards are loaded from the
+database in the background after startup (the first read waits for them)
+and then follow XP changes: a flush hook records every
+change to users.experience_points (and adds it to the current period boards
+in the same transaction), and after commit an "xp.changed" event is
+published, which every worker applies to its boards through the event hub.
+"""
+import logging
+import re
+import threading
+from collections import OrderedDict
+from itertools import chain
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, attributes
+
+from app.core import upsert
+from app.core.events import event_hub
+from app.core.ranking import RankedList
+from app.core.sharding import shard_router
+from app.core.write_coalescer import after_batch_commit
+from app.db.session import SessionLocal
+from app.models.leaderboard import LeaderboardScore
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+BOARDS = ("all", "week", "month")
+PERIOD_BOARDS = ("week", "month")
+# Past periods each board accepts, e.g. "2024-W07" and "2024-02"
+PERIOD_FORMATS = {
+    "week": re.compile(r"\d{4}-W(0[1-9]|[1-4]\d|5[0-3])"),
+    "month": re.compile(r"\d{4}-(0[1-9]|1[0-2])"),
+}
+
+Entry = Tuple[int, int, int]  # (rank, user_id, score)
+
+
+def period_key(board: str, now: Optional[datetime] = None) -> str:
+    """
+    Storage key of the board's current period, e.g. "week:2024-W07"
+    """
+    now = now or datetime.utcnow()
+    if board == "week":
+        year, week, _ = now.isocalendar()
+        return f"week:{year}-W{week:02d}"
+    if board == "month":
+        return f"month:{now.year}-{now.month:02d}"
+    return "all"
+
+
+class Board:
+    """
+    One leaderboard: user scores plus their ranking
+    """
+
+    def __init__(self, key: str, scores: Iterable[Tuple[int, int]] = ()):
+        self.key = key
+        self.scores: Dict[int, int] = dict(scores)
+        self.ranked = RankedList((-score, user_id) for user_id, score in self.scores.items())
+        self.lock = threading.Lock()
+
+    def _set(self, user_id: int, score: int) -> None:
+        old = self.scores.get(user_id)
+        if old == score:
+            return
+        if old is not None:
+            self.ranked.remove((-old, user_id))
+        self.scores[user_id] = score
+        self.ranked.add((-score, user_id))
+
+    def set(self, user_id: int, score: int) -> None:
+        with self.lock:
+            self._set(user_id, score)
+
+    def add(self, user_id: int, delta: int) -> None:
+        with self.lock:
+            self._set(user_id, self.scores.get(user_id, 0) + delta)
+
+    def __len__(self) -> int:
+        return len(self.ranked)
+
+    def _rank_of_score(self, score: int) -> int:
+        # Competition ranking: tied users share the best rank
+        return self.ranked.bisect_left((-score, 0)) + 1
+
+    def rank(self, user_id: int) -> Optional[int]:
+        with self.lock:
+            score = self.scores.get(user_id)
+            return None if score is None else self._rank_of_score(score)
+
+    def _entries(self, keys: List[Tuple[int, int]]) -> List[Entry]:
+        entries: List[Entry] = []
+        for negative_score, user_id in keys:
+            if entries and entries[-1][2] == -negative_score:
+                rank = entries[-1][0]
+            else:
+                rank = self._rank_of_score(-negative_score)
+            entries.append((rank, user_id, -negative_score))
+        return entries
+
+    def top(self, offset: int = 0, limit: int = 10) -> List[Entry]:
+        with self.lock:
+            return self._entries(self.ranked.slice(offset, offset + limit))
+
+    def around(self, user_id: int, neighbours: int = 5) -> List[Entry]:
+        """
+        The user's entry with up to `neighbours` entries above and below it
+        """
+        with self.lock:
+            score = self.scores.get(user_id)
+            if score is None:
+                return []
+            position = self.ranked.bisect_left((-score, user_id))
+            return self._entries(self.ranked.slice(position - neighbours, position + neighbours + 1))
+
+    def among(self, user_ids: Iterable[int]) -> List[Entry]:
+        """
+        Ranking restricted to a group of users (e.g. a household); members without a score count as 0
+        """
+        with self.lock:
+            scores = sorted(((-self.scores.get(user_id, 0), user_id) for user_id in set(user_ids)))
+        entries: List[Entry] = []
+        for position, (negative_score, user_id) in enumerate(scores):
+            rank = entries[-1][0] if entries and entries[-1][2] == -negative_score else position + 1
+            entries.append((rank, user_id, -negative_score))
+        return entries
+
+
+class Leaderboard:
+    """
+    The in-memory boards of this worker: all-time, the current week and month,
+    and a few recently viewed past periods
+    """
+
+    def __init__(self, past_boards: int = 4):
+        self.past_boards = past_boards
+        self._boards: Dict[str, Board] = {}
+        self._past: "OrderedDict[str, Board]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._load_lock = threading.Lock()
+
+    def load(self, db: Session) -> None:
+        """
+        Build the all-time and current period boards from the database
+        """
+        started = datetime.utcnow()
+        rows = db.query(User.id, User.experience_points).yield_per(10000)
+        boards = {"all": Board("all", ((user_id, xp or 0) for user_id, xp in rows))}
+        for board in PERIOD_BOARDS:
+            key = period_key(board)
+            boards[key] = self._load_period(db, key)
+        with self._lock:
+            self._boards = boards
+        self._loaded = True
+        elapsed = (datetime.utcnow() - started).total_seconds()
+        logger.info(f"Loaded leaderboards ({len(boards['all'])} users) in {elapsed:.2f}s")
+
+    @staticmethod
+    def _load_period(db: Session, key: str) -> Board:
+        def scores(session: Session):
+            return (
+                session.query(LeaderboardScore.user_id, LeaderboardScore.score)
+                .filter(LeaderboardScore.board == key)
+                .yield_per(10000)
+            )
+
+        if shard_router.enabled:
+            # Period scores are written on each user's shard
+            per_shard = shard_router.each_shard(lambda session: scores(session).all())
+            return Board(key, chain.from_iterable(rows for _, rows in per_shard))
+        return Board(key, scores(db))
+
+    def board(self, db: Session, board: str, period: Optional[str] = None) -> Board:
+        """
+        A board by name ("all", "week", "month"), for the current or a given
+        period. Raises ValueError if the period is not one of the board's.
+        """
+        if period is not None:
+            period_format = PERIOD_FORMATS.get(board)
+            if period_format is None or not period_format.fullmatch(period):
+                raise ValueError(f"{period!r} is not a period of the {board!r} board")
+        key = f"{board}:{period}" if period is not None else period_key(board)
+        self._ensure_loaded(db)
+        with self._lock:
+            current = self._boards.get(key)
+            if current is not None:
+                return current
+            past = self._past.get(key)
+            if past is not None:
+                self._past.move_to_end(key)
+                return past
+        loaded = self._load_period(db, key)
+        with self._lock:
+            if key == period_key(board):
+                # A new period started since the boards were loaded
+                self._boards = {
+                    k: v for k, v in self._boards.items() if k == "all" or k.split(":")[0] != board
+                }
+                return self._boards.setdefault(key, loaded)
+            self._past[key] = loaded
+            while len(self._past) > self.past_boards:
+                self._past.popitem(last=False)
+        return loaded
+
+    def apply(self, user_id: int, experience_points: int, delta: int, periods: List[str]) -> None:
+        """
+        Apply an XP change (from any worker) to the in-memory boards
+        """
+        with self._lock:
+            boards = dict(self._boards)
+        if "all" in boards:
+            boards["all"].set(user_id, experience_points)
+        if delta:
+            for key in periods:
+                if key in boards:
+                    boards[key].add(user_id, delta)
+
+    def _on_xp_changed(self, user_id: int, event: dict) -> None:
+        data = event["data"]
+        self.apply(user_id, data["experience_points"], data["delta"], data.get("periods", []))
+
+    def _ensure_loaded(self, db: Optional[Session] = None) -> None:
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded:
+                return
+            if db is not None:
+                self.load(db)
+                return
+            db = SessionLocal()
+            try:
+                self.load(db)
+            finally:
+                db.close()
+
+    def _warm_up(self) -> None:
+        try:
+            self._ensure_loaded()
+        except Exception as e:
+            # The first leaderboard request retries
+            logger.warning(f"Loading leaderboards failed: {e}")
+
+    def start(self) -> None:
+        """
+        Follow XP changes, and load the boards in a background thread so
+        startup doesn't wait for a scan of every user
+        """
+        event_hub.add_listener("xp.changed", self._on_xp_changed)
+        threading.Thread(target=self._warm_up, name="leaderboard-load", daemon=True).start()
+
+
+leaderboard = Leaderboard()
+
+
+def usernames(db: Session, user_ids: Iterable[int]) -> Dict[int, str]:
+    user_ids = set(user_ids)
+    if not user_ids:
+        return {}
+    return dict(db.query(User.id, User.username).filter(User.id.in_(user_ids)).all())
+
+
+# Track XP changes made through any session
+
+_PENDING_KEY = "leaderboard_xp_changes"
+
+
+@event.listens_for(Session, "after_flush")
+def _record_xp_changes(session: Session, flush_context) -> None:
+    changes = []
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, User):
+            continue
+        history = attributes.get_history(obj, "experience_points")
+        if not history.has_changes():
+            continue
+        old = (history.deleted or [0])[0] or 0
+        new = (history.added or [0])[0] or 0
+        changes.append((obj.id, new, new - old))
+    if not changes:
+        return
+
+    periods = [period_key(board) for board in PERIOD_BOARDS]
+    rows = [
+        {"board": key, "user_id": user_id, "score": delta}
+        for user_id, _, delta in changes if delta
+        for key in periods
+    ]
+    if rows:
+        connection = session.connection()
+        # One upsert, so two first XP changes in a period can't both insert the row
+        statement = upsert.insert(connection, LeaderboardScore)
+        statement = statement.on_conflict_do_update(
+            index_elements=[LeaderboardScore.board, LeaderboardScore.user_id],
+            set_={"score": LeaderboardScore.score + statement.excluded.score},
+        )
+        connection.execute(statement, rows)
+    session.info.setdefault(_PENDING_KEY, []).extend(
+        (user_id, xp, delta, periods) for user_id, xp, delta in changes
+    )
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_xp_changes(session: Session) -> None:
+    changes = session.info.pop(_PENDING_KEY, None)
+    if not changes:
+        return
+
+    def publish() -> None:
+        for user_id, xp, delta, periods in changes:
+            event_hub.publish(user_id, "xp.changed", {"experience_points": xp, "delta": delta, "periods": periods})
+
+    after_batch_commit(session, publish)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_xp_changes(session: Session, previous_transaction) -> None:
+    session.info.pop(_PENDING_KEY, None)
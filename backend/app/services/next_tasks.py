@@ -0,0 +1,143 @@
+"""
+"Do this next": the user's open tasks ranked by a weighted score.
+
+Only the columns the score needs are read, through the owner/open-task
+filter, and the best k are picked with a heap (O(n log k)) instead of
+sorting everything. The ranked ids are cached per user and dropped when
+any of the user's tasks is committed; the TTL bounds how stale the due-date
+urgency can get in between.
+
+Score components, each in [0, 1], weighted by settings.NEXT_TASKS_WEIGHTS:
+    priority   low 0 .. critical 1
+    urgency    overdue 1, due in d days 1 / (1 + d), no due date 0
+    reward     experience reward relative to the best open task
+    ease       trivial 1 .. epic 0 (a negative weight favours hard tasks)
+"""
+import heapq
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.cache import cache
+from app.core.config import settings
+from app.core.write_coalescer import after_batch_commit
+from app.models.recurrence import TaskRecurrence
+from app.models.task import Task
+from app.services.recurrence import template_ids
+
+next_tasks_cache = cache.namespace("next_tasks")
+
+PRIORITY = {"low": 0.0, "medium": 1 / 3, "high": 2 / 3, "critical": 1.0}
+EASE = {"trivial": 1.0, "easy": 0.75, "medium": 0.5, "hard": 0.25, "epic": 0.0}
+
+Candidate = Tuple[int, object, object, Optional[datetime], Optional[int]]  # id, priority, difficulty, due, xp
+
+
+def _value(enum_value) -> str:
+    return getattr(enum_value, "value", enum_value)
+
+
+def score_candidates(
+    candidates: Iterable[Candidate],
+    k: int,
+    weights: Dict[str, float],
+    now: Optional[datetime] = None,
+) -> List[Tuple[float, int]]:
+    """
+    The k best (score, task_id) pairs, best first; ties go to the older task
+    """
+    candidates = list(candidates)
+    if not candidates:
+        return []
+    now = now or datetime.utcnow()
+    best_reward = max((xp or 0 for *_, xp in candidates), default=0) or 1
+    w_priority = weights.get("priority", 0.0)
+    w_urgency = weights.get("urgency", 0.0)
+    w_reward = weights.get("reward", 0.0)
+    w_ease = weights.get("ease", 0.0)
+
+    def scored():
+        for task_id, priority, difficulty, due_date, xp in candidates:
+            if due_date is None:
+                urgency = 0.0
+            else:
+                days = (due_date - now).total_seconds() / 86400
+                urgency = 1.0 if days <= 0 else 1 / (1 + days)
+            score = (
+                w_priority * PRIORITY.get(_value(priority), 0.0)
+                + w_urgency * urgency
+                + w_reward * (xp or 0) / best_reward
+                + w_ease * EASE.get(_value(difficulty), 0.0)
+            )
+            yield score, -task_id
+
+    return [(score, -negative_id) for score, negative_id in heapq.nlargest(k, scored())]
+
+
+def ranked_task_ids(db: Session, user_id: int) -> List[int]:
+    """
+    Ids of the user's top NEXT_TASKS_MAX_K open tasks, cached until a task changes
+    """
+    def compute() -> List[int]:
+        templates = template_ids(db, user_id)
+        rows = (
+            db.query(Task.id, Task.priority, Task.difficulty, Task.due_date, Task.experience_reward)
+            .filter(Task.owner_id == user_id, Task.is_completed == False)  # noqa: E712
+        )
+        candidates = (tuple(row) for row in rows if row.id not in templates)
+        top = score_candidates(candidates, settings.NEXT_TASKS_MAX_K, settings.NEXT_TASKS_WEIGHTS)
+        return [task_id for _, task_id in top]
+
+    return next_tasks_cache.get_or_set(str(user_id), compute, ttl=settings.NEXT_TASKS_CACHE_TTL)
+
+
+def next_tasks(db: Session, user_id: int, k: int) -> List[Task]:
+    """
+    The user's k best open tasks, best first
+    """
+    ids = ranked_task_ids(db, user_id)[:k]
+    if not ids:
+        return []
+    tasks = {task.id: task for task in db.query(Task).filter(Task.id.in_(ids))}
+    return [tasks[task_id] for task_id in ids if task_id in tasks and not tasks[task_id].is_completed]
+
+
+def invalidate(user_id: int) -> None:
+    next_tasks_cache.delete(str(user_id))
+
+
+# Drop a user's ranking whenever a change to one of their tasks (or
+# recurrence rules) is committed through any session
+
+_PENDING_KEY = "next_tasks_owners"
+
+
+@event.listens_for(Session, "after_flush")
+def _record_task_owners(session: Session, flush_context) -> None:
+    owners = {
+        obj.owner_id
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+        if isinstance(obj, (Task, TaskRecurrence))
+    }
+    if owners:
+        session.info.setdefault(_PENDING_KEY, set()).update(owners)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_rankings(session: Session) -> None:
+    owners = session.info.pop(_PENDING_KEY, None)
+    if not owners:
+        return
+
+    def invalidate_owners() -> None:
+        for owner_id in owners:
+            invalidate(owner_id)
+
+    after_batch_commit(session, invalidate_owners)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_task_owners(session: Session, previous_transaction) -> None:
+    session.info.pop(_PENDING_KEY, None)
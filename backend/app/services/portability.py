@@ -0,0 +1,335 @@
+"""
+Streaming export and bulk import of a user's data as NDJSON.
+
+Each line is {"type": ..., "data": {...}}. Tasks come before the records that
+point at them (tags, recurrence rules, occurrences), so an import can remap
+ids in a single pass. Exports read through server-side cursors and imports
+insert in chunked transactions, so memory stays flat however many rows move.
+"""
+import json
+from array import array
+from bisect import bisect_left
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy import DateTime, Enum as SAEnum, Table, bindparam, select, update
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+
+from app.core.sharding import shard_router
+from app.crud.game import check_achievement_requirements
+from app.models.game import Achievement, InventoryItem, TaskTag
+from app.models.recurrence import TaskOccurrence, TaskRecurrence
+from app.models.task import Task
+from app.models.user import User
+from app.schemas.game import AchievementCreate, InventoryItemCreate
+from app.schemas.task import RecurrenceCreate
+from app.services import character_stats, next_tasks
+from app.services.recurrence import utc_naive
+from app.services.subtask_progress import rebuild_progress
+from app.services.tags import rebuild_tag_index
+
+FORMAT_VERSION = 1
+
+# Export order matters: referenced records first
+RECORD_TYPES = ("task", "tag", "recurrence", "occurrence", "achievement", "inventory_item")
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Cannot export {type(value).__name__}")
+
+
+def _queries(user_id: int):
+    tasks = Task.__table__
+    owned_task_ids = select(tasks.c.id).where(tasks.c.owner_id == user_id)
+    recurrences = TaskRecurrence.__table__
+    return [
+        ("task", select(tasks).where(tasks.c.owner_id == user_id).order_by(tasks.c.id)),
+        ("tag", select(TaskTag.__table__).where(TaskTag.__table__.c.task_id.in_(owned_task_ids))),
+        ("recurrence", select(recurrences).where(recurrences.c.owner_id == user_id)),
+        (
+            "occurrence",
+            select(TaskOccurrence.__table__).where(
+                TaskOccurrence.__table__.c.recurrence_id.in_(
+                    select(recurrences.c.id).where(recurrences.c.owner_id == user_id)
+                )
+            ),
+        ),
+        ("achievement", select(Achievement.__table__).where(Achievement.__table__.c.user_id == user_id)),
+        ("inventory_item", select(InventoryItem.__table__).where(InventoryItem.__table__.c.owner_id == user_id)),
+    ]
+
+
+def export_user_data(user_id: int, batch_size: int = 1000) -> Iterator[str]:
+    """
+    Yield a user's data as NDJSON, a batch of lines at a time.
+    Uses its own session (on the user's shard) so the request's connection
+    can be released.
+    """
+    yield json.dumps({
+        "type": "header",
+        "data": {"version": FORMAT_VERSION, "user_id": user_id, "exported_at": datetime.utcnow().isoformat()},
+    }) + "\n"
+    db = shard_router.session_for_user(user_id)
+    try:
+        for record_type, query in _queries(user_id):
+            result = db.execute(query.execution_options(stream_results=True, yield_per=batch_size))
+            for rows in result.mappings().partitions():
+                yield "".join(
+                    json.dumps({"type": record_type, "data": dict(row)}, default=_default) + "\n" for row in rows
+                )
+    finally:
+        db.close()
+
+
+class InvalidRecord(ValueError):
+    """
+    A record the importing user may not create
+    """
+
+
+class IdMap:
+    """
+    old id -> new id for one record type, as two parallel arrays (16 bytes per
+    row). Ids are looked up by binary search, appending in any order is fine.
+    """
+
+    def __init__(self):
+        self._old = array("q")
+        self._new = array("q")
+        self._sorted = True
+
+    def add(self, old_id: int, new_id: int) -> None:
+        if self._old and old_id < self._old[-1]:
+            self._sorted = False
+        self._old.append(old_id)
+        self._new.append(new_id)
+
+    def get(self, old_id: Optional[int]) -> Optional[int]:
+        if old_id is None:
+            return None
+        if not self._sorted:
+            pairs = sorted(zip(self._old, self._new))
+            self._old = array("q", (old for old, _ in pairs))
+            self._new = array("q", (new for _, new in pairs))
+            self._sorted = True
+        i = bisect_left(self._old, old_id)
+        if i < len(self._old) and self._old[i] == old_id:
+            return self._new[i]
+        return None
+
+
+class Importer:
+    """
+    Bulk-insert an export into another user's account, one transaction per chunk
+    """
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.db: Session = shard_router.session_for_user(user_id)
+        self.counts: Dict[str, int] = {record_type: 0 for record_type in RECORD_TYPES}
+        self.task_ids = IdMap()
+        self.recurrence_ids = IdMap()
+        self._user: Optional[User] = None
+        # Subtasks to link once every task exists: new task id, old parent id
+        self._children = array("q")
+        self._parents = array("q")
+
+    @staticmethod
+    def _row(table: Table, data: Dict[str, Any]) -> Dict[str, Any]:
+        row = {}
+        for column in table.columns:
+            if column.primary_key or column.name not in data:
+                continue
+            value = data[column.name]
+            if value is not None:
+                if isinstance(column.type, DateTime) and isinstance(value, str):
+                    value = datetime.fromisoformat(value)
+                elif isinstance(column.type, SAEnum) and column.type.enum_class is not None:
+                    value = column.type.enum_class(value)
+            row[column.name] = value
+        return row
+
+    @property
+    def user(self) -> User:
+        if self._user is None:
+            self._user = self.db.get(User, self.user_id)
+        return self._user
+
+    def _achievement(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Validate an achievement like POST /game/achievements: only earned ones are imported
+        """
+        try:
+            achievement = AchievementCreate.model_validate(data)
+        except ValidationError:
+            raise InvalidRecord(f"Invalid achievement {data.get('name')!r}")
+        if not check_achievement_requirements(self.db, self.user, achievement.requirements):
+            raise InvalidRecord(f"Requirements not met for achievement {achievement.name!r}")
+        row = achievement.model_dump()
+        if data.get("unlocked_at"):
+            row["unlocked_at"] = data["unlocked_at"]
+        return row
+
+    def _inventory_item(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Validate an inventory item like POST /game/inventory
+        """
+        try:
+            item = InventoryItemCreate.model_validate(data)
+        except ValidationError:
+            raise InvalidRecord(f"Invalid inventory item {data.get('name')!r}")
+        if self.user.level < item.level_requirement:
+            raise InvalidRecord(
+                f"User level {self.user.level} is too low for item {item.name!r} "
+                f"(requires level {item.level_requirement})"
+            )
+        row = item.model_dump()
+        if data.get("acquired_at"):
+            row["acquired_at"] = data["acquired_at"]
+        return row
+
+    def _recurrence(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Validate a recurrence rule like PUT /tasks/{task_id}/recurrence, so a
+        bad interval or weekday can't break expanding it later
+        """
+        try:
+            by_weekday = data.get("by_weekday")
+            if isinstance(by_weekday, str):
+                # Exported as stored, e.g. "0,2,4"
+                by_weekday = [int(day) for day in by_weekday.split(",")]
+            rule = RecurrenceCreate.model_validate(dict(data, by_weekday=by_weekday))
+        except ValueError:  # ValidationError included
+            raise InvalidRecord(f"Invalid recurrence rule {data.get('id')!r}")
+        if rule.dtstart is None:
+            raise InvalidRecord(f"Recurrence rule {data.get('id')!r} has no start")
+        return {
+            "freq": rule.freq,
+            "interval": rule.interval,
+            "by_weekday": ",".join(str(d) for d in sorted(set(rule.by_weekday))) if rule.by_weekday else None,
+            "dtstart": utc_naive(rule.dtstart),
+            "until": utc_naive(rule.until) if rule.until else None,
+        }
+
+    def _insert(self, table: Table, rows: List[Dict[str, Any]]) -> List[int]:
+        result = self.db.execute(
+            table.insert().returning(table.c.id, sort_by_parameter_order=True), rows
+        )
+        return [row.id for row in result]
+
+    def add_batch(self, record_type: str, records: List[Dict[str, Any]]) -> None:
+        """
+        Insert one chunk of records of a single type and commit. Raises
+        InvalidRecord, with the chunk rolled back, if any record is malformed.
+        """
+        try:
+            if not all(isinstance(data, dict) for data in records):
+                raise InvalidRecord(f"Malformed {record_type} record")
+            added = self._add(record_type, records)
+        except InvalidRecord:
+            self.db.rollback()
+            raise
+        except (KeyError, ValueError, TypeError) as e:
+            # A missing id, an unknown enum value, an unparseable date...
+            self.db.rollback()
+            raise InvalidRecord(f"Malformed {record_type} record ({type(e).__name__}: {e})") from e
+        self.db.commit()
+        # Core inserts bypass the ranking's session hooks; chunks stay imported if a later one fails
+        next_tasks.invalidate(self.user_id)
+        self.counts[record_type] += added
+
+    def _add(self, record_type: str, records: List[Dict[str, Any]]) -> int:
+        """
+        Insert one chunk of records of a single type; returns how many were kept
+        """
+        if record_type == "task":
+            table = Task.__table__
+            rows = []
+            for data in records:
+                row = self._row(table, data)
+                row.update(owner_id=self.user_id, parent_id=None)
+                rows.append(row)
+            for data, new_id in zip(records, self._insert(table, rows)):
+                self.task_ids.add(data["id"], new_id)
+                if data.get("parent_id") is not None:
+                    self._children.append(new_id)
+                    self._parents.append(data["parent_id"])
+        elif record_type == "tag":
+            rows = []
+            for data in records:
+                task_id = self.task_ids.get(data.get("task_id"))
+                if task_id is not None:
+                    rows.append(dict(self._row(TaskTag.__table__, data), task_id=task_id))
+            if rows:
+                self.db.execute(TaskTag.__table__.insert(), rows)
+            records = rows
+        elif record_type == "recurrence":
+            rows, old_ids = [], []
+            for data in records:
+                task_id = self.task_ids.get(data.get("task_id"))
+                if task_id is not None:
+                    rows.append(dict(self._recurrence(data), task_id=task_id, owner_id=self.user_id))
+                    old_ids.append(data["id"])
+            for old_id, new_id in zip(old_ids, self._insert(TaskRecurrence.__table__, rows) if rows else []):
+                self.recurrence_ids.add(old_id, new_id)
+            records = rows
+        elif record_type == "occurrence":
+            rows = []
+            for data in records:
+                recurrence_id = self.recurrence_ids.get(data.get("recurrence_id"))
+                task_id = self.task_ids.get(data.get("task_id"))
+                if recurrence_id is not None and task_id is not None:
+                    rows.append(dict(
+                        self._row(TaskOccurrence.__table__, data), recurrence_id=recurrence_id, task_id=task_id
+                    ))
+            if rows:
+                self.db.execute(TaskOccurrence.__table__.insert(), rows)
+            records = rows
+        elif record_type == "achievement":
+            table = Achievement.__table__
+            rows = [dict(self._row(table, self._achievement(data)), user_id=self.user_id) for data in records]
+            self.db.execute(table.insert(), rows)
+        elif record_type == "inventory_item":
+            table = InventoryItem.__table__
+            rows = [dict(self._row(table, self._inventory_item(data)), owner_id=self.user_id) for data in records]
+            self.db.execute(table.insert(), rows)
+        else:
+            raise ValueError(f"Unknown record type: {record_type!r}")
+        return len(records)
+
+    def finish(self, chunk_size: int = 1000) -> Dict[str, int]:
+        """
+        Link subtasks to their remapped parents and rebuild derived data
+        """
+        tasks = Task.__table__
+        statement = update(tasks).where(tasks.c.id == bindparam("child_id")).values(parent_id=bindparam("new_parent_id"))
+        for start in range(0, len(self._children), chunk_size):
+            self.db.execute(
+                statement,
+                [
+                    {"child_id": child_id, "new_parent_id": self.task_ids.get(old_parent)}
+                    for child_id, old_parent in zip(
+                        self._children[start:start + chunk_size], self._parents[start:start + chunk_size]
+                    )
+                ],
+            )
+            self.db.commit()
+        if self._children:
+            rebuild_progress(self.db, owner_id=self.user_id)
+        if self.counts["tag"]:
+            rebuild_tag_index(self.db, owner_id=self.user_id)
+        if self.counts["inventory_item"]:
+            character_stats.recompute(self.db, self.user_id)
+            self.db.commit()
+        # Parents were relinked with Core too
+        next_tasks.invalidate(self.user_id)
+        return self.counts
+
+    def close(self) -> None:
+        self.db.close()
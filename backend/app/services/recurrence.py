@@ -0,0 +1,302 @@
+"""
+Lazy expansion of recurring tasks.
+
+A recurring task is a template plus a TaskRecurrence rule. Reads expand the
+rule only over the queried window; a real task row is created (materialised)
+only when an occurrence is completed or edited, so storage grows with
+completions rather than with calendar time.
+"""
+import calendar
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Set, Tuple, Union
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.crud.task import get_overdue_tasks, get_tasks_due_today
+from app.models.recurrence import TaskOccurrence as TaskOccurrenceModel
+from app.models.recurrence import TaskRecurrence
+from app.models.task import Task
+from app.schemas.task import Recurrence, RecurrenceCreate, TaskOccurrence
+
+
+def utc_naive(value: datetime) -> datetime:
+    """
+    Rules are stored as naive UTC; convert aware datetimes (e.g. "...Z" or "+02:00") to match
+    """
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _weekdays(rule: TaskRecurrence) -> List[int]:
+    if rule.by_weekday:
+        return sorted(int(day) for day in rule.by_weekday.split(","))
+    return [rule.dtstart.weekday()]
+
+
+def expand(rule: TaskRecurrence, start: datetime, end: datetime) -> Iterator[datetime]:
+    """
+    Occurrences of a rule in [start, end), computed without walking from dtstart
+    """
+    start = max(start, rule.dtstart)
+    if rule.until is not None:
+        end = min(end, rule.until + timedelta(seconds=1))
+    if start >= end:
+        return
+
+    if rule.freq == "daily":
+        step = timedelta(days=rule.interval)
+        skipped = max(0, (start - rule.dtstart) // step)
+        occurrence = rule.dtstart + skipped * step
+        while occurrence < end:
+            if occurrence >= start:
+                yield occurrence
+            occurrence += step
+
+    elif rule.freq == "weekly":
+        days = _weekdays(rule)
+        week_start = rule.dtstart - timedelta(days=rule.dtstart.weekday())
+        step = timedelta(weeks=rule.interval)
+        week = week_start + max(0, (start - week_start) // step) * step
+        while week < end:
+            for day in days:
+                occurrence = week + timedelta(days=day)
+                if start <= occurrence < end and occurrence >= rule.dtstart:
+                    yield occurrence
+            week += step
+
+    elif rule.freq == "monthly":
+        months_from_start = (start.year - rule.dtstart.year) * 12 + start.month - rule.dtstart.month
+        index = max(0, months_from_start // rule.interval - 1)
+        while True:
+            month = rule.dtstart.month - 1 + index * rule.interval
+            year, month = rule.dtstart.year + month // 12, month % 12 + 1
+            index += 1
+            if rule.dtstart.day > calendar.monthrange(year, month)[1]:
+                if datetime(year, month, 1) >= end:
+                    break
+                continue  # e.g. the 31st in a 30-day month
+            occurrence = rule.dtstart.replace(year=year, month=month)
+            if occurrence >= end:
+                break
+            if occurrence >= start:
+                yield occurrence
+
+
+def _until_for_count(rule: TaskRecurrence, count: int) -> datetime:
+    """
+    The date of the count-th occurrence, so rules can be stored with `until` only
+    """
+    window = {"daily": timedelta(days=1), "weekly": timedelta(weeks=1), "monthly": timedelta(days=62)}
+    end = rule.dtstart + window[rule.freq] * rule.interval * (count + 1)
+    occurrences = expand(rule, rule.dtstart, end)
+    last = rule.dtstart
+    for _, last in zip(range(count), occurrences):
+        pass
+    return last
+
+
+def to_schema(rule: TaskRecurrence) -> Recurrence:
+    return Recurrence(
+        id=rule.id,
+        task_id=rule.task_id,
+        freq=rule.freq,
+        interval=rule.interval,
+        by_weekday=_weekdays(rule) if rule.freq == "weekly" else None,
+        dtstart=rule.dtstart,
+        until=rule.until,
+    )
+
+
+def set_recurrence(db: Session, task: Task, rule_in: RecurrenceCreate) -> TaskRecurrence:
+    """
+    Create or replace the recurrence rule of a task
+    """
+    rule = db.query(TaskRecurrence).filter(TaskRecurrence.task_id == task.id).first()
+    if rule is None:
+        rule = TaskRecurrence(task_id=task.id, owner_id=task.owner_id)
+        db.add(rule)
+    rule.freq = rule_in.freq
+    rule.interval = rule_in.interval
+    rule.by_weekday = ",".join(str(d) for d in sorted(set(rule_in.by_weekday))) if rule_in.by_weekday else None
+    rule.dtstart = utc_naive(rule_in.dtstart) if rule_in.dtstart else task.due_date or task.created_at
+    rule.until = utc_naive(rule_in.until) if rule_in.until else None
+    if rule_in.count:
+        rule.until = _until_for_count(rule, rule_in.count)
+    db.commit()
+    db.refresh(rule)
+    return rule
+
+
+def clear_recurrence(db: Session, task: Task) -> None:
+    """
+    Remove a task's rule; materialised occurrences stay as ordinary tasks
+    """
+    rule = db.query(TaskRecurrence).filter(TaskRecurrence.task_id == task.id).first()
+    if rule is not None:
+        db.query(TaskOccurrenceModel).filter(TaskOccurrenceModel.recurrence_id == rule.id).delete(
+            synchronize_session=False
+        )
+        db.delete(rule)
+        db.commit()
+
+
+def template_id_query(user_id: int):
+    """
+    Subquery of the user's recurring template task ids
+    """
+    return select(TaskRecurrence.task_id).where(TaskRecurrence.owner_id == user_id)
+
+
+def template_ids(db: Session, user_id: int) -> Set[int]:
+    """
+    Ids of the user's recurring template tasks, which are hidden from due-date listings
+    """
+    return {row.task_id for row in db.query(TaskRecurrence.task_id).filter(TaskRecurrence.owner_id == user_id)}
+
+
+def occurrences_between(
+    db: Session,
+    user_id: int,
+    start: datetime,
+    end: datetime,
+) -> List[TaskOccurrence]:
+    """
+    Virtual (not yet materialised) occurrences of all the user's recurring
+    tasks in [start, end). Materialised occurrences are real tasks and are
+    returned by the regular task queries instead.
+    Costs three queries regardless of the window size.
+    """
+    rules = db.query(TaskRecurrence).filter(TaskRecurrence.owner_id == user_id).all()
+    if not rules:
+        return []
+    templates: Dict[int, Task] = {
+        task.id: task
+        for task in db.query(Task).filter(Task.id.in_([rule.task_id for rule in rules]))
+    }
+    materialised: Set[Tuple[int, datetime]] = {
+        (row.recurrence_id, row.occurrence_at)
+        for row in db.query(TaskOccurrenceModel.recurrence_id, TaskOccurrenceModel.occurrence_at).filter(
+            TaskOccurrenceModel.recurrence_id.in_([rule.id for rule in rules]),
+            TaskOccurrenceModel.occurrence_at >= start,
+            TaskOccurrenceModel.occurrence_at < end,
+        )
+    }
+
+    occurrences = []
+    for rule in rules:
+        template = templates.get(rule.task_id)
+        if template is None:
+            continue
+        for occurrence_at in expand(rule, start, end):
+            if (rule.id, occurrence_at) in materialised:
+                continue
+            occurrences.append(TaskOccurrence(
+                template_id=template.id,
+                occurrence_at=occurrence_at,
+                title=template.title,
+                description=template.description,
+                due_date=occurrence_at,
+                priority=template.priority,
+                difficulty=template.difficulty,
+                experience_reward=template.experience_reward,
+                gold_reward=template.gold_reward,
+                category_id=template.category_id,
+                owner_id=template.owner_id,
+            ))
+    occurrences.sort(key=lambda o: o.occurrence_at)
+    return occurrences
+
+
+def tasks_due_today(db: Session, user_id: int) -> List[Union[Task, TaskOccurrence]]:
+    """
+    Tasks due today, recurring templates excluded, followed by today's
+    occurrences of recurring tasks
+    """
+    templates = template_ids(db, user_id)
+    tasks = [t for t in get_tasks_due_today(db=db, user_id=user_id) if t.id not in templates]
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    return tasks + occurrences_between(db, user_id, today, today + timedelta(days=1))
+
+
+def overdue_tasks(db: Session, user_id: int) -> List[Union[Task, TaskOccurrence]]:
+    """
+    Overdue tasks, recurring templates excluded, followed by missed occurrences
+    of recurring tasks from the last RECURRENCE_OVERDUE_DAYS days
+    """
+    templates = template_ids(db, user_id)
+    tasks = [t for t in get_overdue_tasks(db=db, user_id=user_id) if t.id not in templates]
+    now = datetime.utcnow()
+    return tasks + occurrences_between(db, user_id, now - timedelta(days=settings.RECURRENCE_OVERDUE_DAYS), now)
+
+
+def _rule_of(db: Session, template: Task, occurrence_at: datetime) -> Optional[TaskRecurrence]:
+    """
+    The template's rule, if it has an occurrence at `occurrence_at`
+    """
+    rule = db.query(TaskRecurrence).filter(TaskRecurrence.task_id == template.id).first()
+    if rule is None or occurrence_at not in expand(rule, occurrence_at, occurrence_at + timedelta(seconds=1)):
+        return None
+    return rule
+
+
+def _stored_occurrence(db: Session, rule: TaskRecurrence, occurrence_at: datetime) -> Optional[Task]:
+    return (
+        db.query(Task)
+        .join(TaskOccurrenceModel, TaskOccurrenceModel.task_id == Task.id)
+        .filter(TaskOccurrenceModel.recurrence_id == rule.id, TaskOccurrenceModel.occurrence_at == occurrence_at)
+        .first()
+    )
+
+
+def stored_occurrence(db: Session, template: Task, occurrence_at: datetime) -> Optional[Task]:
+    """
+    The task row of an occurrence, if it has been materialised
+    """
+    rule = _rule_of(db, template, occurrence_at)
+    return _stored_occurrence(db, rule, occurrence_at) if rule is not None else None
+
+
+def materialise_occurrence(
+    db: Session,
+    template: Task,
+    occurrence_at: datetime,
+) -> Optional[Task]:
+    """
+    Get or create the task row for one occurrence.
+    Returns None if the template has no rule or the rule has no such occurrence.
+    """
+    rule = _rule_of(db, template, occurrence_at)
+    if rule is None:
+        return None
+    task = _stored_occurrence(db, rule, occurrence_at)
+    if task is not None:
+        return task
+
+    # The task and its link commit together, so a request losing the race
+    # on uq_task_occurrences_recurrence_at leaves no orphan task behind
+    task = Task(
+        title=template.title,
+        description=template.description,
+        due_date=occurrence_at,
+        priority=template.priority,
+        difficulty=template.difficulty,
+        experience_reward=template.experience_reward,
+        gold_reward=template.gold_reward,
+        category_id=template.category_id,
+        owner_id=template.owner_id,
+    )
+    db.add(task)
+    try:
+        db.flush()
+        db.add(TaskOccurrenceModel(recurrence_id=rule.id, occurrence_at=occurrence_at, task_id=task.id))
+        db.commit()
+    except IntegrityError:
+        # Materialised concurrently by another request
+        db.rollback()
+        return _stored_occurrence(db, rule, occurrence_at)
+    db.refresh(task)
+    return task
@@ -0,0 +1,183 @@
+"""
+Full-text task search.
+
+On SQLite, tasks are indexed in a contentless FTS5 table kept in sync by
+triggers. Besides title and description it indexes an owner token (u<id>),
+so the owner filter is answered by the index itself instead of by scanning
+every match across all users.
+"""
+import base64
+import json
+import logging
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import exists, or_, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.models.tag import TagPosting
+from app.models.task import Task
+from app.schemas.game import normalize_tag
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "tasks_fts"
+
+_DDL = [
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        title, description, owner,
+        content='', tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN
+        INSERT INTO {FTS_TABLE} (rowid, title, description, owner)
+        VALUES (new.id, new.title, coalesce(new.description, ''), 'u' || new.owner_id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, title, description, owner)
+        VALUES ('delete', old.id, old.title, coalesce(old.description, ''), 'u' || old.owner_id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE OF title, description, owner_id ON tasks BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, title, description, owner)
+        VALUES ('delete', old.id, old.title, coalesce(old.description, ''), 'u' || old.owner_id);
+        INSERT INTO {FTS_TABLE} (rowid, title, description, owner)
+        VALUES (new.id, new.title, coalesce(new.description, ''), 'u' || new.owner_id);
+    END""",
+]
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def ensure_search_index(engine: Engine) -> None:
+    """
+    Create the FTS table and its triggers if missing, indexing existing tasks once
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conn:
+        exists_ = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": FTS_TABLE},
+        ).scalar()
+        if exists_:
+            return
+        for statement in _DDL:
+            conn.execute(text(statement))
+        conn.execute(text(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, description, owner) "
+            "SELECT id, title, coalesce(description, ''), 'u' || owner_id FROM tasks"
+        ))
+    logger.info("Built full-text search index for tasks")
+
+
+def match_expression(q: str, user_id: int) -> Optional[str]:
+    """
+    Turn free text into an FTS5 query: every word must match, the last one as a prefix
+    """
+    words = _TOKEN.findall(q)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return f"owner : u{user_id} AND {{title description}} : ({' '.join(terms)})"
+
+
+def encode_cursor(rank: float, task_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([rank, task_id]).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    rank, task_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return float(rank), int(task_id)
+
+
+def search_tasks(
+    db: Session,
+    user_id: int,
+    q: str,
+    category_id: Optional[int] = None,
+    tag: Optional[str] = None,
+    is_completed: Optional[bool] = None,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Task], Optional[str]]:
+    """
+    Search the user's tasks, best match first (bm25, title weighted above description).
+    Returns one page of tasks and the cursor for the next page, if any.
+    """
+    if tag is not None:
+        # Stored tags are normalised; a tag that normalises to nothing filters nothing
+        tag = normalize_tag(tag) or None
+    if db.bind.dialect.name != "sqlite":
+        return _search_tasks_like(db, user_id, q, category_id, tag, is_completed, limit, cursor)
+
+    match = match_expression(q, user_id)
+    if match is None:
+        return [], None
+
+    rank = f"bm25({FTS_TABLE}, 10.0, 1.0, 0.0)"
+    conditions = [f"{FTS_TABLE} MATCH :match"]
+    params = {"match": match, "limit": limit + 1}
+    if category_id is not None:
+        conditions.append("tasks.category_id = :category_id")
+        params["category_id"] = category_id
+    if is_completed is not None:
+        conditions.append("tasks.is_completed = :is_completed")
+        params["is_completed"] = is_completed
+    if tag is not None:
+        conditions.append(
+            f"EXISTS (SELECT 1 FROM {TagPosting.__tablename__} tp "
+            "WHERE tp.owner_id = :owner_id AND tp.tag = :tag AND tp.task_id = tasks.id)"
+        )
+        params["owner_id"] = user_id
+        params["tag"] = tag
+    if cursor:
+        params["after_rank"], params["after_id"] = decode_cursor(cursor)
+        conditions.append(f"({rank}, tasks.id) > (:after_rank, :after_id)")
+
+    rows = db.execute(
+        text(
+            f"SELECT tasks.id, {rank} AS rank FROM {FTS_TABLE} "
+            f"JOIN tasks ON tasks.id = {FTS_TABLE}.rowid "
+            f"WHERE {' AND '.join(conditions)} "
+            "ORDER BY rank, tasks.id LIMIT :limit"
+        ),
+        params,
+    ).all()
+
+    next_cursor = encode_cursor(rows[limit - 1].rank, rows[limit - 1].id) if len(rows) > limit else None
+    rows = rows[:limit]
+    tasks = {task.id: task for task in db.query(Task).filter(Task.id.in_([row.id for row in rows]))}
+    return [tasks[row.id] for row in rows if row.id in tasks], next_cursor
+
+
+def _search_tasks_like(
+    db: Session,
+    user_id: int,
+    q: str,
+    category_id: Optional[int],
+    tag: Optional[str],
+    is_completed: Optional[bool],
+    limit: int,
+    cursor: Optional[str],
+) -> Tuple[List[Task], Optional[str]]:
+    """
+    Substring search for databases without FTS5, newest first
+    """
+    query = db.query(Task).filter(Task.owner_id == user_id)
+    for word in _TOKEN.findall(q):
+        pattern = f"%{word}%"
+        query = query.filter(or_(Task.title.ilike(pattern), Task.description.ilike(pattern)))
+    if category_id is not None:
+        query = query.filter(Task.category_id == category_id)
+    if is_completed is not None:
+        query = query.filter(Task.is_completed == is_completed)
+    if tag is not None:
+        query = query.filter(
+            exists().where(TagPosting.owner_id == user_id, TagPosting.tag == tag, TagPosting.task_id == Task.id)
+        )
+    if cursor:
+        query = query.filter(Task.id < decode_cursor(cursor)[1])
+    tasks = query.order_by(Task.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_cursor(0.0, tasks[limit - 1].id) if len(tasks) > limit else None
+    return tasks[:limit], next_cursor
@@ -0,0 +1,221 @@
+"""
+Subtask progress counters.
+
+Every task with subtasks has a task_progress row counting all of its
+descendants (total, done, and their XP reward). A before_flush hook turns
+each created, completed/reopened, reparented or deleted task into deltas
+for its ancestors and applies them in the same transaction, so lists read
+the counters with their task rows instead of loading trees.
+
+With SUBTASKS_AUTO_COMPLETE_PARENT, a parent whose last open subtask is
+completed is marked completed too (its reward is not credited).
+"""
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, event, insert, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session, attributes
+
+from app.core import upsert
+from app.core.config import settings
+from app.models.progress import TaskProgress
+from app.models.task import Task
+
+Counts = Tuple[int, int, int]  # subtasks, done, experience
+
+_ZERO: Counts = (0, 0, 0)
+
+
+def ancestor_ids(connection: Connection, parent_id: Optional[int]) -> List[int]:
+    """
+    parent_id, its parent, and so on up to the root (tasks already deleted are left out)
+    """
+    tasks = Task.__table__
+    chain: List[int] = []
+    while parent_id is not None and parent_id not in chain:
+        row = connection.execute(select(tasks.c.parent_id).where(tasks.c.id == parent_id)).first()
+        if row is None:
+            break
+        chain.append(parent_id)
+        parent_id = row.parent_id
+    return chain
+
+
+def _subtree(connection: Connection, task_id: Optional[int]) -> Counts:
+    if task_id is None:
+        return _ZERO
+    row = connection.execute(
+        select(TaskProgress.subtask_total, TaskProgress.subtask_done, TaskProgress.subtask_experience)
+        .where(TaskProgress.task_id == task_id)
+    ).first()
+    return tuple(row) if row else _ZERO
+
+
+def _old_new(obj: Task, key: str):
+    history = attributes.get_history(obj, key)
+    if history.has_changes():
+        old = history.deleted[0] if history.deleted else None
+        new = history.added[0] if history.added else None
+        return old, new
+    value = getattr(obj, key)
+    return value, value
+
+
+def _apply(connection: Connection, deltas: Dict[int, List[int]]) -> None:
+    rows = [
+        {"task_id": task_id, "subtask_total": total, "subtask_done": done, "subtask_experience": experience}
+        for task_id, (total, done, experience) in deltas.items()
+        if total or done or experience
+    ]
+    if not rows:
+        return
+    # One upsert, so two flushes creating a parent's first subtasks can't both insert its row
+    statement = upsert.insert(connection, TaskProgress)
+    statement = statement.on_conflict_do_update(
+        index_elements=[TaskProgress.task_id],
+        set_={
+            "subtask_total": TaskProgress.subtask_total + statement.excluded.subtask_total,
+            "subtask_done": TaskProgress.subtask_done + statement.excluded.subtask_done,
+            "subtask_experience": TaskProgress.subtask_experience + statement.excluded.subtask_experience,
+        },
+    )
+    connection.execute(statement, rows)
+
+
+def _finished_parents(connection: Connection, task_ids: List[int]) -> List[int]:
+    tasks = Task.__table__
+    return list(
+        connection.execute(
+            select(TaskProgress.task_id)
+            .join(tasks, tasks.c.id == TaskProgress.task_id)
+            .where(
+                TaskProgress.task_id.in_(task_ids),
+                TaskProgress.subtask_total > 0,
+                TaskProgress.subtask_done == TaskProgress.subtask_total,
+                tasks.c.is_completed == False,  # noqa: E712
+            )
+        ).scalars()
+    )
+
+
+@event.listens_for(Session, "before_flush")
+def _maintain_counters(session: Session, flush_context, instances) -> None:
+    new = [obj for obj in session.new if isinstance(obj, Task)]
+    dirty = [obj for obj in session.dirty if isinstance(obj, Task)]
+    deleted = [obj for obj in session.deleted if isinstance(obj, Task)]
+    if not (new or dirty or deleted):
+        return
+    connection = session.connection()
+    deltas: Dict[int, List[int]] = defaultdict(lambda: [0, 0, 0])
+
+    def shift(parent_id: Optional[int], counts: Counts, sign: int = 1, skip=()) -> List[int]:
+        if parent_id is None or not any(counts):
+            # Nothing to add up the tree: don't walk it
+            return []
+        chain = ancestor_ids(connection, parent_id)
+        if any(task_id in skip for task_id in chain):
+            return []
+        for task_id in chain:
+            delta = deltas[task_id]
+            for i, value in enumerate(counts):
+                delta[i] += sign * value
+        return chain
+
+    for obj in new:
+        shift(obj.parent_id, (1, int(bool(obj.is_completed)), obj.experience_reward or 0))
+
+    # A deleted subtree is subtracted once, from above its top-most deleted task
+    deleted_ids = {obj.id for obj in deleted}
+    for obj in deleted:
+        parent_id, _ = _old_new(obj, "parent_id")
+        completed, _ = _old_new(obj, "is_completed")
+        experience, _ = _old_new(obj, "experience_reward")
+        total, done, sub_experience = _subtree(connection, obj.id)
+        own = (1 + total, int(bool(completed)) + done, (experience or 0) + sub_experience)
+        shift(parent_id, own, -1, skip=deleted_ids)
+    if deleted_ids:
+        connection.execute(delete(TaskProgress).where(TaskProgress.task_id.in_(deleted_ids)))
+
+    for obj in dirty:
+        if not session.is_modified(obj, include_collections=False):
+            continue
+        old_parent, new_parent = _old_new(obj, "parent_id")
+        old_done, new_done = _old_new(obj, "is_completed")
+        old_experience, new_experience = _old_new(obj, "experience_reward")
+        old_own = (1, int(bool(old_done)), old_experience or 0)
+        new_own = (1, int(bool(new_done)), new_experience or 0)
+        if old_parent == new_parent:
+            shift(new_parent, tuple(n - o for n, o in zip(new_own, old_own)))
+        else:
+            total, done, experience = _subtree(connection, obj.id)
+            shift(old_parent, (old_own[0] + total, old_own[1] + done, old_own[2] + experience), -1)
+            shift(new_parent, (new_own[0] + total, new_own[1] + done, new_own[2] + experience))
+
+    finished = [task_id for task_id, delta in deltas.items() if delta[1] > 0]
+    _apply(connection, deltas)
+
+    if not settings.SUBTASKS_AUTO_COMPLETE_PARENT:
+        return
+    while finished:
+        deltas = defaultdict(lambda: [0, 0, 0])
+        for task_id in _finished_parents(connection, finished):
+            parent = session.get(Task, task_id)
+            parent.is_completed = True
+            parent.completed_at = datetime.utcnow()
+            shift(parent.parent_id, (0, 1, 0))
+        finished = list(deltas)
+        _apply(connection, deltas)
+
+
+def check_parent(db: Session, task: Optional[Task], parent_id: int, owner_id: int) -> Optional[str]:
+    """
+    Why `parent_id` can't be the parent of `task` (None for a new task), or None if it can
+    """
+    parent = db.get(Task, parent_id)
+    if parent is None or parent.owner_id != owner_id:
+        return "Parent task not found"
+    if task is not None and task.id in ancestor_ids(db.connection(), parent_id):
+        return "A task cannot be moved under itself or one of its subtasks"
+    return None
+
+
+def rebuild_progress(db: Session, owner_id: Optional[int] = None) -> int:
+    """
+    Recompute counters from the task tree, e.g. after bulk imports.
+    Returns the number of tasks with subtasks.
+    """
+    tasks = Task.__table__
+    query = select(tasks.c.id, tasks.c.parent_id, tasks.c.is_completed, tasks.c.experience_reward)
+    if owner_id is not None:
+        query = query.where(tasks.c.owner_id == owner_id)
+    parent_of: Dict[int, Optional[int]] = {}
+    own: Dict[int, Counts] = {}
+    for task_id, parent_id, completed, experience in db.execute(query):
+        parent_of[task_id] = parent_id
+        own[task_id] = (1, int(bool(completed)), experience or 0)
+
+    counters: Dict[int, List[int]] = defaultdict(lambda: [0, 0, 0])
+    for task_id, counts in own.items():
+        parent_id, seen = parent_of[task_id], {task_id}
+        while parent_id is not None and parent_id in parent_of and parent_id not in seen:
+            seen.add(parent_id)
+            counter = counters[parent_id]
+            for i, value in enumerate(counts):
+                counter[i] += value
+            parent_id = parent_of[parent_id]
+
+    progress = TaskProgress.__table__
+    scope = select(tasks.c.id)
+    if owner_id is not None:
+        scope = scope.where(tasks.c.owner_id == owner_id)
+    db.execute(progress.delete().where(progress.c.task_id.in_(scope)))
+    rows = [
+        {"task_id": task_id, "subtask_total": total, "subtask_done": done, "subtask_experience": experience}
+        for task_id, (total, done, experience) in counters.items()
+    ]
+    for start in range(0, len(rows), 1000):
+        db.execute(insert(TaskProgress), rows[start:start + 1000])
+    db.commit()
+    return len(rows)
@@ -0,0 +1,197 @@
+"""
+Task tags with a per-owner inverted index.
+
+task_tags stays the record of which tags a task carries; tag_postings and
+tag_counts are derived from it in the same transaction, so tag filters and
+tag clouds never have to load every task or every tag.
+"""
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Select, func, select
+from sqlalchemy.orm import Session
+
+from app.core import upsert
+from app.models.game import TaskTag
+from app.models.tag import TagCount, TagPosting
+from app.models.task import Task
+from app.schemas.game import normalize_tag
+from app.services import next_tasks
+
+
+def _bump_counts(db: Session, owner_id: int, deltas: Dict[str, int]) -> None:
+    deltas = {tag: delta for tag, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    # Upserts, so two requests adding an owner's first use of a tag can't both insert its row
+    for tag, delta in deltas.items():
+        statement = upsert.insert(db, TagCount).values(owner_id=owner_id, tag=tag, count=max(0, delta))
+        db.execute(
+            statement.on_conflict_do_update(
+                index_elements=[TagCount.owner_id, TagCount.tag], set_={"count": TagCount.count + delta}
+            )
+        )
+    db.query(TagCount).filter(TagCount.owner_id == owner_id, TagCount.count <= 0).delete(
+        synchronize_session=False
+    )
+
+
+def _tag_pairs(db: Session, task_ids: Sequence[int], tags: Sequence[str]) -> set:
+    return set(
+        db.query(TaskTag.task_id, TaskTag.name).filter(TaskTag.task_id.in_(task_ids), TaskTag.name.in_(tags))
+    )
+
+
+def add_tags(db: Session, owner_id: int, task_ids: Sequence[int], tags: Sequence[str]) -> int:
+    """
+    Tag tasks (already checked to belong to owner_id); existing tags are left alone.
+    Returns the number of tags added.
+    """
+    present = _tag_pairs(db, task_ids, tags)
+    deltas: Dict[str, int] = {}
+    for task_id in task_ids:
+        for tag in tags:
+            if (task_id, tag) in present:
+                continue
+            # The posting's primary key decides between concurrent adds: only
+            # the request whose insert lands creates the tag and counts it
+            statement = upsert.insert(db, TagPosting).values(owner_id=owner_id, tag=tag, task_id=task_id)
+            if db.execute(statement.on_conflict_do_nothing()).rowcount:
+                db.add(TaskTag(task_id=task_id, name=tag))
+                deltas[tag] = deltas.get(tag, 0) + 1
+    _bump_counts(db, owner_id, deltas)
+    db.commit()
+    # Bulk tag writes don't go through the ranking's session hooks
+    next_tasks.invalidate(owner_id)
+    return sum(deltas.values())
+
+
+def remove_tags(db: Session, owner_id: int, task_ids: Sequence[int], tags: Sequence[str]) -> int:
+    """
+    Untag tasks (already checked to belong to owner_id). Returns the number of tags removed.
+    """
+    present = _tag_pairs(db, task_ids, tags)
+    if not present:
+        return 0
+    db.query(TaskTag).filter(TaskTag.task_id.in_(task_ids), TaskTag.name.in_(tags)).delete(
+        synchronize_session=False
+    )
+    db.query(TagPosting).filter(
+        TagPosting.owner_id == owner_id, TagPosting.task_id.in_(task_ids), TagPosting.tag.in_(tags)
+    ).delete(synchronize_session=False)
+    deltas: Dict[str, int] = {}
+    for _, tag in present:
+        deltas[tag] = deltas.get(tag, 0) - 1
+    _bump_counts(db, owner_id, deltas)
+    db.commit()
+    next_tasks.invalidate(owner_id)
+    return len(present)
+
+
+def add_tag(db: Session, task: Task, name: str) -> TaskTag:
+    """
+    Tag a single task, returning the (new or existing) tag row
+    """
+    add_tags(db, task.owner_id, [task.id], [name])
+    return db.query(TaskTag).filter(TaskTag.task_id == task.id, TaskTag.name == name).first()
+
+
+def get_owned_tag(db: Session, tag_id: int, owner_id: int) -> Tuple[Optional[TaskTag], bool]:
+    """
+    Look up a tag and whether its task belongs to owner_id, in one query
+    """
+    row = (
+        db.query(TaskTag, Task.owner_id)
+        .join(Task, Task.id == TaskTag.task_id)
+        .filter(TaskTag.id == tag_id)
+        .first()
+    )
+    if row is None:
+        return None, False
+    return row[0], row[1] == owner_id
+
+
+def delete_tag(db: Session, tag: TaskTag, owner_id: int) -> TaskTag:
+    remove_tags(db, owner_id, [tag.task_id], [tag.name])
+    return tag
+
+
+def forget_task(db: Session, task: Task) -> None:
+    """
+    Drop a task from the tag counts before it is deleted (postings cascade)
+    """
+    tags = [row.tag for row in db.query(TagPosting.tag).filter(TagPosting.task_id == task.id)]
+    if tags:
+        remove_tags(db, task.owner_id, [task.id], tags)
+
+
+def owned_task_ids(db: Session, owner_id: int, task_ids: Iterable[int]) -> set:
+    task_ids = set(task_ids)
+    return {
+        row.id for row in db.query(Task.id).filter(Task.id.in_(task_ids), Task.owner_id == owner_id)
+    }
+
+
+def tagged_task_ids(owner_id: int, tags: Sequence[str], match_all: bool = True) -> Select:
+    """
+    Subquery of the owner's task ids carrying all (or any) of the tags
+    """
+    query = select(TagPosting.task_id).where(TagPosting.owner_id == owner_id, TagPosting.tag.in_(tags))
+    if match_all:
+        return query.group_by(TagPosting.task_id).having(func.count() == len(set(tags)))
+    return query.distinct()
+
+
+def tag_cloud(db: Session, owner_id: int, limit: int = 100) -> List[TagCount]:
+    return (
+        db.query(TagCount)
+        .filter(TagCount.owner_id == owner_id)
+        .order_by(TagCount.count.desc(), TagCount.tag)
+        .limit(limit)
+        .all()
+    )
+
+
+def rebuild_tag_index(db: Session, owner_id: Optional[int] = None) -> None:
+    """
+    Recompute tag_postings and tag_counts from task_tags, for one owner or everyone.
+    Tags stored before normalisation are normalised, and resulting duplicates dropped.
+    """
+    postings = db.query(TagPosting)
+    counts = db.query(TagCount)
+    source = (
+        db.query(TaskTag.id, TaskTag.name, TaskTag.task_id, Task.owner_id)
+        .join(Task, Task.id == TaskTag.task_id)
+        .order_by(TaskTag.id)
+    )
+    if owner_id is not None:
+        postings = postings.filter(TagPosting.owner_id == owner_id)
+        counts = counts.filter(TagCount.owner_id == owner_id)
+        source = source.filter(Task.owner_id == owner_id)
+    postings.delete(synchronize_session=False)
+    counts.delete(synchronize_session=False)
+
+    seen = set()
+    totals: Dict[Tuple[int, str], int] = {}
+    renamed: Dict[int, str] = {}
+    duplicates: List[int] = []
+    for tag_id, name, task_id, owner in source.all():
+        tag = normalize_tag(name)
+        if (owner, tag, task_id) in seen:
+            duplicates.append(tag_id)
+            continue
+        if tag != name:
+            renamed[tag_id] = tag
+        seen.add((owner, tag, task_id))
+        totals[(owner, tag)] = totals.get((owner, tag), 0) + 1
+
+    if duplicates:
+        db.query(TaskTag).filter(TaskTag.id.in_(duplicates)).delete(synchronize_session=False)
+    if renamed:
+        db.bulk_update_mappings(TaskTag, [{"id": i, "name": name} for i, name in renamed.items()])
+    db.bulk_insert_mappings(TagPosting, [{"owner_id": o, "tag": t, "task_id": i} for o, t, i in seen])
+    db.bulk_insert_mappings(TagCount, [{"owner_id": o, "tag": t, "count": c} for (o, t), c in totals.items()])
+    db.commit()
+    if owner_id is not None:
+        next_tasks.invalidate(owner_id)
+    else:
+        next_tasks.next_tasks_cache.invalidate()
@@ -10,10 +10,27 @@ import os
 
 from app.core.config import settings
 from app.core.logging import setup_logging
+from app.core.admission import AdmissionControlMiddleware, admission_stats
+from app.core.cache import cache
+from app.core.events import start_event_relay, stop_event_relay
+from app.core.profiling import RequestProfilerMiddleware, instrument_routes
+from app.core.query_log import QueryContextMiddleware, slow_query_log
+from app.core.revocation import revocation_store
+from app.core.startup import (
+    measure_startup,
+    schema_fingerprint,
+    schema_is_current,
+    set_schema_stamp,
+    timed,
+)
 from app.api.deps import get_db
 from app.db.session import engine, SessionLocal
 from app.db.init_db import init_db
-from app.api.api_v1.api import api_router
+from app.services.leaderboard import leaderboard
+from app.services.search import ensure_search_index
+from app.models.user import User
+from app.api.api_v1.api import api_router, lazy_routers
+from app.api.lazy import include_lazy_routers
 
 # Setup logging
 logger = setup_logging()
@@ -24,6 +41,16 @@ app = FastAPI(
     version="1.0.0",
 )
 
+# Shed load before it reaches the handlers (health checks bypass this).
+# Added before CORS so rejections still carry CORS headers.
+app.add_middleware(AdmissionControlMiddleware)
+
+# Tag slow statements with the request that ran them
+app.add_middleware(QueryContextMiddleware)
+
+# X-Profile: run a superuser's request under cProfile
+app.add_middleware(RequestProfilerMiddleware)
+
 # Set up CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -35,12 +62,14 @@ app.add_middleware(
 
 # Include API router
 app.include_router(api_router, prefix="/api/v1")
+include_lazy_routers(app, "/api/v1", lazy_routers, on_load=instrument_routes)
+instrument_routes(app)
 
 @app.on_event("startup")
 async def startup_event():
     try:
-        # Log system information
-        logger.info(f"""
+        logger.info(f"Starting {settings.PROJECT_NAME} ({settings.ENVIRONMENT})")
+        logger.debug(f"""
 System Information:
   - Python Version: {sys.version}
   - Environment: {settings.ENVIRONMENT}
@@ -49,13 +78,38 @@ System Information:
   - Database URL: {settings.DATABASE_URL}
 """.strip())
 
-        # Initialize database
-        init_db(SessionLocal())
-        logger.info("Database initialized successfully")
+        slow_query_log.install(engine)
+
+        # Initialize database, skipping DDL when the schema stamp is current
+        with timed("db_init"):
+            metadata = User.metadata
+            if schema_is_current(engine, metadata):
+                logger.info("Database schema is current, skipping initialization")
+            else:
+                db = SessionLocal()
+                try:
+                    init_db(db)
+                finally:
+                    db.close()
+                set_schema_stamp(engine, schema_fingerprint(metadata))
+                logger.info("Database initialized successfully")
+
+        with timed("search_index"):
+            ensure_search_index(engine)
+
+        start_event_relay()
+        revocation_store.start()
+        # Boards are loaded in the background; the first leaderboard request waits for them
+        leaderboard.start()
     except Exception as e:
         logger.error(f"Error during startup: {str(e)}", exc_info=True)
         raise
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    stop_event_relay()
+    revocation_store.stop()
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -69,8 +123,14 @@ async def health_check():
             "status": "healthy",
             "timestamp": datetime.now().isoformat(),
             "version": "1.0.0",
-            "environment": settings.ENVIRONMENT
+            "environment": settings.ENVIRONMENT,
+            "admission": admission_stats(),
+            "cache": cache.get_stats(),
         }
     except Exception as e:
         logger.error(f"Health check failed: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail="Health check failed") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Health check failed")
+
+if __name__ == "__main__":
+    if "--measure-startup" in sys.argv:
+        measure_startup()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+import os
+import signal
+import sys
+from pathlib import Path
+
+import click
+
+BASE_DIR = Path(__file__).resolve().parent
+
+
+@click.group()
+def cli():
+    """Task Donegeon API Management CLI"""
+
+
+@cli.command()
+@click.option("--workers", type=int, help="Number of worker processes (default: sized from CPUs and memory)")
+@click.option("--bind", help="Address to listen on (default: 0.0.0.0:$PORT)")
+def serve(workers, bind):
+    """Run the API under gunicorn with preloaded, pre-forked uvicorn workers"""
+    args = ["gunicorn", "--config", str(BASE_DIR / "gunicorn.conf.py")]
+    if workers:
+        args += ["--workers", str(workers)]
+    if bind:
+        args += ["--bind", bind]
+    args.append("main:app")
+    os.chdir(BASE_DIR)
+    os.execvp(sys.executable, [sys.executable, "-m"] + args)
+
+
+@cli.command()
+@click.option("--pidfile", default=lambda: os.getenv("GUNICORN_PIDFILE", "/tmp/task_donegeon_api.pid"),
+              help="Gunicorn master pidfile")
+def reload(pidfile):
+    """Gracefully restart the serve workers (finishes in-flight requests)"""
+    try:
+        pid = int(Path(pidfile).read_text().strip())
+    except (OSError, ValueError):
+        raise click.ClickException(f"No running server found (pidfile {pidfile})")
+    os.kill(pid, signal.SIGHUP)
+    click.echo(f"Sent reload signal to server (pid {pid})")
+
+
+@cli.command()
+@click.option("--processes", type=int, default=lambda: int(os.getenv("JOB_WORKERS", "2")),
+              help="Number of job worker processes")
+def worker(processes):
+    """Run background jobs and periodic schedules"""
+    from app.core.logging import setup_logging
+    from app.core.jobs import run_worker_pool
+    setup_logging()
+    run_worker_pool(processes)
+
+
+@cli.command("job-stats")
+def job_stats():
+    """Show job queue depth, throughput and latency for the last hour"""
+    import json
+    from app.core.jobs import job_stats as get_job_stats
+    from app.db.session import SessionLocal
+    db = SessionLocal()
+    try:
+        click.echo(json.dumps(get_job_stats(db), indent=2))
+    finally:
+        db.close()
+
+
+@cli.command("rotate-keys")
+def rotate_keys():
+    """Create a new JWT signing key now; older keys keep verifying until their tokens expire"""
+    from app.core.keyring import keyring
+    kid = keyring.rotate(force=True)
+    click.echo(f"New signing key: {kid}")
+
+
+@cli.command("rebuild-tags")
+@click.option("--owner-id", type=int, help="Only rebuild this user's tags")
+def rebuild_tags(owner_id):
+    """Normalise task tags and rebuild the tag index and counts"""
+    from app.db.session import SessionLocal
+    from app.services.tags import rebuild_tag_index
+    db = SessionLocal()
+    try:
+        rebuild_tag_index(db, owner_id=owner_id)
+    finally:
+        db.close()
+    click.echo("Tag index rebuilt")
+
+
+@cli.command("rebuild-analytics")
+@click.option("--user-id", type=int, help="Only rebuild this user's rollups")
+@click.option("--seed/--no-seed", default=False, help="First log tasks completed before the event log existed")
+def rebuild_analytics(user_id, seed):
+    """Recompute completion chart rollups from the completion event log"""
+    from app.db.session import SessionLocal
+    from app.services.analytics import rebuild_rollups, seed_events_from_tasks
+    db = SessionLocal()
+    try:
+        if seed:
+            click.echo(f"Logged {seed_events_from_tasks(db, user_id=user_id)} earlier completions")
+        click.echo(f"Rebuilt {rebuild_rollups(db, user_id=user_id)} rollup rows")
+    finally:
+        db.close()
+
+
+@cli.command("split-shards")
+@click.option("--force", is_flag=True, help="Overwrite existing shard files")
+def split_shards(force):
+    """Copy the database into SHARD_COUNT per-household shard files"""
+    from app.core.config import settings
+    from app.core.sharding import split_database
+    try:
+        counts = split_database(force=force, batch_size=settings.EXPORT_BATCH_SIZE)
+    except (ValueError, FileExistsError) as e:
+        raise click.ClickException(str(e))
+    for shard, users in counts.items():
+        click.echo(f"shard {shard:3d}: {users} users")
+    click.echo("Restart the API to route requests to the shards")
+
+
+@cli.command("benchmark-leaderboard")
+@click.option("--users", type=int, default=1_000_000, help="Number of synthetic users")
+@click.option("--operations", type=int, default=100_000, help="Operations timed per measurement")
+def benchmark_leaderboard(users, operations):
+    """Time leaderboard build, XP updates, rank, top-N and neighbour lookups on synthetic data"""
+    import random
+    import time
+    from app.services.leaderboard import Board
+
+    scores = {user_id: random.randint(0, 500_000) for user_id in range(1, users + 1)}
+    started = time.perf_counter()
+    board = Board("benchmark", scores.items())
+    click.echo(f"build        {time.perf_counter() - started:8.2f} s   ({users} users)")
+
+    def measure(name, operation):
+        started = time.perf_counter()
+        for _ in range(operations):
+            operation(random.randint(1, users))
+        click.echo(f"{name:<12} {(time.perf_counter() - started) / operations * 1e6:8.2f} us/op")
+
+    measure("xp update", lambda user_id: board.add(user_id, random.randint(1, 50)))
+    measure("rank", board.rank)
+    measure("top 10", lambda user_id: board.top(0, 10))
+    measure("neighbours", lambda user_id: board.around(user_id, 5))
+
+
+@cli.command("benchmark-revocation")
+@click.option("--revoked", type=int, default=100_000, help="Number of revoked tokens in the store")
+@click.option("--lookups", type=int, default=200_000, help="Lookups timed per measurement")
+def benchmark_revocation(revoked, lookups):
+    """Time revocation checks for tokens that were and weren't revoked (target: under 1 us)"""
+    import time
+    import uuid
+    from datetime import datetime, timedelta
+    from app.core.revocation import RevocationStore
+
+    store = RevocationStore(refresh_interval=0)
+    expires_at = datetime.utcnow() + timedelta(hours=1)
+    revoked_jtis = [uuid.uuid4().hex for _ in range(revoked)]
+    for jti in revoked_jtis:
+        store._add(jti, expires_at)
+
+    def measure(name, jtis):
+        # Copies, so each lookup hashes a new string as a decoded token would
+        jtis = [jti.encode().decode() for jti in jtis]
+        started = time.perf_counter()
+        for jti in jtis:
+            store.is_revoked(jti)
+        click.echo(f"{name:<12} {(time.perf_counter() - started) / len(jtis) * 1e6:8.3f} us/lookup")
+
+    measure("not revoked", [uuid.uuid4().hex for _ in range(lookups)])
+    measure("revoked", [revoked_jtis[i % revoked] for i in range(lookups)])
+
+
+@cli.command("benchmark-writes")
+@click.option("--writers", type=int, default=50, help="Concurrent writer threads")
+@click.option("--writes", type=int, default=100, help="Writes per writer")
+@click.option("--journal-mode", type=click.Choice(["delete", "wal"]), default="delete", help="SQLite journal mode")
+@click.option("--shards", type=int, default=4, help="Database files the writers are spread over in the sharded run")
+def benchmark_writes(writers, writes, journal_mode, shards):
+    """Compare commit-per-write, group commit and sharding on scratch SQLite files"""
+    import tempfile
+    import threading
+    import time
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.orm import Session
+    from app.core.write_coalescer import WriteCoalescer
+
+    def insert(session, writer):
+        session.execute(text("INSERT INTO writes (writer, payload) VALUES (:writer, :payload)"),
+                        {"writer": writer, "payload": "x" * 64})
+        session.commit()
+
+    def run(name, write):
+        def writer(number):
+            for _ in range(writes):
+                write(number)
+
+        threads = [threading.Thread(target=writer, args=(number,)) for number in range(writers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        total = writers * writes
+        click.echo(f"{name:<14} {elapsed:8.2f} s   {total / elapsed:10.0f} writes/s")
+
+    with tempfile.TemporaryDirectory() as directory:
+        def database(name):
+            engine = create_engine(f"sqlite:///{directory}/{name}.db",
+                                   connect_args={"check_same_thread": False, "timeout": 60},
+                                   pool_size=writers, max_overflow=0)
+            with engine.begin() as conn:
+                conn.exec_driver_sql(f"PRAGMA journal_mode={journal_mode}")
+                conn.exec_driver_sql("CREATE TABLE writes (id INTEGER PRIMARY KEY, writer INTEGER, payload TEXT)")
+            return engine
+
+        def direct(engines):
+            def write(number):
+                with Session(engines[number % len(engines)]) as session:
+                    insert(session, number)
+            return write
+
+        run("commit each", direct([database("single")]))
+        coalescer = WriteCoalescer(database("coalesced"))
+        run("group commit", lambda number: coalescer.submit(lambda session: insert(session, number)))
+        run(f"{shards} shards", direct([database(f"shard_{shard}") for shard in range(shards)]))
+        click.echo(f"group commit: {coalescer.units / max(coalescer.batches, 1):.1f} writes per transaction")
+
+if __name__ == "__main__":
+    cli()
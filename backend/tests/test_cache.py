@@ -0,0 +1,117 @@
+import socketserver
+import threading
+import time
+
+import pytest
+
+from app.core.cache import Cache, CacheBackend, MemoryBackend, RedisBackend, SQLiteBackend
+
+
+def test_backend_must_implement_every_operation():
+    class Incomplete(CacheBackend):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_values_round_trip_as_json(tmp_path):
+    cache = Cache(SQLiteBackend(str(tmp_path / "cache.db")))
+    namespace = cache.namespace("categories")
+    namespace.set("all", [{"id": 1, "name": "Chores"}])
+    assert namespace.get("all") == [{"id": 1, "name": "Chores"}]
+    assert cache.backend.get("categories:0:all") == b'[{"id":1,"name":"Chores"}]'
+
+
+def test_eviction_keeps_namespace_versions():
+    cache = Cache(MemoryBackend(max_entries=2))
+    namespace = cache.namespace("stats")
+    namespace.set("1", "stale")
+    namespace.invalidate()
+    for key in ("2", "3", "4"):
+        namespace.set(key, key)
+    assert namespace.get("1") is None
+    assert cache.backend.get("stats:__version__") == b"1"
+
+
+class RedisStandIn(socketserver.ThreadingTCPServer):
+    """
+    Just enough of the Redis protocol (GET, SET [PX], DEL, INCR[BY]) for the backend
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), RedisHandler)
+        self.data = {}
+
+
+class RedisHandler(socketserver.StreamRequestHandler):
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def bulk(self, value):
+        return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+
+    def handle(self):
+        data = self.server.data
+        while True:
+            args = self.read_command()
+            if args is None:
+                return
+            name, args = args[0].upper(), args[1:]
+            entry = data.get(args[0]) if args else None
+            if entry is not None and entry[1] is not None and entry[1] < time.monotonic():
+                del data[args[0]]
+                entry = None
+            if name == b"GET":
+                reply = self.bulk(entry[0] if entry else None)
+            elif name == b"SET":
+                expires_at = time.monotonic() + int(args[3]) / 1000 if len(args) > 3 and args[2].upper() == b"PX" else None
+                data[args[0]] = (args[1], expires_at)
+                reply = b"+OK\r\n"
+            elif name == b"DEL":
+                reply = b":%d\r\n" % (data.pop(args[0], None) is not None)
+            elif name in (b"INCR", b"INCRBY"):
+                value = (int(entry[0]) if entry else 0) + (int(args[1]) if len(args) > 1 else 1)
+                data[args[0]] = (str(value).encode(), entry[1] if entry else None)
+                reply = b":%d\r\n" % value
+            else:
+                reply = b"+OK\r\n"
+            self.wfile.write(reply)
+
+
+@pytest.fixture
+def redis_url():
+    pytest.importorskip("redis")
+    server = RedisStandIn()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"redis://127.0.0.1:{server.server_address[1]}/0"
+    server.shutdown()
+    server.server_close()
+
+
+def test_redis_backend(redis_url):
+    backend = RedisBackend(redis_url)
+    cache = Cache(backend)
+    namespace = cache.namespace("next_tasks")
+    namespace.set("7", [3, 1, 2])
+    assert namespace.get("7") == [3, 1, 2]
+    namespace.invalidate()
+    assert namespace.get("7") is None
+    assert backend.get("next_tasks:__version__") == b"1"
+    backend.set("short", b"x", ttl=0.01)
+    time.sleep(0.05)
+    assert backend.get("short") is None
+    backend.delete("next_tasks:__version__")
+    assert backend.get("next_tasks:__version__") is None
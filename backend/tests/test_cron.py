@@ -0,0 +1,48 @@
+from datetime import datetime
+
+import pytest
+
+from app.core.cron import CronSchedule
+
+
+def test_daily_at_fixed_time():
+    schedule = CronSchedule("30 3 * * *")
+    assert schedule.next_after(datetime(2024, 5, 1, 2, 0)) == datetime(2024, 5, 1, 3, 30)
+    assert schedule.next_after(datetime(2024, 5, 1, 3, 30)) == datetime(2024, 5, 2, 3, 30)
+
+
+def test_steps_ranges_and_lists():
+    schedule = CronSchedule("*/15 9-17 * * 1,3,5")
+    # 2024-05-04 is a Saturday, so the next run is Monday morning
+    assert schedule.next_after(datetime(2024, 5, 3, 17, 50)) == datetime(2024, 5, 6, 9, 0)
+    assert schedule.next_after(datetime(2024, 5, 6, 9, 0)) == datetime(2024, 5, 6, 9, 15)
+
+
+def test_weekdays_count_from_sunday():
+    assert CronSchedule("0 0 * * 0").next_after(datetime(2024, 5, 1)) == datetime(2024, 5, 5)
+
+
+def test_day_of_month_or_day_of_week_when_both_restricted():
+    # The 13th, or any Friday
+    schedule = CronSchedule("0 12 13 * 5")
+    assert schedule.next_after(datetime(2024, 5, 1)) == datetime(2024, 5, 3, 12, 0)
+    assert schedule.next_after(datetime(2024, 5, 10, 12, 0)) == datetime(2024, 5, 13, 12, 0)
+
+
+def test_day_of_month_alone_ignores_weekday():
+    assert CronSchedule("0 0 1 * *").next_after(datetime(2024, 5, 2)) == datetime(2024, 6, 1)
+
+
+def test_leap_day():
+    assert CronSchedule("0 0 29 2 *").next_after(datetime(2024, 3, 1)) == datetime(2028, 2, 29)
+
+
+@pytest.mark.parametrize("expression", ["* * * *", "60 * * * *", "* * 0 * *", "* * * * 7", "*/0 * * * *"])
+def test_invalid_expressions(expression):
+    with pytest.raises(ValueError):
+        CronSchedule(expression)
+
+
+def test_never_matching_expression():
+    with pytest.raises(ValueError):
+        CronSchedule("0 0 31 2 *").next_after(datetime(2024, 1, 1))
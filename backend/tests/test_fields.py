@@ -0,0 +1,50 @@
+import json
+from collections import namedtuple
+from datetime import datetime
+from enum import Enum
+
+import pytest
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+from app.api import fields as sparse
+
+
+class Item(BaseModel):
+    id: int
+    title: str
+    done: bool
+
+
+Row = namedtuple("Row", ["id", "title", "done"])
+GameRow = namedtuple("GameRow", ["id", "title", "stats", "kind", "at"])
+
+
+class Kind(Enum):
+    WEAPON = "weapon"
+
+
+def test_fieldset_always_includes_id():
+    parse = sparse.fieldset(Item)
+    assert parse(fields="") == ["id"]
+    assert parse(fields="title, done,title") == ["id", "title", "done"]
+    assert parse(fields=None) is None
+
+
+def test_fieldset_rejects_unknown_fields():
+    with pytest.raises(HTTPException) as error:
+        sparse.fieldset(Item)(fields="title,secret")
+    assert error.value.status_code == 400
+
+
+def test_render_only_id():
+    response = sparse.render([Row(1, "a", False), Row(2, "b", True)], ["id"])
+    assert json.loads(response.body) == [{"id": 1}, {"id": 2}]
+
+
+def test_render_rows_plain_values():
+    at = datetime(2024, 2, 1, 12, 30)
+    rows = [GameRow(1, "a", {"strength": 3, "tags": ["x"]}, Kind.WEAPON, at)]
+    assert json.loads(sparse.render_rows(rows, ["id", "stats", "kind", "at"])) == [
+        {"id": 1, "stats": {"strength": 3, "tags": ["x"]}, "kind": "weapon", "at": "2024-02-01T12:30:00"},
+    ]
@@ -19,5 +19,9 @@ class Config:
     # Security
     PASSWORD_SALT = os.getenv('PASSWORD_SALT', 'change_in_production')
     
+    # Login user cache
+    USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '1024'))
+    USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', '300'))  # seconds
+    
     # Development vs Production
     DEBUG = os.getenv('FLASK_DEBUG', '0') == '1' 
\ No newline at end of file
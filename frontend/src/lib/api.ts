@@ -6,6 +6,8 @@ import type {
   InventoryItem,
   Category,
   TaskTag,
+  DashboardSummary,
+  TaskSearchResults,
 } from '@/types/api'
 
 const api = axios.create({
@@ -42,16 +44,42 @@ export const getCurrentUser = async () => {
   return response.data as User
 }
 
+// Dashboard (single round trip; the browser revalidates it with ETag)
+export const getDashboard = async () => {
+  const response = await api.get('/dashboard')
+  return response.data as DashboardSummary
+}
+
 // Tasks
 export const getTasks = async (params?: {
   skip?: number
   limit?: number
   include_completed?: boolean
+  tags?: string
+  tag_mode?: 'all' | 'any'
+  fields?: string // e.g. 'id,title,due_date,is_completed'; the response then has only these keys
 }) => {
   const response = await api.get('/tasks', { params })
   return response.data as Task[]
 }
 
+export const getNextTasks = async (k = 5) => {
+  const response = await api.get('/tasks/next', { params: { k } })
+  return response.data as Task[]
+}
+
+export const searchTasks = async (params: {
+  q: string
+  category_id?: number
+  tag?: string
+  is_completed?: boolean
+  limit?: number
+  cursor?: string
+}) => {
+  const response = await api.get('/tasks/search', { params })
+  return response.data as TaskSearchResults
+}
+
 export const createTask = async (taskData: {
   title: string
   description?: string
@@ -75,6 +103,55 @@ export const deleteTask = async (taskId: number) => {
   return response.data as Task
 }
 
+// Leaderboards
+export interface LeaderboardEntry {
+  rank: number
+  user_id: number
+  username: string
+  score: number
+}
+
+export const getLeaderboard = async (params?: {
+  board?: 'all' | 'week' | 'month'
+  offset?: number
+  limit?: number
+}) => {
+  const response = await api.get('/leaderboard', { params })
+  return response.data as { board: string; period: string; total: number; entries: LeaderboardEntry[] }
+}
+
+export const getMyLeaderboardPosition = async (params?: { board?: 'all' | 'week' | 'month'; neighbours?: number }) => {
+  const response = await api.get('/leaderboard/me', { params })
+  return response.data as {
+    board: string
+    period: string
+    total: number
+    rank: number | null
+    score: number
+    neighbours: LeaderboardEntry[]
+  }
+}
+
+// Analytics
+export interface CompletionPoint {
+  bucket_start: string
+  category_id: number | null
+  completed: number
+  reopened: number
+  experience: number
+  gold: number
+}
+
+export const getCompletionSeries = async (params?: {
+  bucket?: 'day' | 'week'
+  start?: string
+  end?: string
+  by_category?: boolean
+}) => {
+  const response = await api.get('/analytics/completions', { params })
+  return response.data as { bucket: string; start: string; end: string; points: CompletionPoint[] }
+}
+
 // Achievements
 export const getAchievements = async () => {
   const response = await api.get('/game/achievements')
@@ -117,6 +194,68 @@ export const deleteTaskTag = async (tagId: number) => {
   return response.data as TaskTag
 }
 
+export const getTagCloud = async () => {
+  const response = await api.get('/game/tags')
+  return response.data as { tag: string; count: number }[]
+}
+
+export const bulkTagTasks = async (changes: {
+  task_ids: number[]
+  add?: string[]
+  remove?: string[]
+}) => {
+  const response = await api.post('/game/tasks/tags/bulk', changes)
+  return response.data as { added: number; removed: number }
+}
+
+// Server-push events (replaces polling). Returns a function that closes the stream.
+export interface ServerEvent {
+  type: string
+  data: Record<string, any>
+  ts: number
+}
+
+export const subscribeToEvents = (onEvent: (event: ServerEvent) => void) => {
+  const controller = new AbortController()
+  const authorization = api.defaults.headers.common['Authorization'] as string | undefined
+
+  const connect = async () => {
+    while (!controller.signal.aborted) {
+      try {
+        const response = await fetch('/api/v1/events', {
+          headers: authorization ? { Authorization: authorization } : {},
+          signal: controller.signal,
+        })
+        if (!response.body) return
+        const reader = response.body.pipeThrough(new TextDecoderStream()).getReader()
+        let buffer = ''
+        while (true) {
+          const { value, done } = await reader.read()
+          if (done) break
+          buffer += value
+          const messages = buffer.split('\n\n')
+          buffer = messages.pop() ?? ''
+          for (const message of messages) {
+            const type = message.match(/^event: (.*)$/m)?.[1]
+            const data = message.match(/^data: (.*)$/m)?.[1]
+            if (type && data) {
+              const payload = JSON.parse(data)
+              onEvent({ type, data: payload.data, ts: payload.ts })
+            }
+          }
+        }
+      } catch (error) {
+        if (controller.signal.aborted) return
+      }
+      // Reconnect after the server's advertised retry delay
+      await new Promise((resolve) => setTimeout(resolve, 3000))
+    }
+  }
+
+  connect()
+  return () => controller.abort()
+}
+
 // Add auth token to requests
 export const setAuthToken = (token: string) => {
   api.defaults.headers.common['Authorization'] = `Bearer ${token}`
@@ -29,6 +29,9 @@ export interface Task {
   parent_id: number | null
   category_id: number | null
   tags: string[]
+  subtask_total: number
+  subtask_done: number
+  subtask_experience: number
 }
 
 export interface Achievement {
@@ -71,4 +74,43 @@ export interface TaskTag {
   id: number
   name: string
   task_id: number
-} 
\ No newline at end of file
+}
+
+export interface DashboardTask {
+  id: number
+  title: string
+  due_date: string | null
+  priority: 'low' | 'medium' | 'high' | 'critical'
+  difficulty: 'trivial' | 'easy' | 'medium' | 'hard' | 'epic'
+  experience_reward: number
+  gold_reward: number
+  category_id: number | null
+}
+
+export interface DashboardAchievement {
+  id: number
+  name: string
+  icon_url: string | null
+  unlocked_at: string
+}
+
+export interface DashboardSummary {
+  stats: {
+    experience_points: number
+    level: number
+    gold: number
+  }
+  today: DashboardTask[]
+  overdue: DashboardTask[]
+  inventory: {
+    total_items: number
+    equipped_items: number
+    by_type: Record<string, number>
+  }
+  recent_achievements: DashboardAchievement[]
+}
+
+export interface TaskSearchResults {
+  items: Task[]
+  next_cursor: string | null
+}
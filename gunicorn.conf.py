@@ -0,0 +1,62 @@
+import multiprocessing
+import os
+
+# Gunicorn settings for `python manage.py serve`. Every value can be
+# overridden with the environment variable named next to it.
+
+
+def available_cpus():
+    """CPUs this container may use, honouring affinity and cgroup quotas."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = multiprocessing.cpu_count()
+    try:
+        quota, period = open('/sys/fs/cgroup/cpu.max').read().split()
+        if quota != 'max':
+            cpus = min(cpus, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def available_memory_mb():
+    """Memory available to this container in MB, honouring cgroup limits."""
+    memory = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    try:
+        limit = open('/sys/fs/cgroup/memory.max').read().strip()
+        if limit != 'max':
+            memory = min(memory, int(limit))
+    except (OSError, ValueError):
+        pass
+    return memory // (1024 * 1024)
+
+
+def default_workers():
+    """2 x CPUs + 1 sync workers, capped by how many fit in memory."""
+    by_cpu = available_cpus() * 2 + 1
+    by_memory = available_memory_mb() // int(os.getenv('WORKER_MEMORY_MB', '128'))
+    return max(1, min(by_cpu, by_memory))
+
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', default_workers()))   # WEB_CONCURRENCY
+threads = int(os.getenv('WORKER_THREADS', '2'))                   # WORKER_THREADS
+preload_app = True
+max_requests = int(os.getenv('MAX_REQUESTS', '1000'))             # MAX_REQUESTS
+max_requests_jitter = int(os.getenv('MAX_REQUESTS_JITTER', '100'))
+timeout = int(os.getenv('WORKER_TIMEOUT', '30'))
+graceful_timeout = int(os.getenv('GRACEFUL_TIMEOUT', '30'))
+keepalive = 5
+pidfile = os.getenv('GUNICORN_PIDFILE', '/tmp/task_donegeon.pid')
+accesslog = '-'
+errorlog = '-'
+loglevel = os.getenv('LOG_LEVEL', 'info').lower()
+
+
+def post_fork(server, worker):
+    """Drop database connections inherited from the preloaded master."""
+    from app import app
+    from models import db
+    with app.app_context():
+        db.engine.dispose(close=False)
@@ -4,6 +4,8 @@ import subprocess
 import datetime
 import os
 import shutil
+import signal
+import sys
 from pathlib import Path
 
 BACKUP_DIR = Path('backups')
@@ -118,5 +120,30 @@ def remove_backup(backup_name):
     shutil.rmtree(backup_path)
     click.echo(f"Backup '{backup_name}' removed")
 
+@cli.command()
+@click.option('--workers', type=int, help='Number of worker processes (default: sized from CPUs and memory)')
+@click.option('--bind', help='Address to listen on (default: 0.0.0.0:$PORT)')
+def serve(workers, bind):
+    """Run the app under gunicorn with preloaded, pre-forked workers"""
+    args = ['gunicorn', '--config', str(Path(__file__).resolve().parent / 'gunicorn.conf.py')]
+    if workers:
+        args += ['--workers', str(workers)]
+    if bind:
+        args += ['--bind', bind]
+    args.append('app:app')
+    os.execvp(sys.executable, [sys.executable, '-m'] + args)
+
+@cli.command()
+@click.option('--pidfile', default=lambda: os.getenv('GUNICORN_PIDFILE', '/tmp/task_donegeon.pid'),
+              help='Gunicorn master pidfile')
+def reload(pidfile):
+    """Gracefully restart the serve workers (finishes in-flight requests)"""
+    try:
+        pid = int(Path(pidfile).read_text().strip())
+    except (OSError, ValueError):
+        raise click.ClickException(f"No running server found (pidfile {pidfile})")
+    os.kill(pid, signal.SIGHUP)
+    click.echo(f"Sent reload signal to server (pid {pid})")
+
 if __name__ == '__main__':
     cli() 
\ No newline at end of file
@@ -0,0 +1,88 @@
+import threading
+import time
+from collections import OrderedDict
+
+from flask_login import UserMixin
+
+
+def user_version(user):
+    """Version stamp for a user row, bumped whenever the row is updated."""
+    stamp = user.updated_at or user.created_at
+    return int(stamp.timestamp() * 1000) if stamp else 0
+
+
+class UserCache:
+    """Bounded in-process user cache with a TTL.
+
+    Entries are keyed by user id and carry the version stamp they were
+    loaded with, so a session holding a newer stamp (e.g. after a profile
+    change handled by another worker) never sees a stale row.
+    """
+
+    def __init__(self, max_size=1024, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, version=None):
+        """Return the cached user, or None on a miss, expiry or version mismatch."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            user, cached_version, expires_at = entry
+            if expires_at < time.monotonic() or (version is not None and version != cached_version):
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return user
+
+    def set(self, user_id, user, version):
+        """Store a detached user row (or just its id and timestamps) under its version stamp."""
+        with self._lock:
+            self._entries[user_id] = (user, version, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        """Drop a user from the cache."""
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        """Drop every cached user."""
+        with self._lock:
+            self._entries.clear()
+
+
+class SessionUser(UserMixin):
+    """Lightweight stand-in for the logged-in user.
+
+    Answers ``is_authenticated`` and ``get_id`` from the session alone and
+    only loads the full row (through the cache) when another attribute is
+    accessed, e.g. ``current_user.first_name`` in a template.
+    """
+
+    def __init__(self, user_id, loader, user=None):
+        self.id = user_id
+        self._loader = loader
+        self._user = user
+
+    def get_object(self):
+        """Return the full (detached) user row."""
+        if self._user is None:
+            self._user = self._loader(self.id)
+        return self._user
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        user = self.get_object()
+        if user is None:
+            raise AttributeError(name)
+        return getattr(user, name)
+
+    def __repr__(self):
+        return f'<SessionUser {self.id}>'